@@ -3,17 +3,21 @@ Starting point of the API.
 This is where the FastAPI app is defined, as well as the different tags for the documentation.
 Also contains the startup operations (like DB init).
 """
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from typing import Any, AsyncGenerator, cast
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import RedirectResponse
+from tortoise import Tortoise
 
-from app.routes import account, auth, profile, role, ue, course, course_type, status, affectation, node, academic_year
+from app.routes import account, admin, auth, profile, role, ue, course, course_type, status, affectation, node, academic_year
 from app.routes.tags import Tag
+from app.services import PermissionService, SecurityService, Tokens, WorkloadService
 
 from app.utils.databases.db import startup_databases
+from app.utils.databases.redis_helper import Redis
 from app.utils.printers import print_info
 
 # Array for the routes descriptions and names.
@@ -28,7 +32,8 @@ tags_metadata: list[Tag] = [
     course_type.tag,
     status.tag,
     affectation.tag,
-    academic_year.tag
+    academic_year.tag,
+    admin.tag
 ]
 
 @asynccontextmanager
@@ -36,11 +41,33 @@ async def lifespan(application: FastAPI) -> AsyncGenerator[Any, Any]:
     """
     This method indicates what the method needs to do at startup.
     """
+    # The settings are read once the .env file is loaded, not when the modules are imported.
+    PermissionService.AccountRoleCache.configure()
+    Tokens.RevocationFilter.configure()
+    Tokens.SessionGenerations.configure()
+    Tokens.DecodedTokenCache.configure()
+    SecurityService.PasswordPool.configure()
+    SecurityService.LoginThrottle.configure()
     # Démarrage des bases de données
     print_info("Starting databases...")
-    await startup_databases(app=application)
+    await startup_databases()
+    background_tasks: list[asyncio.Task] = [
+        # Keeps the materialized workloads in sync with the data.
+        asyncio.create_task(WorkloadService.refresh_workloads_periodically()),
+        # Applies the role and permission changes made by the other workers.
+        asyncio.create_task(PermissionService.listen_for_invalidations()),
+        # Keeps the filter of the revoked tokens in sync with the other workers.
+        asyncio.create_task(Tokens.listen_for_revocations()),
+    ]
     yield
     # Code pour fermer les bases de données (si nécessaire)
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await Redis.close_async_redis()
+    SecurityService.PasswordPool.shutdown()
+    await Tortoise.close_connections()
 
 
 # Creation of the main router
@@ -65,6 +92,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Importing API routes :
@@ -79,6 +107,7 @@ app.include_router(course_type.coursetypeRouter,  tags=[course_type.tag["name"]]
 app.include_router(status.statusRouter,           tags=[status.tag["name"]])
 app.include_router(affectation.affectationRouter, tags=[affectation.tag["name"]])
 app.include_router(academic_year.academic_yearRouter, tags=[academic_year.tag["name"]])
+app.include_router(admin.adminRouter,             tags=[admin.tag["name"]])
 
 # Root path: Redirecting to the documentation.
 @app.get("/")
@@ -5,9 +5,9 @@ from typing import Annotated, TypeAlias
 
 from fastapi import Depends
 
-from app.models.tortoise.account import AccountInDB
 from app.services import AccountService
+from app.services.PermissionService import AuthContext
 
-# This is the account that is used in logged requests.
+# This is the account that is used in logged requests, with its role and a permission checker.
 # We can find it using the encrypted tokens provided inside the request's headers.
-AuthenticatedAccount : TypeAlias = Annotated[AccountInDB, Depends(AccountService.get_current_account)]
+AuthenticatedContext : TypeAlias = Annotated[AuthContext, Depends(AccountService.get_auth_context)]
@@ -77,3 +77,53 @@ class PydanticAffectationInModify(BaseModel):
         Pydantic configuration.
         """
         from_attributes : bool = True
+
+class PydanticAffectationInBatchModify(PydanticAffectationInModify):
+    """
+    Pydantic model for modifying an affectation inside of a batch.
+    """
+    id : int
+
+class PydanticAffectationBatch(BaseModel):
+    """
+    Pydantic model for a batch of affectation operations.
+    The whole batch is applied in a single transaction : if any operation is invalid, none are applied.
+    """
+    create : list[PydanticAffectationInCreate]      = []
+    modify : list[PydanticAffectationInBatchModify] = []
+    delete : list[int]                              = []
+
+class PydanticAffectationBatchError(BaseModel):
+    """
+    Represents the error of a single operation of a batch.
+    `operation` is the list the operation comes from (create, modify or delete), `index` its position in that list.
+    """
+    operation   : str
+    index       : int
+    status_code : int
+    detail      : str
+
+class PydanticAffectationBatchResult(BaseModel):
+    """
+    Represents the result of a batch of affectation operations.
+    """
+    created  : list[PydanticAffectation]
+    modified : list[int]
+    deleted  : list[int]
+
+class PydanticCourseGroup(BaseModel):
+    """
+    Represents a group of a course.
+    """
+    course_id : int
+    group     : int
+
+class PydanticAssignmentSuggestion(BaseModel):
+    """
+    Represents the affectations proposed for the unassigned course groups.
+    `created` is only filled when the proposals were committed.
+    """
+    academic_year : int
+    proposals     : list[PydanticAffectationInCreate]
+    unassigned    : list[PydanticCourseGroup]
+    created       : list[PydanticAffectation] = []
@@ -0,0 +1,57 @@
+"""
+Pydantic models for the coverage of the course groups by the affectations.
+"""
+from pydantic import BaseModel
+
+from app.models.pydantic.abstract.AcademicYearModel import AcademicYearPydanticModel
+
+
+class PydanticCoverageTotals(BaseModel):
+    """
+    Represents the coverage of a set of courses.
+    A group is assigned when at least one affectation exists for it.
+    """
+    course_count      : int = 0
+    group_count       : int = 0
+    assigned_groups   : int = 0
+    unassigned_groups : int = 0
+    planned_hours     : int = 0
+    assigned_hours    : int = 0
+    unassigned_hours  : int = 0
+
+
+class PydanticCourseCoverage(BaseModel):
+    """
+    Represents the coverage of the groups of a course.
+    Unassigned hours are the hours of the groups that have no teacher yet.
+    """
+    course_id         : int
+    course_type_id    : int
+    duration          : int
+    group_count       : int
+    assigned_groups   : list[int]
+    unassigned_groups : list[int]
+    planned_hours     : int
+    assigned_hours    : int
+    unassigned_hours  : int
+
+
+class PydanticUECoverage(AcademicYearPydanticModel):
+    """
+    Represents the coverage of the courses of an UE.
+    """
+    ue_id   : int
+    name    : str
+    totals  : PydanticCoverageTotals
+    courses : list[PydanticCourseCoverage]
+
+
+class PydanticNodeCoverage(AcademicYearPydanticModel):
+    """
+    Represents the coverage of the courses of every UE located under a node.
+    Courses shared by several UEs are only counted once in the totals.
+    """
+    node_id : int
+    name    : str
+    totals  : PydanticCoverageTotals
+    ues     : list[PydanticUECoverage]
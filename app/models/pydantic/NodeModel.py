@@ -5,6 +5,7 @@ from typing import Optional, Union
 from pydantic import BaseModel
 
 from app.models.pydantic.abstract.AcademicYearModel import AcademicYearPydanticModel
+from app.models.pydantic.CourseModel import PydanticCourseModel
 
 
 class PydanticNodeModelFromJSON(BaseModel):
@@ -46,7 +47,11 @@ class PydanticNodeModel(AcademicYearPydanticModel):
     id         : int
     name       : str
     type       : str = "node"
-    child_nodes: Optional[Union[list["PydanticUEInNodeModel"], list["PydanticNodeModel"]]] = None
+    planned_hours : Optional[int] = None
+    assigned_hours: Optional[int] = None
+    child_nodes: Optional[list[Union["PydanticUEInNodeModel", "PydanticNodeModel"]]] = None
+    child_ids  : Optional[list[int]] = None  # Child node ids, when the children are not displayed.
+    child_count: Optional[int] = None        # Number of child nodes and UEs, when the children are not displayed.
 
     class Config:
         """
@@ -59,9 +64,10 @@ class PydanticUEInNodeModel(PydanticNodeModel):
     """
     Pydantic model for a Node with its UEs.
     """
-    id  : int
-    name: str
-    type: str = "ue"
+    id     : int
+    name   : str
+    type   : str = "ue"
+    courses: Optional[list[PydanticCourseModel]] = None
 
 
 class PydanticNodeCreateModel(BaseModel):
@@ -0,0 +1,34 @@
+"""
+Pydantic models describing the usage of the resources of a worker.
+"""
+from pydantic import BaseModel
+
+
+class PydanticPasswordPoolStats(BaseModel):
+    """
+    Represents the usage of the pool running the password hashing, since the worker started.
+    The wait is the time spent queued before a thread picked the operation up.
+    """
+    size            : int
+    queue_limit     : int
+    pending         : int
+    completed       : int
+    rejected        : int
+    average_wait_ms : float
+    max_wait_ms     : float
+    average_run_ms  : float
+
+
+class PydanticDatabasePoolStats(BaseModel):
+    """
+    Represents the usage of the connection pool to the database, since the worker started.
+    The wait is the time spent acquiring a connection, including its opening if needed.
+    """
+    min_size        : int
+    max_size        : int
+    size            : int
+    idle            : int
+    waiting         : int
+    acquired        : int
+    average_wait_ms : float
+    max_wait_ms     : float
@@ -0,0 +1,21 @@
+"""
+Pydantic models for the workload (service hours) of the profiles.
+"""
+from app.models.pydantic.abstract.AcademicYearModel import AcademicYearPydanticModel
+
+
+class PydanticProfileWorkload(AcademicYearPydanticModel):
+    """
+    This model is meant to be used when we need to return the workload of a Profile to the frontend.
+    Weighted hours are the affectation hours multiplied by the coefficient of their course type for the profile status.
+    A positive balance means over-service, a negative one under-service.
+    """
+    profile_id     : int
+    firstname      : str
+    lastname       : str
+    status_id      : int
+    quota          : int
+    assigned_hours : int
+    weighted_hours : float
+    remaining_quota: float
+    balance        : float
@@ -0,0 +1,34 @@
+"""
+This module contains the closure table of the Node hierarchy.
+Each row links a node to one of its ancestors, including itself at depth 0.
+It is used to read subtrees and ancestors without walking the tree.
+"""
+
+from tortoise.fields import (Field,
+                             ForeignKeyField,
+                             ForeignKeyRelation,
+                             IntField)
+
+from app.models.tortoise.abstract.academic_year import AcademicYear
+from app.models.tortoise.node import NodeInDB
+
+
+class NodeClosureInDB(AcademicYear):
+    """
+    This model represents an ancestor-descendant link between two nodes.
+    It MUST stay in sync with the `parent` field of the nodes.
+    """
+    id         : Field[int] = IntField(pk=True)
+    depth      : Field[int] = IntField(min_value=0)
+
+    ancestor   : ForeignKeyRelation[NodeInDB] = ForeignKeyField("models.NodeInDB", related_name="descendant_links")
+    descendant : ForeignKeyRelation[NodeInDB] = ForeignKeyField("models.NodeInDB", related_name="ancestor_links")
+
+    class Meta(AcademicYear.Meta):
+        """
+        This class is used to indicate the name of the Table to create inside the database.
+        """
+        abstract        : bool = False
+        table           : str  = "NodeClosure"
+        unique_together : tuple[tuple[str, ...], ...] = (("ancestor", "descendant"),)
+        indexes         : tuple[tuple[str, ...], ...] = (("descendant", "depth"),)
@@ -0,0 +1,35 @@
+"""
+This module contains the hour totals of the nodes.
+Each row sums the hours of the UEs located under a node.
+It is used to display the totals without walking the tree.
+"""
+
+from tortoise.fields import (Field,
+                             IntField,
+                             OneToOneField,
+                             OneToOneRelation)
+
+from app.models.tortoise.abstract.academic_year import AcademicYear
+from app.models.tortoise.node import NodeInDB
+
+
+class NodeHoursInDB(AcademicYear):
+    """
+    This model represents the hour totals of a node.
+    Planned hours are the durations of the courses times their number of groups,
+    assigned hours are the hours of their affectations.
+    An UE located under a node through several paths is only counted once.
+    It MUST stay in sync with the courses, the UE attachments and the affectations.
+    """
+    id             : Field[int] = IntField(pk=True)
+    planned_hours  : Field[int] = IntField(default=0)
+    assigned_hours : Field[int] = IntField(default=0)
+
+    node : OneToOneRelation[NodeInDB] = OneToOneField("models.NodeInDB", related_name="hours")
+
+    class Meta(AcademicYear.Meta):
+        """
+        This class is used to indicate the name of the Table to create inside the database.
+        """
+        abstract : bool = False
+        table    : str  = "NodeHours"
@@ -0,0 +1,33 @@
+"""
+This module contains the materialized workload of the profiles.
+Each row holds the assigned and weighted hours of a profile for its academic year.
+"""
+
+from tortoise.fields import (Field,
+                             FloatField,
+                             IntField,
+                             OneToOneField,
+                             OneToOneRelation)
+
+from app.models.tortoise.abstract.academic_year import AcademicYear
+from app.models.tortoise.profile import ProfileInDB
+
+
+class ProfileWorkloadInDB(AcademicYear):
+    """
+    This model represents the workload of a profile.
+    It MUST stay in sync with the affectations of the profile, its status and the coefficients.
+    """
+    id             : Field[int]   = IntField(pk=True)
+    assigned_hours : Field[int]   = IntField(default=0)
+    weighted_hours : Field[float] = FloatField(default=0.0)
+
+    profile : OneToOneRelation[ProfileInDB] = OneToOneField("models.ProfileInDB", related_name="workload")
+
+    class Meta(AcademicYear.Meta):
+        """
+        This class is used to indicate the name of the Table to create inside the database.
+        """
+        abstract : bool = False
+        table    : str  = "ProfileWorkload"
+        indexes  : tuple[tuple[str, ...], ...] = (("academic_year",),)
@@ -5,7 +5,7 @@ used to manage academic_year.
 
 from fastapi import APIRouter
 
-from app.models.aliases import AuthenticatedAccount
+from app.models.aliases import AuthenticatedContext
 from app.models.pydantic.AcademicYearTable import PydanticAcademicTableModel
 from app.routes.tags import Tag
 from app.services import AcademicYearService
@@ -17,15 +17,29 @@ tag: Tag = {
 }
 
 @academic_yearRouter.get("/", status_code=200,response_model=list[PydanticAcademicTableModel])
-async def get_all_academic_year(current_account: AuthenticatedAccount) -> list[PydanticAcademicTableModel]:
+async def get_all_academic_year(context: AuthenticatedContext) -> list[PydanticAcademicTableModel]:
     """
         This method returns all the academic_year.
     """
-    return await AcademicYearService.get_all_academic_year(current_account)
+    return await AcademicYearService.get_all_academic_year(context)
 
 @academic_yearRouter.post("/", status_code=201,response_model=PydanticAcademicTableModel)
-async def create_new_academic_year(current_account: AuthenticatedAccount) -> PydanticAcademicTableModel:
+async def create_new_academic_year(context: AuthenticatedContext) -> PydanticAcademicTableModel:
     """
         This method creates a new academic_year.
     """
-    return await AcademicYearService.create_new_academic_year(current_account)
+    return await AcademicYearService.create_new_academic_year(context)
+
+@academic_yearRouter.post("/rollover", status_code=201,response_model=PydanticAcademicTableModel)
+async def rollover_academic_year(context: AuthenticatedContext) -> PydanticAcademicTableModel:
+    """
+        This method creates a new academic_year, with a copy of the data of the previous one.
+    """
+    return await AcademicYearService.rollover_academic_year(context)
+
+@academic_yearRouter.delete("/{academic_year}", status_code=204)
+async def delete_academic_year(academic_year: int, context: AuthenticatedContext) -> None:
+    """
+        This method deletes the most recent academic_year, with all of its data.
+    """
+    return await AcademicYearService.delete_academic_year(academic_year, context)
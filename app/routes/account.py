@@ -4,7 +4,7 @@ Account Endpoints.
 
 from fastapi import APIRouter, Response
 
-from app.models.aliases import AuthenticatedAccount
+from app.models.aliases import AuthenticatedContext
 from app.models.pydantic.AccountModel import (PydanticAccountModel,
                                               PydanticAccountPasswordResponse, PydanticAccountWithoutProfileModel,
                                               PydanticCreateAccountModel,
@@ -25,19 +25,19 @@ tag: Tag = {
 
 
 @accountRouter.get("/", status_code=200, response_model=list[PydanticAccountModel])
-async def get_all_accounts(current_account: AuthenticatedAccount, academic_year: int, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[PydanticAccountModel]:
+async def get_all_accounts(context: AuthenticatedContext, academic_year: int, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[PydanticAccountModel]:
     """
     This method returns all the accounts.
     """
 
     body: PydanticPagination = PydanticPagination.create_model(page, limit, order)
 
-    return await AccountService.get_all_accounts(academic_year, current_account, body)
+    return await AccountService.get_all_accounts(academic_year, context, body)
 
 
 @accountRouter.get("/linked", status_code=200,
                    response_model=list[PydanticAccountModel])
-async def get_accounts_linked_to_profile(academic_year: int, current_account: AuthenticatedAccount,
+async def get_accounts_linked_to_profile(academic_year: int, context: AuthenticatedContext,
                                          page: int | None = None, limit: int | None = None, order: str | None = None) -> list[
     PydanticAccountModel]:
     """
@@ -46,11 +46,11 @@ async def get_accounts_linked_to_profile(academic_year: int, current_account: Au
     or for the given academic year.
     """
     body: PydanticPagination = PydanticPagination.create_model(page, limit, order)
-    return await AccountService.get_accounts_linked_to_profile(academic_year, current_account, body)
+    return await AccountService.get_accounts_linked_to_profile(academic_year, context, body)
 
 @accountRouter.get("/notlinked", status_code=200,
                    response_model=list[PydanticAccountWithoutProfileModel])
-async def get_accounts_not_linked_to_profile(academic_year: int, current_account: AuthenticatedAccount,
+async def get_accounts_not_linked_to_profile(academic_year: int, context: AuthenticatedContext,
                                              page: int | None = None, limit: int | None = None, order: str | None = None) -> list[
     PydanticAccountWithoutProfileModel]:
     """
@@ -59,67 +59,67 @@ async def get_accounts_not_linked_to_profile(academic_year: int, current_account
     or for the given academic year.
     """
     body: PydanticPagination = PydanticPagination.create_model(page, limit, order)
-    return await AccountService.get_accounts_not_linked_to_profile(academic_year, current_account, body)
+    return await AccountService.get_accounts_not_linked_to_profile(academic_year, context, body)
 
 
 @accountRouter.get("/{account_id}", status_code=200, response_model=PydanticAccountModel)
-async def get_account(academic_year: int, account_id: int, current_account: AuthenticatedAccount) -> PydanticAccountModel:
+async def get_account(academic_year: int, account_id: int, context: AuthenticatedContext) -> PydanticAccountModel:
     """
     This method returns an account by its ID.
     """
-    return await AccountService.get_account(academic_year, account_id, current_account)
+    return await AccountService.get_account(academic_year, account_id, context)
 
 
 @accountRouter.post("/", status_code=201, response_model=PydanticAccountPasswordResponse)
 async def create_account(account: PydanticCreateAccountModel, academic_year: int,
-                         current_account: AuthenticatedAccount) -> PydanticAccountPasswordResponse:
+                         context: AuthenticatedContext) -> PydanticAccountPasswordResponse:
     """
     This method creates an account.
     """
-    return await AccountService.create_account(account, current_account)
+    return await AccountService.create_account(account, context)
 
 
 @accountRouter.patch("/{account_id}", status_code=205)
 async def modify_account(account_id: int, academic_year: int, account: PydanticModifyAccountModel,
-                         current_account: AuthenticatedAccount) -> Response:
+                         context: AuthenticatedContext) -> Response:
     """
     This method modifies an account.
     """
-    await AccountService.modify_account(account_id, account, current_account)
+    await AccountService.modify_account(account_id, account, context)
 
     return Response(status_code=205)
 
 
 @accountRouter.delete("/{account_id}", status_code=204)
-async def delete_account(account_id: int, academic_year: int, current_account: AuthenticatedAccount) -> None:
+async def delete_account(account_id: int, academic_year: int, context: AuthenticatedContext) -> None:
     """
     This method deletes an account.
     """
-    await AccountService.delete_account(account_id, current_account)
+    await AccountService.delete_account(account_id, context)
 
 
 @accountRouter.get("/{account_id}/role", status_code=200, response_model=PydanticRoleResponseModel)
 async def get_role_account_by_id(account_id: int, academic_year: int,
-                                 current_account: AuthenticatedAccount) -> PydanticRoleResponseModel:
+                                 context: AuthenticatedContext) -> PydanticRoleResponseModel:
     """
     This method get an account's roles with the account ID.
     """
 
-    return await AccountService.get_role_account_by_id(account_id, current_account, academic_year)
+    return await AccountService.get_role_account_by_id(account_id, context, academic_year)
 
 
 @accountRouter.get("/search/login/{keywords}", status_code=200, response_model=list[PydanticAccountModel])
-async def search_account_by_login(academic_year: int, keywords: str, current_account: AuthenticatedAccount) -> list[PydanticAccountModel]:
+async def search_account_by_login(academic_year: int, keywords: str, context: AuthenticatedContext) -> list[PydanticAccountModel]:
     """
     This method search an account by login.
     """
 
-    return await AccountService.search_accounts_by_login(academic_year, keywords, current_account)
+    return await AccountService.search_accounts_by_login(academic_year, keywords, context)
 
 
 
 @accountRouter.get("/search/{keywords}/", status_code=200, response_model=list[PydanticAccountModel])
-async def search_account_by_keywords(keywords: str, current_account: AuthenticatedAccount, academic_year:int, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[
+async def search_account_by_keywords(keywords: str, context: AuthenticatedContext, academic_year:int, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[
     PydanticAccountModel]:
     """
     This method search an account by keywords.
@@ -127,23 +127,23 @@ async def search_account_by_keywords(keywords: str, current_account: Authenticat
 
     body: PydanticPagination = PydanticPagination.create_model(page, limit, order)
 
-    return await AccountService.search_account_by_keywords(academic_year, keywords, current_account, body)
+    return await AccountService.search_account_by_keywords(academic_year, keywords, context, body)
 
 
 @accountRouter.patch("/{account_id}/role/", status_code=205)
-async def set_role_account_by_id(account_id: int, academic_year: int, current_account: AuthenticatedAccount,
+async def set_role_account_by_id(account_id: int, academic_year: int, context: AuthenticatedContext,
                                  body: PydanticSetRoleToAccountModel) -> Response:
     """
     This method set an account's roles with the account ID and a body.
     """
-    await AccountService.set_role_account_by_name(account_id, current_account, body)
+    await AccountService.set_role_account_by_name(account_id, context, body)
 
     return Response(status_code=205)
 
 
 @accountRouter.get("/nb/", status_code=200, response_model=NumberOfElement)
-async def get_nb_accounts(current_account: AuthenticatedAccount, academic_year: int) -> NumberOfElement:
+async def get_nb_accounts(context: AuthenticatedContext, academic_year: int) -> NumberOfElement:
     """
     This method get the number of account in the database.
     """
-    return await AccountService.get_number_of_account(current_account)
+    return await AccountService.get_number_of_account(context)
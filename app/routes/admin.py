@@ -0,0 +1,26 @@
+"""
+Admin routes.
+Used to monitor the server.
+"""
+
+from fastapi import APIRouter
+
+from app.models.aliases import AuthenticatedContext
+from app.models.pydantic.StatsModel import PydanticDatabasePoolStats
+from app.routes.tags import Tag
+from app.services import AdminService
+
+
+adminRouter = APIRouter(prefix="/admin")
+tag: Tag = {
+    "name": "Admin",
+    "description": "Administration-related operations. Used to monitor the server."
+}
+
+
+@adminRouter.get("/stats/database", response_model=PydanticDatabasePoolStats, status_code=200)
+async def get_database_pool_stats(context: AuthenticatedContext) -> PydanticDatabasePoolStats:
+    """
+    This method returns the usage of the connection pool to the database, on the worker that answers.
+    """
+    return await AdminService.get_database_pool_stats(context)
@@ -3,15 +3,18 @@ Affectation routes.
 used to manage teacher and classes associations.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
-from app.models.aliases import AuthenticatedAccount
+from app.models.aliases import AuthenticatedContext
 
 from app.models.pydantic.AffectationModel import (PydanticAffectation,
+                                                  PydanticAffectationBatch,
+                                                  PydanticAffectationBatchResult,
+                                                  PydanticAssignmentSuggestion,
                                                   PydanticAffectationInCreate,
                                                   PydanticAffectationInModify)
 from app.routes.tags import Tag
-from app.services import AffectationService
+from app.services import AffectationService, SuggestionService
 
 affectationRouter: APIRouter = APIRouter(prefix="/affectation")
 tag: Tag = {
@@ -20,50 +23,74 @@ tag: Tag = {
 }
 
 @affectationRouter.get("/profile/{profile_id}",status_code=200, response_model=list[PydanticAffectation])
-async def get_teacher_affectations(profile_id: int, academic_year: int, current_account: AuthenticatedAccount) -> list[PydanticAffectation]:
+async def get_teacher_affectations(profile_id: int, academic_year: int, context: AuthenticatedContext) -> list[PydanticAffectation]:
     """
     This method returns all classes assigned to a teacher.
     """
-    return await AffectationService.get_teacher_affectations(profile_id, current_account)
+    return await AffectationService.get_teacher_affectations(profile_id, context)
 
 @affectationRouter.get("/course/{course_id}",status_code=200, response_model=list[PydanticAffectation])
-async def get_course_affectations(course_id: int, academic_year: int, current_account: AuthenticatedAccount) -> list[PydanticAffectation]:
+async def get_course_affectations(course_id: int, academic_year: int, context: AuthenticatedContext) -> list[PydanticAffectation]:
     """
     This method returns all teachers assigned to a class.
     """
-    return await AffectationService.get_course_affectations(course_id, current_account)
+    return await AffectationService.get_course_affectations(course_id, context)
 
 @affectationRouter.post("/assign",status_code=201, response_model=PydanticAffectation)
-async def assign_course_to_profile(affectation: PydanticAffectationInCreate, academic_year: int, current_account: AuthenticatedAccount) -> PydanticAffectation:
+async def assign_course_to_profile(affectation: PydanticAffectationInCreate, academic_year: int, context: AuthenticatedContext) -> PydanticAffectation:
     """
     This method assigns a course to a teacher.
     """
-    return await AffectationService.assign_course_to_profile(affectation, current_account)
+    return await AffectationService.assign_course_to_profile(affectation, context)
+
+@affectationRouter.post("/batch", status_code=200, response_model=PydanticAffectationBatchResult)
+async def apply_affectation_batch(batch: PydanticAffectationBatch, academic_year: int, context: AuthenticatedContext) -> PydanticAffectationBatchResult:
+    """
+    This method creates, modifies and deletes affectations in a single transaction.
+    If any operation is invalid, none are applied and the error of each invalid operation is returned.
+    """
+    return await AffectationService.apply_affectation_batch(batch, context)
+
+@affectationRouter.post("/suggest", status_code=200, response_model=PydanticAssignmentSuggestion)
+async def suggest_assignments(academic_year: int, context: AuthenticatedContext,
+                              node_id: int | None = None, commit: bool = False) -> PydanticAssignmentSuggestion:
+    """
+    This method proposes a teacher for each unassigned course group, within the remaining quota of the profiles.
+    The proposals come from a heuristic : they favour the teachers of the same course, UE or course type,
+    but are not guaranteed to be the cheapest assignment, nor to cover every group that could be covered.
+    If a node id is given, only the courses under this node are considered.
+    Nothing is written unless commit is True : the proposals are then created as a single batch.
+    """
+    return await SuggestionService.suggest_assignments(academic_year, context, node_id, commit)
 
 @affectationRouter.patch("/{affectation_id}",status_code=205)
-async def modify_affectation_by_affectation_id(affectation_id: int, academic_year: int, affectation: PydanticAffectationInModify, current_account: AuthenticatedAccount) -> None:
+async def modify_affectation_by_affectation_id(affectation_id: int, academic_year: int, affectation: PydanticAffectationInModify, context: AuthenticatedContext) -> Response:
     """
     This method modifies an affectation.
     """
-    await AffectationService.modify_affectation_by_affectation_id(current_account, affectation, affectation_id)
+    await AffectationService.modify_affectation_by_affectation_id(context, affectation, affectation_id)
+    return Response(status_code=205)
 
 @affectationRouter.patch("/{profile_id}/{course_id}",status_code=205)
-async def modify_affectation_by_profile_and_course(profile_id: int, academic_year: int, course_id: int, affectation: PydanticAffectationInModify, current_account: AuthenticatedAccount) -> None:
+async def modify_affectation_by_profile_and_course(profile_id: int, academic_year: int, course_id: int, affectation: PydanticAffectationInModify, context: AuthenticatedContext) -> Response:
     """
     This method modifies an affectation.
     """
-    await AffectationService.modify_affectation_by_profile_and_course(current_account, affectation, profile_id, course_id)
+    await AffectationService.modify_affectation_by_profile_and_course(context, affectation, profile_id, course_id)
+    return Response(status_code=205)
 
 @affectationRouter.delete("/unassign/{affectation_id}",status_code=205)
-async def unassign_course_from_profile_with_affectation_id(academic_year: int, affectation_id: int, current_account: AuthenticatedAccount) -> None:
+async def unassign_course_from_profile_with_affectation_id(academic_year: int, affectation_id: int, context: AuthenticatedContext) -> Response:
     """
     This method unassigns a course from a teacher.
     """
-    await AffectationService.unassign_course_from_profile_with_affectation_id(affectation_id, current_account)
+    await AffectationService.unassign_course_from_profile_with_affectation_id(affectation_id, context)
+    return Response(status_code=205)
 
 @affectationRouter.delete("/unassign/profile/{profile_id}/course/{course_id}", status_code=205)
-async def unassign_course_from_profile_with_profile_and_course(profile_id: int, course_id: int, academic_year: int, current_account: AuthenticatedAccount) -> None:
+async def unassign_course_from_profile_with_profile_and_course(profile_id: int, course_id: int, academic_year: int, context: AuthenticatedContext) -> Response:
     """
     This method unassigns a course from a teacher.
     """
-    await AffectationService.unassign_course_from_profile_with_profile_and_course(profile_id, course_id, current_account)
+    await AffectationService.unassign_course_from_profile_with_profile_and_course(profile_id, course_id, context)
+    return Response(status_code=205)
@@ -4,13 +4,15 @@ Used to manage auth operations.
 """
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
 
+from app.models.aliases import AuthenticatedContext
 from app.routes.tags import Tag
 from app.services import AuthService
 from app.models.pydantic.TokenModel import PydanticTokenPair
 from app.models.pydantic.ClassicResponses import ClassicOkResponse
+from app.models.pydantic.StatsModel import PydanticPasswordPoolStats
 
 
 authRouter = APIRouter(prefix="/auth")
@@ -21,12 +23,15 @@ tag: Tag = {
 
 
 @authRouter.post("/login", response_model=PydanticTokenPair, status_code=200)
-async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> PydanticTokenPair:
+async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], request: Request) -> PydanticTokenPair:
     """
     This method logs in the user.
     Checks if credentials are correct.
+    The attempts are throttled per login and per client.
+    Behind a proxy trusted by uvicorn (FORWARDED_ALLOW_IPS), the client is the address it forwards.
     """
-    return await AuthService.login(form_data.username, form_data.password)
+    client_ip: str = request.client.host if request.client is not None else "unknown"
+    return await AuthService.login(form_data.username, form_data.password, client_ip)
 
 @authRouter.post("/logout", response_model=ClassicOkResponse, status_code=200)
 async def logout(tokens: PydanticTokenPair) -> ClassicOkResponse:
@@ -35,9 +40,23 @@ async def logout(tokens: PydanticTokenPair) -> ClassicOkResponse:
     """
     return await AuthService.logout(tokens)
 
+@authRouter.post("/logout/all", response_model=ClassicOkResponse, status_code=200)
+async def logout_all_sessions(context: AuthenticatedContext) -> ClassicOkResponse:
+    """
+    This method logs out every session of the user.
+    """
+    return await AuthService.logout_all_sessions(context)
+
 @authRouter.post("/refresh", response_model=PydanticTokenPair, status_code=200)
 async def refresh_user_tokens(tokens: PydanticTokenPair) -> PydanticTokenPair:
     """
     This method refreshes the user's tokens.
     """
     return await AuthService.refresh_user_tokens(tokens)
+
+@authRouter.get("/stats", response_model=PydanticPasswordPoolStats, status_code=200)
+async def get_password_pool_stats(context: AuthenticatedContext) -> PydanticPasswordPoolStats:
+    """
+    This method returns the usage of the pool hashing the passwords, on the worker that answers.
+    """
+    return await AuthService.get_password_pool_stats(context)
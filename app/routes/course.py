@@ -5,7 +5,7 @@ Used to manage course operations.
 
 from fastapi import APIRouter
 
-from app.models.aliases import AuthenticatedAccount
+from app.models.aliases import AuthenticatedContext
 from app.models.pydantic.CourseModel import (PydanticCourseModel,
                                              PydanticCreateCourseModel,
                                              PydanticModifyCourseModel)
@@ -19,33 +19,33 @@ tag: Tag = {
 }
 
 @courseRouter.get("/{course_id}",status_code=200, response_model=None)
-async def get_course_by_id(course_id: int,  academic_year: int, current_account: AuthenticatedAccount) -> PydanticCourseModel:
+async def get_course_by_id(course_id: int,  academic_year: int, context: AuthenticatedContext) -> PydanticCourseModel:
     """
     This method returns the course of the given course id.
     """
-    return await CourseService.get_course_by_id(course_id,current_account)
+    return await CourseService.get_course_by_id(course_id,context)
 
 
 
 @courseRouter.post("/", status_code=201, response_model=None)
-async def add_course(body : PydanticCreateCourseModel, academic_year: int, current_account: AuthenticatedAccount) -> PydanticCourseModel:
+async def add_course(body : PydanticCreateCourseModel, academic_year: int, context: AuthenticatedContext) -> PydanticCourseModel:
     """
     This method creates a new course.
     """
-    return await CourseService.add_course(body,current_account)
+    return await CourseService.add_course(body,context)
 
 @courseRouter.patch("/{course_id}", status_code=205)
-async def modify_course(course_id: int, body: PydanticModifyCourseModel, academic_year: int, current_account: AuthenticatedAccount) -> None:
+async def modify_course(course_id: int, body: PydanticModifyCourseModel, academic_year: int, context: AuthenticatedContext) -> None:
     """
     This method modifies the course of the given course id.
     """
-    await CourseService.modify_course(course_id,body,current_account)
+    await CourseService.modify_course(course_id,body,context)
 
 
 @courseRouter.delete("/{course_id}", status_code=204)
-async def delete_course(course_id: int, academic_year: int, current_account: AuthenticatedAccount) -> None:
+async def delete_course(course_id: int, academic_year: int, context: AuthenticatedContext) -> None:
     """
     This method deletes the course of the given course id.
     """
 
-    await CourseService.delete_course(course_id,current_account)
+    await CourseService.delete_course(course_id,context)
@@ -2,13 +2,16 @@
 This module provides operations related to nodes.
 Those are the "folders" before an UE.
 """
-from fastapi import APIRouter, Response
+from typing import Annotated
 
-from app.models.aliases import AuthenticatedAccount
+from fastapi import APIRouter, Header, Query, Response
+
+from app.models.aliases import AuthenticatedContext
+from app.models.pydantic.CoverageModel import PydanticNodeCoverage
 
 from app.models.pydantic.NodeModel import PydanticNodeCreateModel, PydanticNodeModel, PydanticNodeModelWithChildIds, PydanticNodeUpdateModel
 from app.routes.tags import Tag
-from app.services import NodeService
+from app.services import CoverageService, NodeService
 
 nodeRouter: APIRouter = APIRouter(prefix="/node")
 tag: Tag = {
@@ -17,54 +20,83 @@ tag: Tag = {
 }
 
 @nodeRouter.get("/root", status_code=200, response_model=PydanticNodeModelWithChildIds)
-async def get_root_node(academic_year: int, current_account: AuthenticatedAccount) -> PydanticNodeModelWithChildIds:
+async def get_root_node(academic_year: int, context: AuthenticatedContext) -> PydanticNodeModelWithChildIds:
     """
     This method returns the root node of the given academic year.
     """
-    return await NodeService.get_root_node(academic_year, current_account)
+    return await NodeService.get_root_node(academic_year, context)
 
 @nodeRouter.get("/{node_id}", status_code=200, response_model=PydanticNodeModelWithChildIds)
-async def get_node_by_id(node_id: int, academic_year: int, current_account: AuthenticatedAccount) ->  PydanticNodeModelWithChildIds:
+async def get_node_by_id(node_id: int, academic_year: int, context: AuthenticatedContext) ->  PydanticNodeModelWithChildIds:
     """
     This method returns the node of the given node id.
     Also returns the contents of the sub-nodes.
     """
-    return await NodeService.get_node_by_id(node_id, current_account)
+    return await NodeService.get_node_by_id(node_id, context)
 
 @nodeRouter.get("/root/arborescence", status_code=200, response_model=PydanticNodeModel)
-async def get_arborescence_from_root(academic_year: int, current_account: AuthenticatedAccount) -> PydanticNodeModel:
+async def get_arborescence_from_root(academic_year: int, context: AuthenticatedContext, response: Response,
+                                     if_none_match: Annotated[str | None, Header()] = None) -> PydanticNodeModel:
     """
     This method returns the arborescence starting from the root node.
+    Answers with a 304 if the ETag sent in If-None-Match is still the current one.
     """
-    return await NodeService.get_root_arborescence(academic_year, current_account)
+    tree, etag = await NodeService.get_root_arborescence(academic_year, context, if_none_match)
+    response.headers["ETag"] = etag
+    return tree
 
 @nodeRouter.get("/{node_id}/arborescence", status_code=200, response_model=PydanticNodeModel)
-async def get_arborescence_from_node(academic_year: int, node_id: int, current_account: AuthenticatedAccount) -> PydanticNodeModel:
+async def get_arborescence_from_node(academic_year: int, node_id: int, context: AuthenticatedContext, response: Response,
+                                     if_none_match: Annotated[str | None, Header()] = None,
+                                     depth: Annotated[int | None, Query(ge=0)] = None,
+                                     expand: Annotated[list[int] | None, Query()] = None) -> PydanticNodeModel:
     """
     This method returns the node of the given academic year and id.
-    Also returns the following tree.
+    Also returns the following tree, with the courses of its UEs.
+    If a depth is given, only that many levels are displayed, plus the children of the expanded nodes.
+    The last displayed nodes come with the ids of their child nodes and their number of children.
+    Answers with a 304 if the ETag sent in If-None-Match is still the current one.
+    """
+    tree, etag = await NodeService.get_all_child_nodes(node_id, academic_year, context, if_none_match, depth, expand)
+    response.headers["ETag"] = etag
+    return tree
+
+@nodeRouter.get("/{node_id}/coverage", status_code=200, response_model=PydanticNodeCoverage)
+async def get_node_coverage(node_id: int, academic_year: int, context: AuthenticatedContext,
+                            only_gaps: bool = False) -> PydanticNodeCoverage:
+    """
+    This method returns the assigned and unassigned groups and hours of every UE located under the node.
+    If only_gaps is True, only the UEs and courses with unassigned groups are listed.
+    """
+    return await CoverageService.get_node_coverage(node_id, academic_year, context, only_gaps)
+
+
+@nodeRouter.get("/{node_id}/ancestors", status_code=200, response_model=list[PydanticNodeModel])
+async def get_node_ancestors(node_id: int, academic_year: int, context: AuthenticatedContext) -> list[PydanticNodeModel]:
+    """
+    This method returns the ancestors of the given node, from the root to the node itself.
     """
-    return await NodeService.get_all_child_nodes(node_id, academic_year, current_account)
+    return await NodeService.get_node_ancestors(node_id, context)
 
 
 @nodeRouter.post("/", status_code=201, response_model=PydanticNodeModelWithChildIds)
-async def add_node(academic_year: int, node_to_add: PydanticNodeCreateModel, current_account: AuthenticatedAccount) -> PydanticNodeModelWithChildIds:
+async def add_node(academic_year: int, node_to_add: PydanticNodeCreateModel, context: AuthenticatedContext) -> PydanticNodeModelWithChildIds:
     """
     This method creates a new node.
     """
-    return await NodeService.create_node(academic_year, node_to_add, current_account)
+    return await NodeService.create_node(academic_year, node_to_add, context)
 
 @nodeRouter.patch("/{node_id}", status_code=205)
-async def modify_node(academic_year: int, node_id: int, new_data: PydanticNodeUpdateModel, current_account: AuthenticatedAccount) -> Response:
+async def modify_node(academic_year: int, node_id: int, new_data: PydanticNodeUpdateModel, context: AuthenticatedContext) -> Response:
     """
     This method modifies the node of the given node id.
     """
-    await NodeService.update_node(academic_year, node_id, new_data, current_account)
+    await NodeService.update_node(academic_year, node_id, new_data, context)
     return Response(status_code=205)
 
 @nodeRouter.delete("/{node_id}", status_code=204)
-async def delete_node(academic_year: int, node_id: int, current_account: AuthenticatedAccount) -> None:
+async def delete_node(academic_year: int, node_id: int, context: AuthenticatedContext) -> None:
     """
     This method deletes the node of the given node id.
     """
-    return await NodeService.delete_node(academic_year, node_id, current_account)
+    return await NodeService.delete_node(academic_year, node_id, context)
@@ -6,10 +6,11 @@ from fastapi import APIRouter, Response
 from app.models.pydantic.ProfileModel import (PydanticProfileModify,
                                               PydanticProfileCreate,
                                               PydanticProfileResponse, PydanticNumberOfProfile)
-from app.models.aliases import AuthenticatedAccount
+from app.models.aliases import AuthenticatedContext
 from app.models.pydantic.tools.pagination import PydanticPagination
+from app.models.pydantic.WorkloadModel import PydanticProfileWorkload
 from app.routes.tags import Tag
-from app.services import ProfileService
+from app.services import ProfileService, WorkloadService
 
 profileRouter: APIRouter = APIRouter(prefix="/profile")
 tag: Tag = {
@@ -19,45 +20,45 @@ tag: Tag = {
 
 
 @profileRouter.post("/", status_code=201)
-async def create_profile(body: PydanticProfileCreate, academic_year: int, current_account: AuthenticatedAccount) -> None:
+async def create_profile(body: PydanticProfileCreate, academic_year: int, context: AuthenticatedContext) -> None:
     """
     This method creates a new Profile
     and return his password.
     """
-    await ProfileService.create_profile(body, current_account)
+    await ProfileService.create_profile(body, context)
 
 
 @profileRouter.patch("/{profile_id}", status_code=205)
 async def modify_profile(profile_id: int, academic_year: int, profile_model: PydanticProfileModify,
-                         current_account: AuthenticatedAccount) -> Response:
+                         context: AuthenticatedContext) -> Response:
     """
     This controllers is used when modifying Profile informations.
     """
-    await ProfileService.modify_profile(profile_id, profile_model, current_account)
+    await ProfileService.modify_profile(profile_id, profile_model, context)
     return Response(status_code=205)
 
 
 @profileRouter.get("/", response_model=list[PydanticProfileResponse], status_code=200)
-async def get_all_profiles(academic_year: int, current_account: AuthenticatedAccount, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[PydanticProfileResponse]:
+async def get_all_profiles(academic_year: int, context: AuthenticatedContext, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[PydanticProfileResponse]:
     """
     Retrieves a list of all Profiles.
     """
 
     body: PydanticPagination = PydanticPagination.create_model(page, limit, order)
 
-    return await ProfileService.get_all_profiles(academic_year, current_account, body)
+    return await ProfileService.get_all_profiles(academic_year, context, body)
 
 
 @profileRouter.get("/me", response_model=PydanticProfileResponse, status_code=200)
-async def get_current_profile(academic_year: int, current_account: AuthenticatedAccount) -> PydanticProfileResponse:
+async def get_current_profile(academic_year: int, context: AuthenticatedContext) -> PydanticProfileResponse:
     """
     Retrieves data from the currently connected Profile.
     """
-    return await ProfileService.get_current_profile(current_account)
+    return await ProfileService.get_current_profile(context)
 
 
 @profileRouter.get("/notlinked", response_model=list[PydanticProfileResponse], status_code=200)
-async def get_profiles_not_linked_to_account(academic_year: int, current_account: AuthenticatedAccount, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[
+async def get_profiles_not_linked_to_account(academic_year: int, context: AuthenticatedContext, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[
     PydanticProfileResponse]:
     """
     Returns all the profiles that are not linked to an account for the given academic year.
@@ -65,37 +66,53 @@ async def get_profiles_not_linked_to_account(academic_year: int, current_account
 
     body: PydanticPagination = PydanticPagination.create_model(page, limit, order)
 
-    return await ProfileService.get_profiles_not_linked_to_account(academic_year, current_account, body)
+    return await ProfileService.get_profiles_not_linked_to_account(academic_year, context, body)
 
 
 @profileRouter.get("/search/{keywords}/", response_model=list[PydanticProfileResponse], status_code=200)
-async def search_profile(keywords: str, current_account: AuthenticatedAccount, academic_year: int, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[PydanticProfileResponse]:
+async def search_profile(keywords: str, context: AuthenticatedContext, academic_year: int, page: int | None = None, limit: int | None = None, order: str | None = None) -> list[PydanticProfileResponse]:
     """
     This method retrieves profiles that matches the keywords provided.
     """
     body: PydanticPagination = PydanticPagination.create_model(page, limit, order)
 
-    return await ProfileService.search_profile_by_keywords(keywords, academic_year, current_account, body)
+    return await ProfileService.search_profile_by_keywords(keywords, academic_year, context, body)
 
 @profileRouter.get("/nb", status_code=200, response_model=PydanticNumberOfProfile)
-async def get_nb_profile(academic_year: int, current_account: AuthenticatedAccount) -> PydanticNumberOfProfile:
+async def get_nb_profile(academic_year: int, context: AuthenticatedContext) -> PydanticNumberOfProfile:
     """
     This method get the number of profile in the database.
     """
-    return await ProfileService.get_number_of_profile(academic_year, current_account)
+    return await ProfileService.get_number_of_profile(academic_year, context)
+
+
+@profileRouter.get("/workload", response_model=list[PydanticProfileWorkload], status_code=200)
+async def get_workloads(academic_year: int, context: AuthenticatedContext) -> list[PydanticProfileWorkload]:
+    """
+    Returns the weighted service hours, the remaining quota and the balance of every profile of the academic year.
+    """
+    return await WorkloadService.get_workloads(academic_year, context)
+
+
+@profileRouter.get("/{profile_id}/workload", response_model=PydanticProfileWorkload, status_code=200)
+async def get_profile_workload(profile_id: int, academic_year: int, context: AuthenticatedContext) -> PydanticProfileWorkload:
+    """
+    Returns the weighted service hours, the remaining quota and the balance of a Profile.
+    """
+    return await WorkloadService.get_profile_workload(profile_id, academic_year, context)
 
 
 @profileRouter.get("/{profile_id}", response_model=PydanticProfileResponse, status_code=200)
-async def get_profile_by_id(profile_id: int, academic_year: int, current_account: AuthenticatedAccount) -> PydanticProfileResponse:
+async def get_profile_by_id(profile_id: int, academic_year: int, context: AuthenticatedContext) -> PydanticProfileResponse:
     """
     Retrieves a Profile by their ID.
     """
-    return await ProfileService.get_profile_by_id(profile_id, current_account)
+    return await ProfileService.get_profile_by_id(profile_id, context)
 
 
 @profileRouter.delete("/{profile_id}", status_code=204)
-async def delete_profile(profile_id: int, academic_year: int, current_account: AuthenticatedAccount) -> None:
+async def delete_profile(profile_id: int, academic_year: int, context: AuthenticatedContext) -> None:
     """
     This route is used for deleting a Profile
     """
-    await ProfileService.delete_profile(profile_id, current_account)
+    await ProfileService.delete_profile(profile_id, context)
@@ -3,7 +3,7 @@ This module provieds a router for the /role endpoint.
 """
 from fastapi import APIRouter
 
-from app.models.aliases import AuthenticatedAccount
+from app.models.aliases import AuthenticatedContext
 from app.models.pydantic.PydanticRole import (PydanticCreateRoleModel,
                                               PydanticUpdateRoleModel,
                                               PydanticRoleResponseModel)
@@ -19,37 +19,37 @@ tag: Tag = {
 
 
 @roleRouter.get("/", status_code=200, response_model=list[PydanticRoleResponseModel])
-async def get_all_roles(current_account: AuthenticatedAccount) -> list[PydanticRoleResponseModel]:
+async def get_all_roles(context: AuthenticatedContext) -> list[PydanticRoleResponseModel]:
     """
     This method returns all the roles.
     """
-    return await RoleService.get_all_roles(current_account)
+    return await RoleService.get_all_roles(context)
 
 
 @roleRouter.get("/{role_name}", status_code=200, response_model=PydanticRoleResponseModel)
-async def get_role_by_name(role_name: str,current_account: AuthenticatedAccount) -> PydanticRoleResponseModel:
+async def get_role_by_name(role_name: str,context: AuthenticatedContext) -> PydanticRoleResponseModel:
     """
     This method returns the role of the given role name.
     """
-    return await RoleService.get_role_by_id(role_name, current_account)
+    return await RoleService.get_role_by_id(role_name, context)
 
 @roleRouter.post("/", status_code=201)
-async def add_role(body: PydanticCreateRoleModel, current_account: AuthenticatedAccount) -> None:
+async def add_role(body: PydanticCreateRoleModel, context: AuthenticatedContext) -> None:
     """
     This method creates a new role.
     """
-    await RoleService.add_role(body, current_account)
+    await RoleService.add_role(body, context)
 
 @roleRouter.patch("/{role_name}", status_code=205)
-async def modify_role(body : PydanticUpdateRoleModel, role_name: str, current_account: AuthenticatedAccount) -> None :
+async def modify_role(body : PydanticUpdateRoleModel, role_name: str, context: AuthenticatedContext) -> None :
     """
     This method modifies the role of the given role id.
     """
-    await RoleService.modify_role(role_name, body, current_account)
+    await RoleService.modify_role(role_name, body, context)
 
 @roleRouter.delete("/{role_name}", status_code=204)
-async def delete_role( role_name: str, current_account: AuthenticatedAccount) -> None:
+async def delete_role( role_name: str, context: AuthenticatedContext) -> None:
     """
     This method deletes the role of the given role id.
     """
-    await RoleService.delete_role(role_name, current_account)
+    await RoleService.delete_role(role_name, context)
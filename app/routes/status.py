@@ -7,7 +7,7 @@ Used to manage status operations.
 
 from fastapi import APIRouter
 
-from app.models.aliases import AuthenticatedAccount
+from app.models.aliases import AuthenticatedContext
 from app.models.pydantic.StatusModel import PydanticStatusResponseModel
 from app.routes.tags import Tag
 from app.services import StatusService
@@ -19,11 +19,11 @@ tag: Tag = {
 }
 
 @statusRouter.get("/",status_code=200, response_model=list[PydanticStatusResponseModel])
-async def get_all_status(academic_year: int, current_account: AuthenticatedAccount) -> list[PydanticStatusResponseModel]:
+async def get_all_status(academic_year: int, context: AuthenticatedContext) -> list[PydanticStatusResponseModel]:
     """
     This method returns the status of the given status id.
     """
-    return await StatusService.get_all_status(academic_year, current_account)
+    return await StatusService.get_all_status(academic_year, context)
 
 @statusRouter.get("/{status_id}",status_code=200, response_model=None)
 async def get_status_by_id(status_id: int) -> None:
@@ -5,14 +5,15 @@ Used to manage ue operations.
 
 from fastapi import APIRouter
 
-from app.models.aliases import AuthenticatedAccount
+from app.models.aliases import AuthenticatedContext
+from app.models.pydantic.CoverageModel import PydanticUECoverage
 from app.models.pydantic.UEModel import (
     PydanticUEModel,
     PydanticCreateUEModel,
     PydanticModifyUEModel,
 )
 from app.routes.tags import Tag
-from app.services import UEService
+from app.services import CoverageService, UEService
 
 
 ueRouter: APIRouter = APIRouter(prefix="/ue")
@@ -20,65 +21,76 @@ tag: Tag = {"name": "UE", "description": "UE-related operations."}
 
 @ueRouter.get("/{ue_id}", status_code=200, response_model=PydanticUEModel)
 async def get_ue_by_id(
-    ue_id: int, current_account: AuthenticatedAccount
+    ue_id: int, context: AuthenticatedContext
 ) -> PydanticUEModel:
     """
     This method returns the UE of the given UE id.
     """
-    return await UEService.get_ue_by_id(ue_id, current_account)
+    return await UEService.get_ue_by_id(ue_id, context)
+
+
+@ueRouter.get("/{ue_id}/coverage", status_code=200, response_model=PydanticUECoverage)
+async def get_ue_coverage(
+    ue_id: int, context: AuthenticatedContext, only_gaps: bool = False
+) -> PydanticUECoverage:
+    """
+    This method returns the assigned and unassigned groups and hours of the courses of the UE.
+    If only_gaps is True, only the courses with unassigned groups are listed.
+    """
+    return await CoverageService.get_ue_coverage(ue_id, context, only_gaps)
 
 
 @ueRouter.get("/affectedto/{profile_id}", status_code=200, response_model=list[PydanticUEModel])
 async def get_ue_by_affected_profile(
     academic_year: int,
-    profile_id: int, current_account: AuthenticatedAccount
+    profile_id: int, context: AuthenticatedContext
 ) -> list[PydanticUEModel]:
     """
     This method returns the UEs affected to the given profile id.
     """
-    return await UEService.get_ue_by_affected_profile(academic_year, profile_id, current_account)
+    return await UEService.get_ue_by_affected_profile(academic_year, profile_id, context)
 
 
 @ueRouter.post("/", status_code=201)
 async def add_ue(
-    body: PydanticCreateUEModel, current_account: AuthenticatedAccount
+    body: PydanticCreateUEModel, context: AuthenticatedContext
 ) -> None:
     """
     This method creates a new UE.
     """
-    await UEService.add_ue(body, current_account)
+    await UEService.add_ue(body, context)
 
 @ueRouter.post("/attach/{ue_id}/{node_id}", status_code=201)
 async def attach_ue_to_node(academic_year: int,
-    ue_id: int, node_id: int, current_account: AuthenticatedAccount
+    ue_id: int, node_id: int, context: AuthenticatedContext
 ) -> None:
     """
     This method attaches the UE to the parent node.
     """
-    await UEService.attach_ue_to_node(ue_id, node_id, academic_year,  current_account)
+    await UEService.attach_ue_to_node(ue_id, node_id, academic_year,  context)
 
 @ueRouter.post("/detach/{ue_id}/{node_id}", status_code=201)
 async def detach_ue_from_node(academic_year: int,
-    ue_id: int, node_id: int, current_account: AuthenticatedAccount
+    ue_id: int, node_id: int, context: AuthenticatedContext
 ) -> None:
     """
     This method detaches the UE from the parent node.
     """
-    await UEService.detach_ue_from_node(ue_id, node_id, academic_year, current_account)
+    await UEService.detach_ue_from_node(ue_id, node_id, academic_year, context)
 
 
 @ueRouter.patch("/{ue_id}", status_code=205)
 async def modify_ue(
-    ue_id: int, body: PydanticModifyUEModel, current_account: AuthenticatedAccount
+    ue_id: int, body: PydanticModifyUEModel, context: AuthenticatedContext
 ) -> None:
     """
     This method modifies the UE of the given UE id.
     """
-    return await UEService.modify_ue(ue_id, body, current_account)
+    return await UEService.modify_ue(ue_id, body, context)
 
 @ueRouter.delete("/{ue_id}", status_code=204)
-async def delete_ue(ue_id: int, current_account: AuthenticatedAccount) -> None:
+async def delete_ue(ue_id: int, context: AuthenticatedContext) -> None:
     """
     This method deletes the UE of the given UE id.
     """
-    return await UEService.delete_ue(ue_id, current_account)
+    return await UEService.delete_ue(ue_id, context)
@@ -2,37 +2,98 @@
 Academic_Year services. Basically the real functionalities concerning the Academic_Year_Table model.
 """
 from fastapi import HTTPException
+from tortoise.transactions import in_transaction
 
 from app.models.pydantic.AcademicYearTable import PydanticAcademicTableModel
 from app.models.tortoise.academic_year_table import AcademicYearTableInDB
-from app.models.tortoise.account import AccountInDB
-from app.services.PermissionService import check_permissions
+from app.models.tortoise.account_metadata import AccountMetadataInDB
+from app.models.tortoise.coefficient import CoefficientInDB
+from app.models.tortoise.course import CourseInDB
+from app.models.tortoise.node import NodeInDB
+from app.models.tortoise.profile import ProfileInDB
+from app.models.tortoise.ue import UEInDB
+from app.services.ArborescenceService import ArborescenceCache
+from app.services.PermissionService import AccountRoleCache, AuthContext
 from app.utils.enums.http_errors import CommonErrorMessages
 from app.utils.enums.permission_enums import AvailableServices, AvailableOperations
+from app.utils.printers import print_info
 
+# Statements cloning an academic year ("source") into another one ("target"), in this order.
+# Nodes, UEs and courses get their new ids from their sequences through temporary mapping tables,
+# so that the associations can be cloned with a join. Affectations are not cloned.
+ROLLOVER_STATEMENTS: list[tuple[str, tuple[str, ...]]] = [
+    ('CREATE TEMPORARY TABLE "rollover_node_map" ("old_id" INT PRIMARY KEY, "new_id" INT NOT NULL) ON COMMIT DROP', ()),
+    ('CREATE TEMPORARY TABLE "rollover_ue_map" ("old_id" INT PRIMARY KEY, "new_id" INT NOT NULL) ON COMMIT DROP', ()),
+    ('CREATE TEMPORARY TABLE "rollover_course_map" ("old_id" INT PRIMARY KEY, "new_id" INT NOT NULL) ON COMMIT DROP', ()),
+    ('''INSERT INTO "rollover_node_map" ("old_id", "new_id")
+       SELECT "id", nextval(pg_get_serial_sequence('"Node"', 'id')) FROM "Node" WHERE "academic_year" = $1''', ("source",)),
+    ('''INSERT INTO "rollover_ue_map" ("old_id", "new_id")
+       SELECT "id", nextval(pg_get_serial_sequence('"UE"', 'id')) FROM "UE" WHERE "academic_year" = $1''', ("source",)),
+    ('''INSERT INTO "rollover_course_map" ("old_id", "new_id")
+       SELECT "id", nextval(pg_get_serial_sequence('"Course"', 'id')) FROM "Course" WHERE "academic_year" = $1''', ("source",)),
+    ('''INSERT INTO "Node" ("id", "name", "is_root", "parent_id", "academic_year")
+       SELECT "map"."new_id", "node"."name", "node"."is_root", "parent_map"."new_id", $1
+         FROM "Node" AS "node"
+         JOIN "rollover_node_map" AS "map" ON "map"."old_id" = "node"."id"
+         LEFT JOIN "rollover_node_map" AS "parent_map" ON "parent_map"."old_id" = "node"."parent_id"''', ("target",)),
+    ('''INSERT INTO "UE" ("id", "name", "is_root", "academic_year")
+       SELECT "map"."new_id", "ue"."name", "ue"."is_root", $1
+         FROM "UE" AS "ue"
+         JOIN "rollover_ue_map" AS "map" ON "map"."old_id" = "ue"."id"''', ("target",)),
+    ('''INSERT INTO "Course" ("id", "duration", "group_count", "course_type_id", "academic_year")
+       SELECT "map"."new_id", "course"."duration", "course"."group_count", "course"."course_type_id", $1
+         FROM "Course" AS "course"
+         JOIN "rollover_course_map" AS "map" ON "map"."old_id" = "course"."id"''', ("target",)),
+    ('''INSERT INTO "UE_NODE_ASSOCIATION" ("UE_id", "nodeindb_id")
+       SELECT "ue_map"."new_id", "node_map"."new_id"
+         FROM "UE_NODE_ASSOCIATION" AS "association"
+         JOIN "rollover_ue_map" AS "ue_map" ON "ue_map"."old_id" = "association"."UE_id"
+         JOIN "rollover_node_map" AS "node_map" ON "node_map"."old_id" = "association"."nodeindb_id"''', ()),
+    ('''INSERT INTO "UE_COURSES_ASSOCIATION" ("UE_id", "courseindb_id")
+       SELECT "ue_map"."new_id", "course_map"."new_id"
+         FROM "UE_COURSES_ASSOCIATION" AS "association"
+         JOIN "rollover_ue_map" AS "ue_map" ON "ue_map"."old_id" = "association"."UE_id"
+         JOIN "rollover_course_map" AS "course_map" ON "course_map"."old_id" = "association"."courseindb_id"''', ()),
+    ('''INSERT INTO "NodeClosure" ("ancestor_id", "descendant_id", "depth", "academic_year")
+       SELECT "ancestor_map"."new_id", "descendant_map"."new_id", "closure"."depth", $1
+         FROM "NodeClosure" AS "closure"
+         JOIN "rollover_node_map" AS "ancestor_map" ON "ancestor_map"."old_id" = "closure"."ancestor_id"
+         JOIN "rollover_node_map" AS "descendant_map" ON "descendant_map"."old_id" = "closure"."descendant_id"''', ("target",)),
+    ('''INSERT INTO "NodeHours" ("node_id", "planned_hours", "assigned_hours", "academic_year")
+       SELECT "map"."new_id", "hours"."planned_hours", 0, $1
+         FROM "NodeHours" AS "hours"
+         JOIN "rollover_node_map" AS "map" ON "map"."old_id" = "hours"."node_id"''', ("target",)),
+    ('''INSERT INTO "Coefficient" ("multiplier", "course_type_id", "status_id", "academic_year")
+       SELECT "multiplier", "course_type_id", "status_id", $2 FROM "Coefficient" WHERE "academic_year" = $1''', ("source", "target")),
+    ('''INSERT INTO "Profile" ("firstname", "lastname", "mail", "quota", "account_id", "status_id", "academic_year")
+       SELECT "firstname", "lastname", "mail", "quota", "account_id", "status_id", $2 FROM "Profile" WHERE "academic_year" = $1''', ("source", "target")),
+    ('''INSERT INTO "ProfileWorkload" ("profile_id", "assigned_hours", "weighted_hours", "academic_year")
+       SELECT "id", 0, 0, $1 FROM "Profile" WHERE "academic_year" = $1''', ("target",)),
+    ('''INSERT INTO "AccountMetadata" ("account_id", "role_id", "academic_year")
+       SELECT "account_id", "role_id", $2 FROM "AccountMetadata" WHERE "academic_year" = $1''', ("source", "target")),
+]
 
-async def get_all_academic_year(current_account : AccountInDB) -> list[PydanticAcademicTableModel]:
+
+async def get_all_academic_year(context: AuthContext) -> list[PydanticAcademicTableModel]:
     """
         This method retrieves all the academic year.
     """
 
-    await check_permissions(AvailableServices.PROFILE_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.GET)
 
 
     academic_years : list[AcademicYearTableInDB] = await AcademicYearTableInDB.all()
 
     return [PydanticAcademicTableModel.model_validate(academic_year) for academic_year in academic_years]
 
-async def create_new_academic_year(current_account : AccountInDB) -> PydanticAcademicTableModel:
+async def create_new_academic_year(context: AuthContext) -> PydanticAcademicTableModel:
     """
         This method create a new academic year by finding the most recent one and adding +1.
     """
 
-    await check_permissions(AvailableServices.PROFILE_SERVICE,
-                            AvailableOperations.CREATE,
-                            current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.CREATE)
 
 
     last_academic_year : AcademicYearTableInDB | None = await AcademicYearTableInDB.all().order_by('-academic_year').first()
@@ -49,3 +110,73 @@ async def create_new_academic_year(current_account : AccountInDB) -> PydanticAca
     )
 
     return PydanticAcademicTableModel.model_validate(new_academic_year_entry)
+
+
+async def rollover_academic_year(context: AuthContext) -> PydanticAcademicTableModel:
+    """
+        This method creates a new academic year like `create_new_academic_year`,
+        and clones the most recent one into it : the arborescence with its UEs and courses,
+        the coefficients, the profiles and the roles of the accounts.
+        Everything is copied by set-based statements inside a single transaction (PostgreSQL only).
+    """
+
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.CREATE)
+
+    async with in_transaction() as connection:
+        # Two rollovers at the same time would create the same academic year.
+        await connection.execute_query('LOCK TABLE "AcademicYear" IN SHARE ROW EXCLUSIVE MODE')
+
+        last_academic_year : AcademicYearTableInDB | None = await AcademicYearTableInDB.all()\
+                                                                                       .using_db(connection)\
+                                                                                       .order_by('-academic_year')\
+                                                                                       .first()
+        if last_academic_year is None:
+            raise HTTPException(status_code=404, detail=CommonErrorMessages.ACADEMIC_YEAR_NOT_FOUND.value)
+
+        new_academic_year : int = last_academic_year.academic_year + 1
+        new_academic_year_entry = await AcademicYearTableInDB.create(
+            academic_year=new_academic_year,
+            description=f"{new_academic_year}-{new_academic_year + 1}",
+            using_db=connection
+        )
+
+        params : dict[str, int] = {"source": last_academic_year.academic_year, "target": new_academic_year}
+        for statement, statement_params in ROLLOVER_STATEMENTS:
+            await connection.execute_query(statement, [params[name] for name in statement_params])
+
+    await ArborescenceCache.bump_version(new_academic_year)
+    print_info(f"Academic year {last_academic_year.academic_year} rolled over to {new_academic_year}.")
+
+    return PydanticAcademicTableModel.model_validate(new_academic_year_entry)
+
+
+async def delete_academic_year(academic_year: int, context: AuthContext) -> None:
+    """
+        This method deletes the most recent academic year, with everything it contains.
+        The older ones can't be deleted, so that the years stay contiguous.
+    """
+
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.DELETE)
+
+    async with in_transaction() as connection:
+        # A rollover at the same time would clone the academic year being deleted.
+        await connection.execute_query('LOCK TABLE "AcademicYear" IN SHARE ROW EXCLUSIVE MODE')
+
+        last_academic_year : AcademicYearTableInDB | None = await AcademicYearTableInDB.all()\
+                                                                                       .using_db(connection)\
+                                                                                       .order_by('-academic_year')\
+                                                                                       .first()
+        if last_academic_year is None or not await AcademicYearTableInDB.exists(academic_year=academic_year):
+            raise HTTPException(status_code=404, detail=CommonErrorMessages.ACADEMIC_YEAR_NOT_FOUND.value)
+        if last_academic_year.academic_year != academic_year:
+            raise HTTPException(status_code=409, detail=CommonErrorMessages.ACADEMIC_YEAR_NOT_LAST.value)
+
+        # The affectations, the workloads, the hierarchy index and the totals follow their rows.
+        for model in (ProfileInDB, CourseInDB, UEInDB, NodeInDB, CoefficientInDB, AccountMetadataInDB, AcademicYearTableInDB):
+            await model.filter(academic_year=academic_year).using_db(connection).delete()
+
+    await ArborescenceCache.bump_version(academic_year)
+    # The roles of the accounts for this academic year are gone.
+    await AccountRoleCache.invalidate_all()
@@ -5,7 +5,7 @@ Account services. Basically the real functionalities concerning the account mode
 import random
 import string
 
-from typing import Annotated, Any, Optional, TypeAlias
+from typing import Annotated, Any, TypeAlias
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
@@ -27,8 +27,8 @@ from app.models.tortoise.account_metadata import AccountMetadataInDB
 from app.models.tortoise.profile import ProfileInDB
 from app.models.tortoise.role import RoleInDB
 from app.services import SecurityService
-from app.services.PermissionService import check_permissions
-from app.services.Tokens import AvailableTokenAttributes, JWTData, Token
+from app.services.PermissionService import AccountRoleCache, AuthContext, load_auth_context
+from app.services.Tokens import AvailableTokenAttributes, JWTData, Token, revoke_sessions
 from app.utils.CustomExceptions import LoginAlreadyUsedException
 from app.utils.databases.utils import get_fields_from_model
 from app.utils.enums.http_errors import CommonErrorMessages
@@ -36,13 +36,12 @@ from app.utils.enums.permission_enums import (AvailableOperations,
                                               AvailableServices)
 
 
-async def get_account(academic_year: int, account_id: int, current_account: AccountInDB) -> PydanticAccountModel:
+async def get_account(academic_year: int, account_id: int, context: AuthContext) -> PydanticAccountModel:
     """
     This method retrieves an account by its ID.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
 
     account: AccountInDB | None = await AccountInDB.get_or_none(id=account_id) \
         .prefetch_related("profile")
@@ -60,13 +59,12 @@ async def get_account(academic_year: int, account_id: int, current_account: Acco
                                 profile=PydanticProfileResponse.model_validate(profile))
 
 
-async def get_accounts_linked_to_profile(academic_year: int, current_account: AccountInDB, body: PydanticPagination) -> list[PydanticAccountModel]:
+async def get_accounts_linked_to_profile(academic_year: int, context: AuthContext, body: PydanticPagination) -> list[PydanticAccountModel]:
     """
     This method retrieves all accounts linked to a profile.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
     accounts: list[AccountInDB] = await AccountInDB.all()\
                                                    .prefetch_related("profile")
     accounts_to_return: list[AccountInDB] = []
@@ -85,14 +83,12 @@ async def get_accounts_linked_to_profile(academic_year: int, current_account: Ac
             for account in accounts_to_return]))
 
 
-async def get_accounts_not_linked_to_profile(academic_year: int, current_account: AccountInDB, body: PydanticPagination) -> list[PydanticAccountWithoutProfileModel]:
+async def get_accounts_not_linked_to_profile(academic_year: int, context: AuthContext, body: PydanticPagination) -> list[PydanticAccountWithoutProfileModel]:
     """
     This method retrieves all accounts not linked to a profile.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account,
-                            academic_year)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
     accounts: list[AccountInDB] = await AccountInDB.all().prefetch_related("profile")
     accounts_to_return: list[AccountInDB] = []
 
@@ -107,14 +103,12 @@ async def get_accounts_not_linked_to_profile(academic_year: int, current_account
     return body.paginate_list([PydanticAccountWithoutProfileModel.model_validate(account) for account in accounts_to_return])
 
 
-async def get_all_accounts(academic_year: int, current_account: AccountInDB, body: PydanticPagination) -> list[PydanticAccountModel]:
+async def get_all_accounts(academic_year: int, context: AuthContext, body: PydanticPagination) -> list[PydanticAccountModel]:
     """
     This method retrieves all accounts.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account,
-                            academic_year)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
 
     # Forced to type ignore there since we access a protected member.
     valid_fields: dict[str, Any] = get_fields_from_model(AccountInDB)
@@ -141,14 +135,12 @@ async def get_all_accounts(academic_year: int, current_account: AccountInDB, bod
             for account in paginated_accounts]
 
 
-async def search_accounts_by_login(academic_year: int, keywords: str, current_account: AccountInDB) -> list[PydanticAccountModel]:
+async def search_accounts_by_login(academic_year: int, keywords: str, context: AuthContext) -> list[PydanticAccountModel]:
     """
     This method fetches the accounts which logins matches the query provided.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account,
-                            academic_year)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
 
     account_query: Q = Q()
     for keyword in keywords.split(" "):
@@ -178,16 +170,14 @@ async def search_accounts_by_login(academic_year: int, keywords: str, current_ac
     return accounts_to_return
 
 
-async def search_account_by_keywords(academic_year:int, keywords: str, current_account: AccountInDB, body: PydanticPagination) -> list[
+async def search_account_by_keywords(academic_year:int, keywords: str, context: AuthContext, body: PydanticPagination) -> list[
     PydanticAccountModel]:
     """
     This method retrieves accounts that match the keywords provided.
     The search applies to the following fields: login, firstname, lastname, and email.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account,
-                            academic_year)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
 
     valid_fields = get_fields_from_model(AccountInDB)
     order_field  = body.order_by.lstrip('-')
@@ -245,13 +235,12 @@ async def search_account_by_keywords(academic_year:int, keywords: str, current_a
 
 
 async def create_account(account: PydanticCreateAccountModel,
-                         current_account: AccountInDB) -> PydanticAccountPasswordResponse:
+                         context: AuthContext) -> PydanticAccountPasswordResponse:
     """
     This method creates an account.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.CREATE,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.CREATE)
 
     if await AccountInDB.filter(login=account.login).exists():
         raise LoginAlreadyUsedException
@@ -273,7 +262,7 @@ async def create_account(account: PydanticCreateAccountModel,
         password: str = account.password
 
     # We hash the password
-    hashed: str = SecurityService.get_password_hash(password)
+    hashed: str = await SecurityService.get_password_hash(password)
 
     account_to_create: AccountInDB = AccountInDB(login=account.login,
                                                  hash=hashed)
@@ -282,13 +271,12 @@ async def create_account(account: PydanticCreateAccountModel,
     return PydanticAccountPasswordResponse(password=password)
 
 
-async def delete_account(account_id: int, current_account: AccountInDB) -> None:
+async def delete_account(account_id: int, context: AuthContext) -> None:
     """
     This method deletes an account by its ID.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.DELETE,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.DELETE)
 
     account: AccountInDB | None = await AccountInDB.get_or_none(id=account_id)
 
@@ -296,16 +284,17 @@ async def delete_account(account_id: int, current_account: AccountInDB) -> None:
         raise HTTPException(status_code=404, detail=CommonErrorMessages.ACCOUNT_NOT_FOUND.value)
 
     await account.delete()
+    await AccountRoleCache.invalidate_account(account_id)
+    await revoke_sessions(account_id)
 
 
-async def modify_account(account_id: int, account: PydanticModifyAccountModel, current_account: AccountInDB) -> None:
+async def modify_account(account_id: int, account: PydanticModifyAccountModel, context: AuthContext) -> None:
     """
     This method modifies an account by its ID.
     """
 
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.UPDATE)
 
     account_to_modify: AccountInDB | None = await AccountInDB.get_or_none(id=account_id)
 
@@ -315,55 +304,57 @@ async def modify_account(account_id: int, account: PydanticModifyAccountModel, c
     if await AccountInDB.filter(login=account.login).exists():
         raise LoginAlreadyUsedException
 
-    if account.password is not None:
-        account_to_modify.hash = SecurityService.get_password_hash(account.password)
-
     try:
         account_to_modify.update_from_dict(account.model_dump(exclude={"password", "password_confirm"},  # type: ignore
                                                               exclude_none=True))  # type: ignore
 
         if account.password is not None:
-            account_to_modify.hash = SecurityService.get_password_hash(account.password)
+            account_to_modify.hash = await SecurityService.get_password_hash(account.password)
         await account_to_modify.save()
 
     except ValueError as e:
         raise HTTPException(status_code=409, detail=str(e)) from e
 
+    await AccountRoleCache.invalidate_account(account_id)
+    # Changing the password logs out every session of the account.
+    if account.password is not None:
+        await revoke_sessions(account_id)
+
 
 # This is a token that is provided by the OAuth Scheme.
 oauth2_scheme: OAuth2PasswordBearer = OAuth2PasswordBearer(tokenUrl="/auth/login")
 OAuthToken: TypeAlias = Annotated[str, Depends(oauth2_scheme)]
 
 
-async def get_current_account(token: OAuthToken) -> Optional["AccountInDB"]:
+async def get_auth_context(token: OAuthToken) -> AuthContext:
     """
-    This method returns the user corresponding to the user ID stored inside the token provided.
+    This method returns the authentication context of the account whose ID is stored inside the token provided.
+    The account and its role are loaded together, so that the permission checks do not need any query.
     :param token: Token used to extract data from.
     """
     # Trying to decode the token given
     token_pydantic: PydanticToken = PydanticToken(value=token)
     token_model: Token = token_pydantic.export_pydantic_to_model(AvailableTokenAttributes.AUTH_TOKEN.value)
-    token_payload: JWTData = token_model.extract_payload()
-
-    account_id: int = token_payload.account_id
+    token_payload: JWTData = await token_model.extract_payload()
 
     # If we get here, that means we managed to decode the token, and we got an user_id.
-    # Then, we try to get a user that corresponds to the user_id
-    account: AccountInDB | None = await AccountInDB.get_or_none(id=account_id)
+    # Then, we try to get the user that corresponds to the user_id, with its role.
+    context: AuthContext | None = await load_auth_context(token_payload.account_id)
+    if context is None:
+        raise HTTPException(status_code=401, detail=CommonErrorMessages.ACCOUNT_NOT_FOUND.value)
 
     # Otherwise, we successfully identified as the user in the database!
-    return account
+    return context
 
 
-async def get_role_account_by_id(account_id: int, current_account: AccountInDB,
+async def get_role_account_by_id(account_id: int, context: AuthContext,
                                  academic_year: int) -> PydanticRoleResponseModel:
     """
     This method returns the list of roles of an user.
     :param account_id: Account ID.
     """
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
 
     metadata: AccountMetadataInDB | None = await AccountMetadataInDB.get_or_none(account_id=account_id,
                                                                                  academic_year=academic_year) \
@@ -383,16 +374,15 @@ async def get_role_account_by_id(account_id: int, current_account: AccountInDB,
                                      description=role.description)
 
 
-async def set_role_account_by_name(account_id: int, current_account: AccountInDB,
+async def set_role_account_by_name(account_id: int, context: AuthContext,
                                    body: PydanticSetRoleToAccountModel) -> None:
     """
     This method set the role of an account.
     :param account_id: Account ID, role_name : name of the given role.
     """
 
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.UPDATE)
 
     account: AccountInDB | None = await AccountInDB.get_or_none(id=account_id)
 
@@ -400,7 +390,7 @@ async def set_role_account_by_name(account_id: int, current_account: AccountInDB
         raise HTTPException(status_code=404,
                             detail=CommonErrorMessages.ACCOUNT_NOT_FOUND.value)
 
-    if account.id == current_account.id:
+    if account.id == context.account_id:
         raise HTTPException(status_code=403,
                             detail=CommonErrorMessages.CANNOT_SET_YOUR_OWN_ROLE)
 
@@ -412,16 +402,16 @@ async def set_role_account_by_name(account_id: int, current_account: AccountInDB
 
     await AccountMetadataInDB.filter(account_id=account_id,
                                      academic_year=body.academic_year).update(role_id=role.name)
+    await AccountRoleCache.invalidate_account(account_id)
 
 
-async def get_number_of_account(current_account: AccountInDB) -> NumberOfElement:
+async def get_number_of_account(context: AuthContext) -> NumberOfElement:
     """
     This method get the number of account.
     """
 
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
 
     number_account: int = await AccountInDB.all().count()
 
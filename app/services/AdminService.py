@@ -0,0 +1,19 @@
+"""
+This module provides services to monitor the server.
+"""
+
+from app.models.pydantic.StatsModel import PydanticDatabasePoolStats
+from app.services.PermissionService import AuthContext
+from app.utils.databases.postgresql import Postgresql
+from app.utils.enums.permission_enums import AvailableOperations, AvailableServices
+
+
+async def get_database_pool_stats(context: AuthContext) -> PydanticDatabasePoolStats:
+    """
+    This method returns the usage of the connection pool to the database, on the worker that answers.
+    Only the accounts managing the roles, the administrators, can read it.
+    """
+    await context.check(AvailableServices.ROLE_SERVICE,
+                        AvailableOperations.UPDATE)
+
+    return Postgresql.get_pool_stats()
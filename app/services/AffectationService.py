@@ -4,39 +4,45 @@ Used to assign/unassign classes to teachers and retrieve these informations.
 """
 
 from datetime import datetime
+from typing import Any
+
 from fastapi import HTTPException
-from app.models.pydantic.AffectationModel import PydanticAffectation, PydanticAffectationInCreate, PydanticAffectationInModify
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from app.models.pydantic.AffectationModel import (PydanticAffectation,
+                                                  PydanticAffectationBatch,
+                                                  PydanticAffectationBatchError,
+                                                  PydanticAffectationBatchResult,
+                                                  PydanticAffectationInCreate,
+                                                  PydanticAffectationInModify)
 from app.models.pydantic.CourseModel import PydanticCourseModel
 from app.models.pydantic.ProfileModel import PydanticProfileResponse
-from app.models.tortoise.account import AccountInDB
 from app.models.tortoise.affectation import AffectationInDB
 from app.models.tortoise.course import CourseInDB
 from app.models.tortoise.profile import ProfileInDB
-from app.services.PermissionService import check_permissions
+from app.services import NodeHoursService, WorkloadService
+from app.services.ArborescenceService import ArborescenceCache
+from app.services.PermissionService import AuthContext
 from app.utils.enums.http_errors import CommonErrorMessages
 from app.utils.enums.permission_enums import AvailableOperations, AvailableServices
 
 
-async def get_teacher_affectations(profile_id: int, current_account: AccountInDB) -> list[PydanticAffectation]:
+async def get_teacher_affectations(profile_id: int, context: AuthContext) -> list[PydanticAffectation]:
     """
     This method returns all classes assigned to a teacher.
     """
 
-    await check_permissions(AvailableServices.AFFECTATION_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.AFFECTATION_SERVICE,
+                        AvailableOperations.GET)
 
     profile : ProfileInDB | None = await ProfileInDB.get_or_none(id=profile_id)
     if profile is None:
         raise HTTPException(status_code=404, detail=CommonErrorMessages.PROFILE_NOT_FOUND)
 
+    # Courses and course types are joined in the same query.
     affectations : list[AffectationInDB] = await AffectationInDB.filter(profile_id=profile_id)\
-                                                                .prefetch_related("course")
-    for affectation in affectations:
-        await affectation.fetch_related("course")
-        print("Affectation: ", affectation.id, " Course: ", affectation.course.id)
-        if affectation.course is not None:
-            await affectation.course.fetch_related("course_type")
+                                                                .select_related("course__course_type")
 
     return [PydanticAffectation(
                 id=affectation.id,
@@ -48,14 +54,13 @@ async def get_teacher_affectations(profile_id: int, current_account: AccountInDB
                 group=affectation.group
             ) for affectation in affectations]
 
-async def get_course_affectations(course_id: int, current_account: AccountInDB) -> list[PydanticAffectation]:
+async def get_course_affectations(course_id: int, context: AuthContext) -> list[PydanticAffectation]:
     """
     This method returns all teachers assigned to a class.
     """
 
-    await check_permissions(AvailableServices.AFFECTATION_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.AFFECTATION_SERVICE,
+                        AvailableOperations.GET)
 
     course : CourseInDB | None = await CourseInDB.get_or_none(id=course_id)
     if course is None:
@@ -75,14 +80,13 @@ async def get_course_affectations(course_id: int, current_account: AccountInDB)
                 group=affectation.group
             ) for affectation in affectations]
 
-async def assign_course_to_profile(affectation: PydanticAffectationInCreate, current_account: AccountInDB) -> PydanticAffectation:
+async def assign_course_to_profile(affectation: PydanticAffectationInCreate, context: AuthContext) -> PydanticAffectation:
     """
     This method assigns a course to a teacher.
     """
 
-    await check_permissions(AvailableServices.AFFECTATION_SERVICE,
-                            AvailableOperations.CREATE,
-                            current_account)
+    await context.check(AvailableServices.AFFECTATION_SERVICE,
+                        AvailableOperations.CREATE)
 
     profile_id: int = affectation.profile_id
     course_id: int = affectation.course_id
@@ -100,13 +104,19 @@ async def assign_course_to_profile(affectation: PydanticAffectationInCreate, cur
     if course.group_count < affectation.group or affectation.group < 1:
         raise HTTPException(status_code=400, detail=CommonErrorMessages.AFFECTATION_GROUP_INVALID)
 
-    affectation_created: AffectationInDB = await AffectationInDB.create(profile_id=profile_id,
-                                                                        course_id=course_id,
-                                                                        notes=affectation.notes,
-                                                                        hours=affectation.hours,
-                                                                        group=affectation.group,
-                                                                        date=datetime.now())
-    
+    async with in_transaction():
+        affectation_created: AffectationInDB = await AffectationInDB.create(profile_id=profile_id,
+                                                                            course_id=course_id,
+                                                                            notes=affectation.notes,
+                                                                            hours=affectation.hours,
+                                                                            group=affectation.group,
+                                                                            date=datetime.now())
+        updated_years: set[int] = await NodeHoursService.add_to_course(course_id, 0, affectation_created.hours)
+        await WorkloadService.add_affectation_hours(profile_id, course_id, affectation_created.hours)
+    # Totals are displayed in the arborescence.
+    for academic_year in updated_years:
+        await ArborescenceCache.bump_version(academic_year)
+
     await affectation_created.fetch_related("profile", "course")
 
     return PydanticAffectation(
@@ -119,14 +129,13 @@ async def assign_course_to_profile(affectation: PydanticAffectationInCreate, cur
                 group=affectation_created.group)
 
 
-async def modify_affectation_by_affectation_id(current_account: AccountInDB, new_data: PydanticAffectationInModify, affectation_id: int) -> None:
+async def modify_affectation_by_affectation_id(context: AuthContext, new_data: PydanticAffectationInModify, affectation_id: int) -> None:
     """
     This method modifies an affectation.
     Searches the affectation with the affectation ID and the calls the method that changes info.
     """
-    await check_permissions(AvailableServices.AFFECTATION_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account)
+    await context.check(AvailableServices.AFFECTATION_SERVICE,
+                        AvailableOperations.UPDATE)
     
     affectation: AffectationInDB | None = await AffectationInDB.get_or_none(id=affectation_id)
     if affectation is None:
@@ -134,15 +143,14 @@ async def modify_affectation_by_affectation_id(current_account: AccountInDB, new
     
     return await modify_affectation(new_data, affectation)
 
-async def modify_affectation_by_profile_and_course(current_account: AccountInDB, new_data: PydanticAffectationInModify, profile_id: int, course_id: int) -> None:
+async def modify_affectation_by_profile_and_course(context: AuthContext, new_data: PydanticAffectationInModify, profile_id: int, course_id: int) -> None:
     """
     This method modifies an affectation.
     Searches the affectation with the profile and course id.
     Then calls the method to change the informations.
     """
-    await check_permissions(AvailableServices.AFFECTATION_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account)
+    await context.check(AvailableServices.AFFECTATION_SERVICE,
+                        AvailableOperations.UPDATE)
 
     affectation: AffectationInDB | None = await AffectationInDB.get_or_none(profile_id=profile_id,
                                                                             course_id=course_id)
@@ -156,54 +164,82 @@ async def modify_affectation(new_data: PydanticAffectationInModify, affectation:
     This method modifies an affectation.
     CAREFUL : It is not checking the permissions. Not meant to be directly used.
     """
-    has_changed : bool = False
-    if new_data.profile_id is not None:
-        profile: ProfileInDB | None = await ProfileInDB.get_or_none(id=new_data.profile_id)
-        if profile is None:
-            raise HTTPException(status_code=404, detail=CommonErrorMessages.PROFILE_NOT_FOUND)
-        affectation.profile = profile
-        has_changed = True
-
-    if new_data.course_id is not None:
-        course: CourseInDB | None = await CourseInDB.get_or_none(id=new_data.course_id)
-        if course is None:
-            raise HTTPException(status_code=404, detail=CommonErrorMessages.COURSE_NOT_FOUND)
-        affectation.course = course
-        has_changed = True
-
-    if new_data.hours is not None:
-        affectation.hours = new_data.hours
-        has_changed = True
-
-    if new_data.notes is not None:
-        affectation.notes = new_data.notes
-        has_changed = True
-
-    if new_data.group is not None:
-        course: CourseInDB | None = await affectation.course.first()
-        if course is None:
-            raise HTTPException(status_code=404,
-                                detail=CommonErrorMessages.COURSE_NOT_FOUND)
-        else:
+    async with in_transaction():
+        # The row is read again and locked, so that the hours removed from the totals are the stored ones.
+        locked: AffectationInDB | None = await AffectationInDB.filter(id=affectation.id).select_for_update().first()
+        if locked is None:
+            raise HTTPException(status_code=404, detail=CommonErrorMessages.AFFECTATION_NOT_FOUND)
+        affectation = locked
+
+        profile_id_before: int = affectation.profile_id # type: ignore
+        course_id_before : int = affectation.course_id # type: ignore
+        hours_before     : int = affectation.hours
+        has_changed : bool = False
+        if new_data.profile_id is not None:
+            profile: ProfileInDB | None = await ProfileInDB.get_or_none(id=new_data.profile_id)
+            if profile is None:
+                raise HTTPException(status_code=404, detail=CommonErrorMessages.PROFILE_NOT_FOUND)
+            affectation.profile = profile
+            has_changed = True
+
+        if new_data.course_id is not None:
+            course: CourseInDB | None = await CourseInDB.get_or_none(id=new_data.course_id)
+            if course is None:
+                raise HTTPException(status_code=404, detail=CommonErrorMessages.COURSE_NOT_FOUND)
             affectation.course = course
-        if new_data.group < 1 or new_data.group > affectation.course.group_count:
-            raise HTTPException(status_code=400, detail=CommonErrorMessages.AFFECTATION_GROUP_INVALID)
-        affectation.group = new_data.group
-        has_changed = True
-
-    if has_changed:
-        affectation.date = datetime.now()
-
-    await affectation.save()
-
-async def unassign_course_from_profile_with_profile_and_course(profile_id: int, course_id: int, current_account: AccountInDB) -> None:
+            has_changed = True
+
+        if new_data.hours is not None:
+            affectation.hours = new_data.hours
+            has_changed = True
+
+        if new_data.notes is not None:
+            affectation.notes = new_data.notes
+            has_changed = True
+
+        if new_data.group is not None:
+            course: CourseInDB | None = await affectation.course.first()
+            if course is None:
+                raise HTTPException(status_code=404,
+                                    detail=CommonErrorMessages.COURSE_NOT_FOUND)
+            else:
+                affectation.course = course
+            if new_data.group < 1 or new_data.group > affectation.course.group_count:
+                raise HTTPException(status_code=400, detail=CommonErrorMessages.AFFECTATION_GROUP_INVALID)
+            affectation.group = new_data.group
+            has_changed = True
+
+        if has_changed:
+            affectation.date = datetime.now()
+
+        await affectation.save()
+
+        updated_years: set[int] = set()
+        if affectation.course_id != course_id_before or affectation.hours != hours_before: # type: ignore
+            # Both courses are updated together, they may be the same one.
+            course_hours: dict[int, int] = {course_id_before: -hours_before}
+            course_hours[affectation.course_id] = course_hours.get(affectation.course_id, 0) + affectation.hours # type: ignore
+            updated_years = await NodeHoursService.add_to_courses({course_id: (0, hours)
+                                                                   for course_id, hours in course_hours.items()})
+
+        if affectation.profile_id != profile_id_before or affectation.course_id != course_id_before \
+           or affectation.hours != hours_before: # type: ignore
+            # In the order of the profiles, the one in which the workload refresh locks them.
+            for profile_id, course_id, hours in sorted([(profile_id_before, course_id_before, -hours_before),
+                                                        (affectation.profile_id, affectation.course_id, affectation.hours)]): # type: ignore
+                await WorkloadService.add_affectation_hours(profile_id, course_id, hours)
+
+    # Totals are displayed in the arborescence.
+    for academic_year in updated_years:
+        await ArborescenceCache.bump_version(academic_year)
+
+async def unassign_course_from_profile_with_profile_and_course(profile_id: int, course_id: int, context: AuthContext) -> None:
     """
     This method unassigns a course from a teacher.
     It uses the profile id and the course id. to call the method that uses the affectation id.
     """
-    await check_permissions(AvailableServices.AFFECTATION_SERVICE,
-                            AvailableOperations.DELETE,
-                            current_account)
+    await context.check(AvailableServices.AFFECTATION_SERVICE,
+                        AvailableOperations.DELETE)
 
     profile: ProfileInDB | None = await ProfileInDB.get_or_none(id=profile_id)
     if profile is None:
@@ -220,15 +256,14 @@ async def unassign_course_from_profile_with_profile_and_course(profile_id: int,
     await unassign_course(affectation)
 
 
-async def unassign_course_from_profile_with_affectation_id(affectation_id: int, current_account: AccountInDB) -> None:
+async def unassign_course_from_profile_with_affectation_id(affectation_id: int, context: AuthContext) -> None:
     """
     This method unassigns a course from a teacher.
     It uses the affectation id.
     """
 
-    await check_permissions(AvailableServices.AFFECTATION_SERVICE,
-                            AvailableOperations.DELETE,
-                            current_account)
+    await context.check(AvailableServices.AFFECTATION_SERVICE,
+                        AvailableOperations.DELETE)
 
     affectation: AffectationInDB | None = await AffectationInDB.get_or_none(id=affectation_id)
     if affectation is None:
@@ -242,4 +277,188 @@ async def unassign_course(affectation: AffectationInDB) -> None:
     This method unassigns a course from a teacher.
     CAREFUL : It is not checking the permissions. Not meant to be directly used.
     """
-    await affectation.delete()
+    async with in_transaction():
+        # The row is read again and locked, so that the hours removed from the totals are the stored ones.
+        locked: AffectationInDB | None = await AffectationInDB.filter(id=affectation.id).select_for_update().first()
+        if locked is None:
+            raise HTTPException(status_code=404, detail=CommonErrorMessages.AFFECTATION_NOT_FOUND)
+        affectation = locked
+
+        await affectation.delete()
+        updated_years: set[int] = await NodeHoursService.add_to_course(affectation.course_id, 0, -affectation.hours) # type: ignore
+        await WorkloadService.add_affectation_hours(affectation.profile_id, affectation.course_id, -affectation.hours) # type: ignore
+    # Totals are displayed in the arborescence.
+    for academic_year in updated_years:
+        await ArborescenceCache.bump_version(academic_year)
+
+
+def check_affectation(profile_id: int, course_id: int, group: int,
+                      profiles: dict[int, int], courses: dict[int, tuple[int, int]]) -> tuple[int, str] | None:
+    """
+    This method checks that an affectation links an existing profile and course of the same academic year,
+    with a valid group. `profiles` maps the ids to the academic years, `courses` to the (academic year, group count).
+    Returns the (status code, detail) of the error, or None if the affectation is valid.
+    """
+    if profile_id not in profiles:
+        return 404, CommonErrorMessages.PROFILE_NOT_FOUND
+    if course_id not in courses:
+        return 404, CommonErrorMessages.COURSE_NOT_FOUND
+
+    academic_year, group_count = courses[course_id]
+    if profiles[profile_id] != academic_year:
+        return 400, CommonErrorMessages.AFFECTATION_ACADEMIC_YEAR_MISMATCH
+    if group < 1 or group > group_count:
+        return 400, CommonErrorMessages.AFFECTATION_GROUP_INVALID
+    return None
+
+
+async def reserve_affectation_ids(count: int) -> list[int]:
+    """
+    This method reserves ids in the sequence of the affectations, so that they can be bulk created with known ids.
+    """
+    rows: list[dict[str, Any]] = await connections.get("default").execute_query_dict(
+        '''SELECT nextval(pg_get_serial_sequence('"Affectation"', 'id')) AS "id" FROM generate_series(1, $1)''', [count])
+    return [row["id"] for row in rows]
+
+
+async def apply_affectation_batch(batch: PydanticAffectationBatch, context: AuthContext) -> PydanticAffectationBatchResult:
+    """
+    This method creates, modifies and deletes affectations in a single transaction.
+    All the operations are validated first, with one query per model : if any of them is invalid,
+    none are applied and the errors of every invalid operation are returned.
+    """
+    if batch.create:
+        await context.check(AvailableServices.AFFECTATION_SERVICE,
+                            AvailableOperations.CREATE)
+    if batch.modify:
+        await context.check(AvailableServices.AFFECTATION_SERVICE,
+                            AvailableOperations.UPDATE)
+    if batch.delete:
+        await context.check(AvailableServices.AFFECTATION_SERVICE,
+                            AvailableOperations.DELETE)
+
+    async with in_transaction():
+        affectations: dict[int, AffectationInDB] = {
+            affectation.id: affectation
+            for affectation in await AffectationInDB.filter(id__in=[operation.id for operation in batch.modify] + batch.delete)
+                                                    .select_for_update()}
+
+        profile_ids: set[int] = {operation.profile_id for operation in batch.create}
+        profile_ids.update(operation.profile_id for operation in batch.modify if operation.profile_id is not None)
+        profile_ids.update(affectation.profile_id for affectation in affectations.values())  # type: ignore
+        course_ids: set[int] = {operation.course_id for operation in batch.create}
+        course_ids.update(operation.course_id for operation in batch.modify if operation.course_id is not None)
+        course_ids.update(affectation.course_id for affectation in affectations.values())  # type: ignore
+
+        profiles: dict[int, int] = dict(await ProfileInDB.filter(id__in=profile_ids).values_list("id", "academic_year"))
+        courses: dict[int, tuple[int, int]] = {course_id: (academic_year, group_count)
+                                               for course_id, academic_year, group_count
+                                               in await CourseInDB.filter(id__in=course_ids)
+                                                                  .values_list("id", "academic_year", "group_count")}
+
+        errors: list[PydanticAffectationBatchError] = []
+        for index, creation in enumerate(batch.create):
+            error: tuple[int, str] | None = check_affectation(creation.profile_id, creation.course_id, creation.group,
+                                                              profiles, courses)
+            if error is not None:
+                errors.append(PydanticAffectationBatchError(operation="create", index=index,
+                                                            status_code=error[0], detail=error[1]))
+
+        # An affectation can only be touched by a single operation of the batch.
+        touched: set[int] = set()
+        for index, modification in enumerate(batch.modify):
+            affectation: AffectationInDB | None = affectations.get(modification.id)
+            if affectation is None:
+                error = 404, CommonErrorMessages.AFFECTATION_NOT_FOUND
+            elif modification.id in touched:
+                error = 409, CommonErrorMessages.AFFECTATION_BATCH_DUPLICATE
+            else:
+                error = check_affectation(affectation.profile_id if modification.profile_id is None  # type: ignore
+                                          else modification.profile_id,
+                                          affectation.course_id if modification.course_id is None  # type: ignore
+                                          else modification.course_id,
+                                          affectation.group if modification.group is None else modification.group,
+                                          profiles, courses)
+            touched.add(modification.id)
+            if error is not None:
+                errors.append(PydanticAffectationBatchError(operation="modify", index=index,
+                                                            status_code=error[0], detail=error[1]))
+
+        for index, affectation_id in enumerate(batch.delete):
+            if affectation_id not in affectations:
+                errors.append(PydanticAffectationBatchError(operation="delete", index=index, status_code=404,
+                                                            detail=CommonErrorMessages.AFFECTATION_NOT_FOUND))
+            elif affectation_id in touched:
+                errors.append(PydanticAffectationBatchError(operation="delete", index=index, status_code=409,
+                                                            detail=CommonErrorMessages.AFFECTATION_BATCH_DUPLICATE))
+            touched.add(affectation_id)
+
+        if errors:
+            raise HTTPException(status_code=400, detail={"message": CommonErrorMessages.AFFECTATION_BATCH_INVALID,
+                                                         "errors": [error.model_dump() for error in errors]})
+
+        now: datetime = datetime.now()
+        # Hours added to (or removed from) each course, and profiles whose workload changed.
+        course_hours: dict[int, int] = {}
+        touched_profiles: set[int] = set()
+
+        values: list[dict[str, Any]] = [{"profile_id": creation.profile_id,
+                                         "course_id": creation.course_id,
+                                         "hours": creation.hours,
+                                         "notes": creation.notes,
+                                         "group": creation.group,
+                                         "date": now} for creation in batch.create]
+        ids: list[int] = await reserve_affectation_ids(len(values)) if values else []
+        created: list[AffectationInDB] = [AffectationInDB(id=affectation_id, **value) for affectation_id, value in zip(ids, values)]
+        await AffectationInDB.bulk_create(created, batch_size=1000)
+        for affectation in created:
+            course_hours[affectation.course_id] = course_hours.get(affectation.course_id, 0) + affectation.hours  # type: ignore
+            touched_profiles.add(affectation.profile_id)  # type: ignore
+
+        modified: list[AffectationInDB] = []
+        for modification in batch.modify:
+            affectation = affectations[modification.id]
+            course_hours[affectation.course_id] = course_hours.get(affectation.course_id, 0) - affectation.hours  # type: ignore
+            touched_profiles.add(affectation.profile_id)  # type: ignore
+
+            changes: dict[str, Any] = modification.model_dump(exclude={"id"}, exclude_none=True)
+            if changes:
+                affectation.update_from_dict(changes)
+                affectation.date = now
+                modified.append(affectation)
+
+            course_hours[affectation.course_id] = course_hours.get(affectation.course_id, 0) + affectation.hours  # type: ignore
+            touched_profiles.add(affectation.profile_id)  # type: ignore
+        if modified:
+            await AffectationInDB.bulk_update(modified, fields=["profile_id", "course_id", "hours", "notes", "group", "date"],
+                                              batch_size=1000)
+
+        for affectation_id in batch.delete:
+            affectation = affectations[affectation_id]
+            course_hours[affectation.course_id] = course_hours.get(affectation.course_id, 0) - affectation.hours  # type: ignore
+            touched_profiles.add(affectation.profile_id)  # type: ignore
+        if batch.delete:
+            await AffectationInDB.filter(id__in=batch.delete).delete()
+
+        updated_years: set[int] = await NodeHoursService.add_to_courses({course_id: (0, hours)
+                                                                         for course_id, hours in course_hours.items()})
+        profiles_by_year: dict[int, list[int]] = {}
+        for profile_id in touched_profiles:
+            profiles_by_year.setdefault(profiles[profile_id], []).append(profile_id)
+        for academic_year, year_profile_ids in profiles_by_year.items():
+            await WorkloadService.refresh_profiles(year_profile_ids, academic_year)
+
+    # Totals are displayed in the arborescence.
+    for academic_year in updated_years:
+        await ArborescenceCache.bump_version(academic_year)
+
+    return PydanticAffectationBatchResult(
+        created=[PydanticAffectation(id=affectation.id,
+                                     profile=affectation.profile_id,  # type: ignore
+                                     course=affectation.course_id,  # type: ignore
+                                     hours=affectation.hours,
+                                     notes=affectation.notes,
+                                     date=affectation.date,
+                                     group=affectation.group) for affectation in created],
+        modified=[modification.id for modification in batch.modify],
+        deleted=batch.delete)
@@ -0,0 +1,427 @@
+"""
+This module provides the arborescence engine used by the Node service.
+It loads every node and UE of an academic year in a constant number of queries,
+indexes them by parent and assembles the pydantic tree in memory.
+The indexes are cached per worker and tagged with a version counter stored in Redis.
+Subtree reads load only the subtree. Either way, the UEs come with their courses.
+CAREFUL ! None of these methods check for permissions.
+"""
+
+from typing import Any
+
+from fastapi import HTTPException
+from tortoise import connections
+from tortoise.functions import Count
+
+from app.models.pydantic.CourseModel import PydanticCourseModel
+from app.models.pydantic.CourseTypeModel import PydanticCourseTypeModel
+from app.models.pydantic.NodeModel import PydanticNodeModel, PydanticUEInNodeModel
+from app.models.tortoise.course import CourseInDB
+from app.models.tortoise.node import NodeInDB
+from app.models.tortoise.ue import UEInDB
+from app.utils.CustomExceptions import NotModifiedException, RequiredFieldIsNone
+from app.utils.databases.redis_helper import Redis
+from app.utils.enums.http_errors import CommonErrorMessages
+
+
+# Node rows : (id, name, parent id, planned hours, assigned hours).
+NodeRow = tuple[int, str, int | None, int | None, int | None]
+NODE_ROW_FIELDS: tuple[str, ...] = ("id", "name", "parent_id", "hours__planned_hours", "hours__assigned_hours")
+# Course rows : (id, duration, group count, course type id, course type name, course type description, ue id).
+CourseRow = tuple[int, int, int, int, str, str | None, int]
+COURSE_ROW_FIELDS: tuple[str, ...] = ("id", "duration", "group_count", "course_type_id",
+                                      "course_type__name", "course_type__description", "ue__id")
+
+# Number of trees kept by an index, the oldest one is dropped first.
+MAX_CACHED_TREES: int = 16
+
+
+class NodeTreeIndex:
+    """
+    Adjacency index of the nodes and UEs of an academic year.
+    Nodes and UEs are stored as plain tuples to avoid building ORM objects.
+    """
+    academic_year : int
+    version       : int
+    nodes         : dict[int, tuple[str, int | None]]  # node id -> (name, parent id)
+    hours         : dict[int, tuple[int | None, int | None]]  # node id -> (planned hours, assigned hours)
+    children      : dict[int, list[int]]                # node id -> children node ids
+    ues           : dict[int, list[tuple[int, str]]]    # node id -> (ue id, ue name)
+    courses       : dict[int, list[PydanticCourseModel]]  # ue id -> courses
+    frontier      : dict[int, tuple[list[int], int]]   # node id -> (child node ids, ue count), if not loaded
+    roots         : list[int]
+    trees         : dict[tuple[int, int | None], PydanticNodeModel]  # (node id, depth) -> tree
+
+    def __init__(self, academic_year: int,
+                 node_rows: list[NodeRow],
+                 ue_rows: list[tuple[int, str, int | None]],
+                 version: int = 0,
+                 courses: dict[int, list[PydanticCourseModel]] | None = None):
+        self.academic_year = academic_year
+        self.version       = version
+        self.nodes         = {}
+        self.hours         = {}
+        self.children      = {}
+        self.ues           = {}
+        self.courses       = courses or {}
+        self.frontier      = {}
+        self.roots         = []
+        self.trees         = {}
+
+        for node_id, name, parent_id, planned_hours, assigned_hours in sorted(node_rows, key=lambda row: row[0]):
+            self.nodes[node_id] = (name, parent_id)
+            self.hours[node_id] = (planned_hours, assigned_hours)
+
+        for node_id, (_, parent_id) in self.nodes.items():
+            if parent_id is None:
+                self.roots.append(node_id)
+            elif parent_id in self.nodes:
+                self.children.setdefault(parent_id, []).append(node_id)
+
+        # An UE appears once per parent node, UEs without parent are ignored.
+        for ue_id, name, parent_id in sorted(ue_rows, key=lambda row: row[0]):
+            if parent_id is not None:
+                self.ues.setdefault(parent_id, []).append((ue_id, name))
+
+    def get_root_id(self) -> int:
+        """
+        Returns the id of the root node of the academic year.
+        """
+        if len(self.roots) == 0:
+            raise HTTPException(status_code=404,
+                                detail=CommonErrorMessages.ROOT_NODE_NOT_FOUND.value)
+        return self.roots[0]
+
+    def get_etag(self) -> str:
+        """
+        Returns the entity tag of the arborescences built from this index.
+        """
+        return make_etag(self.academic_year, self.version)
+
+    def get_tree(self, node_id: int, depth: int | None = None, expand: list[int] | None = None) -> PydanticNodeModel:
+        """
+        Returns the tree starting from the given node.
+        Trees are only built once per index, since the index is dropped when the version changes.
+        Trees with expanded nodes are not kept, the client chooses them.
+        """
+        if expand:
+            return self.build_tree(node_id, depth, expand)
+
+        key: tuple[int, int | None] = (node_id, depth)
+        tree: PydanticNodeModel | None = self.trees.get(key)
+        if tree is None:
+            tree = self.build_tree(node_id, depth)
+            if len(self.trees) >= MAX_CACHED_TREES:
+                self.trees.pop(next(iter(self.trees)))
+            self.trees[key] = tree
+        return tree
+
+    def build_tree(self, node_id: int, depth: int | None = None, expand: list[int] | None = None) -> PydanticNodeModel:
+        """
+        This method builds the tree starting from the given node.
+        It is iterative : the nodes are listed in pre-order, then built in reverse order
+        so that every child is built before its parent. Deep trees cannot hit the recursion limit.
+        If a depth is given, the nodes below it are not displayed, unless their parent is expanded.
+        The last displayed nodes only come with the ids of their child nodes and their number of children.
+        """
+        if node_id not in self.nodes:
+            raise HTTPException(status_code=404,
+                                detail=CommonErrorMessages.NODE_NOT_FOUND.value)
+
+        expanded: set[int] = set(expand or [])
+
+        # Listing the subtree. The visited set protects us from cycles in the parent links.
+        order   : list[int] = []
+        visited : set[int]  = set()
+        leaves  : set[int]  = set()   # nodes displayed without their children
+        stack   : list[tuple[int, int | None]] = [(node_id, get_remaining_levels(node_id, depth, expanded))]
+        while stack:
+            current, remaining = stack.pop()
+            if current in visited:
+                continue
+            visited.add(current)
+            order.append(current)
+            if remaining == 0:
+                leaves.add(current)
+                continue
+            stack.extend((child, get_remaining_levels(child, remaining, expanded, below=True))
+                         for child in self.children.get(current, []))
+
+        built: dict[int, PydanticNodeModel] = {}
+        for current in reversed(order):
+            name, _ = self.nodes[current]
+            planned_hours, assigned_hours = self.hours[current]
+            if current in leaves:
+                child_ids, ue_count = self.get_children_summary(current)
+                built[current] = PydanticNodeModel(id=current,
+                                                   academic_year=self.academic_year,
+                                                   name=name,
+                                                   planned_hours=planned_hours,
+                                                   assigned_hours=assigned_hours,
+                                                   child_ids=child_ids,
+                                                   child_count=len(child_ids) + ue_count)
+                continue
+
+            children: list[PydanticNodeModel] = [built.pop(child)
+                                                 for child in self.children.get(current, [])
+                                                 if child in built]
+            children.extend(PydanticUEInNodeModel(id=ue_id,
+                                                  name=ue_name,
+                                                  academic_year=self.academic_year,
+                                                  courses=self.courses.get(ue_id, []))
+                            for ue_id, ue_name in self.ues.get(current, []))
+
+            built[current] = PydanticNodeModel(id=current,
+                                               academic_year=self.academic_year,
+                                               name=name,
+                                               planned_hours=planned_hours,
+                                               assigned_hours=assigned_hours,
+                                               child_nodes=children)
+
+        return built[node_id]
+
+    def get_children_summary(self, node_id: int) -> tuple[list[int], int]:
+        """
+        Returns the ids of the child nodes and the number of UEs of a node displayed without its children.
+        """
+        if node_id in self.frontier:
+            return self.frontier[node_id]
+        return self.children.get(node_id, []), len(self.ues.get(node_id, []))
+
+
+def get_remaining_levels(node_id: int, remaining: int | None, expanded: set[int], below: bool = False) -> int | None:
+    """
+    Returns the number of levels to display under a node, None meaning the whole subtree.
+    `remaining` is the number of levels of its parent if `below` is True, else its own.
+    An expanded node always displays at least its children.
+    """
+    if remaining is None:
+        return None
+    if below:
+        remaining -= 1
+    if node_id in expanded:
+        return max(remaining, 1)
+    return remaining
+
+
+async def load_tree_index(academic_year: int, version: int = 0) -> NodeTreeIndex:
+    """
+    This method loads all the nodes, the UE-node associations and the courses of the UEs of an academic year.
+    It only needs three queries, whatever the size of the tree.
+    """
+    node_rows  : list[NodeRow] = await NodeInDB.filter(academic_year=academic_year).values_list(*NODE_ROW_FIELDS)
+    ue_rows    : list[tuple[int, str, int | None]] = await UEInDB.filter(academic_year=academic_year)\
+                                                                 .values_list("id", "name", "parent__id")
+    course_rows: list[CourseRow] = await CourseInDB.filter(ue__academic_year=academic_year)\
+                                                   .values_list(*COURSE_ROW_FIELDS)
+    return NodeTreeIndex(academic_year, node_rows, ue_rows, version, group_courses(academic_year, course_rows))
+
+
+# Recursive walk of the displayed part of a subtree, with its UEs and their courses, in a single round trip.
+# $1 : node id, $2 : academic year, $3 : displayed depth (NULL for the whole subtree), $4 : expanded node ids.
+# "remaining" is the number of levels still displayed under a node, it mirrors `get_remaining_levels`.
+# The path array stops the walk if the parent links ever contain a cycle.
+SUBTREE_QUERY: str = """
+WITH RECURSIVE "subtree" AS (
+    SELECT "id", "name", "parent_id",
+           CASE WHEN "id" = ANY($4::INT[]) THEN GREATEST($3::INT, 1) ELSE $3::INT END AS "remaining",
+           ARRAY["id"] AS "path"
+      FROM "Node"
+     WHERE "id" = $1 AND "academic_year" = $2
+    UNION ALL
+    SELECT "child"."id", "child"."name", "child"."parent_id",
+           CASE WHEN "child"."id" = ANY($4::INT[]) THEN GREATEST("subtree"."remaining" - 1, 1)
+                ELSE "subtree"."remaining" - 1 END,
+           "subtree"."path" || "child"."id"
+      FROM "Node" AS "child"
+      JOIN "subtree" ON "child"."parent_id" = "subtree"."id"
+     WHERE "child"."academic_year" = $2
+       AND NOT "child"."id" = ANY("subtree"."path")
+       AND ("subtree"."remaining" IS NULL OR "subtree"."remaining" > 0)
+),
+"ues" AS (
+    SELECT "ue"."id", "ue"."name", "association"."nodeindb_id" AS "parent_id"
+      FROM "subtree"
+      JOIN "UE_NODE_ASSOCIATION" AS "association" ON "association"."nodeindb_id" = "subtree"."id"
+      JOIN "UE" AS "ue" ON "ue"."id" = "association"."UE_id"
+     WHERE "ue"."academic_year" = $2
+       AND ("subtree"."remaining" IS NULL OR "subtree"."remaining" > 0)
+)
+SELECT 'node' AS "kind", "subtree"."id", "subtree"."name", "subtree"."parent_id", "subtree"."remaining",
+       "hours"."planned_hours", "hours"."assigned_hours",
+       NULL::INT AS "duration", NULL::INT AS "group_count",
+       NULL::INT AS "course_type_id", NULL::VARCHAR AS "course_type_name", NULL::TEXT AS "course_type_description"
+  FROM "subtree"
+  LEFT JOIN "NodeHours" AS "hours" ON "hours"."node_id" = "subtree"."id"
+UNION ALL
+SELECT 'ue', "id", "name", "parent_id", NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+  FROM "ues"
+UNION ALL
+SELECT DISTINCT 'course', "course"."id", NULL, "association"."UE_id", NULL::INT, NULL::INT, NULL::INT,
+       "course"."duration", "course"."group_count",
+       "course_type"."id", "course_type"."name", "course_type"."description"
+  FROM "UE_COURSES_ASSOCIATION" AS "association"
+  JOIN "Course" AS "course" ON "course"."id" = "association"."courseindb_id"
+  JOIN "CourseType" AS "course_type" ON "course_type"."id" = "course"."course_type_id"
+ WHERE "association"."UE_id" IN (SELECT "id" FROM "ues")
+"""
+
+
+async def load_subtree_index(node_id: int, academic_year: int, depth: int | None = None,
+                             expand: list[int] | None = None, version: int = 0) -> NodeTreeIndex:
+    """
+    This method loads the displayed nodes under the given node, their UEs and the courses of these UEs.
+    Everything is fetched by a single recursive query, stopped at the displayed depth.
+    The children of the last displayed nodes are then summarized in bulk.
+    The cost grows with what is displayed, not with the academic year.
+    """
+    if depth is None:
+        expand = None
+
+    rows: list[dict[str, Any]] = await connections.get("default").execute_query_dict(SUBTREE_QUERY,
+                                                                                     [node_id, academic_year, depth, expand or []])
+
+    index: NodeTreeIndex = build_subtree_index(academic_year, rows, version)
+    index.frontier = await get_children_summaries([row["id"] for row in rows
+                                                   if row["kind"] == "node" and row["remaining"] == 0],
+                                                  academic_year)
+    return index
+
+
+async def get_children_summaries(node_ids: list[int], academic_year: int) -> dict[int, tuple[list[int], int]]:
+    """
+    Returns the ids of the child nodes and the number of UEs of each given node, in two queries.
+    """
+    if len(node_ids) == 0:
+        return {}
+
+    summaries: dict[int, tuple[list[int], int]] = {node_id: ([], 0) for node_id in node_ids}
+    child_rows: list[tuple[int, int]] = await NodeInDB.filter(parent_id__in=node_ids, academic_year=academic_year)\
+                                                      .order_by("id")\
+                                                      .values_list("parent_id", "id")
+    for parent_id, child_id in child_rows:
+        summaries[parent_id][0].append(child_id)
+
+    ue_counts: list[tuple[int, int]] = await UEInDB.filter(parent__id__in=node_ids, academic_year=academic_year)\
+                                                   .annotate(count=Count("id"))\
+                                                   .group_by("parent__id")\
+                                                   .values_list("parent__id", "count")
+    for parent_id, count in ue_counts:
+        summaries[parent_id] = (summaries[parent_id][0], count)
+    return summaries
+
+
+def build_subtree_index(academic_year: int, rows: list[dict[str, Any]], version: int = 0) -> NodeTreeIndex:
+    """
+    This method builds a tree index from the rows of a subtree read.
+    Each row is either a node, an UE (its parent is a node) or a course (its parent is an UE).
+    """
+    node_rows  : list[NodeRow] = []
+    ue_rows    : list[tuple[int, str, int | None]] = []
+    course_rows: list[CourseRow] = []
+    for row in rows:
+        if row["kind"] == "node":
+            node_rows.append((row["id"], row["name"], row["parent_id"], row["planned_hours"], row["assigned_hours"]))
+        elif row["kind"] == "ue":
+            ue_rows.append((row["id"], row["name"], row["parent_id"]))
+        else:
+            course_rows.append((row["id"], row["duration"], row["group_count"], row["course_type_id"],
+                                row["course_type_name"], row["course_type_description"], row["parent_id"]))
+    return NodeTreeIndex(academic_year, node_rows, ue_rows, version, group_courses(academic_year, course_rows))
+
+
+def group_courses(academic_year: int, course_rows: list[CourseRow]) -> dict[int, list[PydanticCourseModel]]:
+    """
+    Returns the courses of each UE, sorted by id. Duplicated rows are ignored.
+    """
+    courses: dict[int, list[PydanticCourseModel]] = {}
+    for course_id, duration, group_count, course_type_id, \
+        course_type_name, course_type_description, ue_id in sorted(set(course_rows)):
+        course_type = PydanticCourseTypeModel(id=course_type_id,
+                                              name=course_type_name,
+                                              description=course_type_description)
+        courses.setdefault(ue_id, []).append(PydanticCourseModel(id=course_id,
+                                                                 duration=duration,
+                                                                 group_count=group_count,
+                                                                 course_type=course_type,
+                                                                 academic_year=academic_year))
+    return courses
+
+
+class ArborescenceCache:
+    """
+    Per-worker cache of the tree indexes, keyed by academic year.
+    The version counter of each academic year lives in Redis so that every worker sees it.
+    Any write on the nodes or the UEs of an academic year MUST call `bump_version`.
+    """
+
+    VERSION_KEY: str = "arborescence:version:{academic_year}"
+
+    indexes: dict[int, NodeTreeIndex] = {}
+
+    @classmethod
+    async def get_version(cls, academic_year: int) -> int:
+        """
+        Returns the current version of the arborescence of the academic year.
+        """
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        version: bytes | None = await redis_db.get(cls.VERSION_KEY.format(academic_year=academic_year))
+        return 0 if version is None else int(version)
+
+    @classmethod
+    async def bump_version(cls, academic_year: int) -> None:
+        """
+        Marks the arborescence of the academic year as modified, for all the workers.
+        """
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        await redis_db.incr(cls.VERSION_KEY.format(academic_year=academic_year))
+        cls.indexes.pop(academic_year, None)
+
+    @classmethod
+    def get_cached_index(cls, academic_year: int, version: int) -> NodeTreeIndex | None:
+        """
+        Returns the tree index of the academic year if this worker already has the given version.
+        """
+        index: NodeTreeIndex | None = cls.indexes.get(academic_year)
+        if index is None or index.version != version:
+            return None
+        return index
+
+    @classmethod
+    async def get_index(cls, academic_year: int) -> NodeTreeIndex:
+        """
+        Returns the tree index of the academic year, loading it again only if its version changed.
+        The version is read before loading, so a concurrent write always invalidates what we load.
+        """
+        version: int = await cls.get_version(academic_year)
+
+        index: NodeTreeIndex | None = cls.get_cached_index(academic_year, version)
+        if index is None:
+            index = await load_tree_index(academic_year, version)
+            cls.indexes[academic_year] = index
+        return index
+
+
+def make_etag(academic_year: int, version: int) -> str:
+    """
+    Returns the entity tag of the arborescences of an academic year at the given version.
+    """
+    return f'"{academic_year}-{version}"'
+
+
+def check_etag(etag: str, if_none_match: str | None) -> None:
+    """
+    Raises a 304 response if the entity tag matches one of those sent by the client.
+    """
+    if if_none_match is None:
+        return
+
+    tags: list[str] = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if "*" in tags or etag in tags:
+        raise NotModifiedException(headers={"ETag": etag})
@@ -5,25 +5,28 @@ This module provides services to manage Auth Operations.
 from app.models.pydantic.TokenModel import PydanticTokenPair
 from app.models.tortoise.account import AccountInDB
 from app.services import SecurityService
-from app.services.Tokens import AvailableTokenAttributes, TokenPair
+from app.services.Tokens import AvailableTokenAttributes, TokenPair, revoke_sessions
 from app.utils.CustomExceptions import IncorrectLoginOrPasswordException
 from app.models.pydantic.ClassicResponses import ClassicOkResponse
+from app.models.pydantic.StatsModel import PydanticPasswordPoolStats
+from app.services.PermissionService import AuthContext
+from app.utils.enums.permission_enums import AvailableOperations, AvailableServices
 
 
-async def login(username: str, password: str) -> PydanticTokenPair:
+async def login(username: str, password: str, client_ip: str) -> PydanticTokenPair:
     """
     This method checks if the credentials are correct.
     It returns a pair of tokens to access the application.
     """
     # Checking credentials
-    account: AccountInDB | None = await SecurityService.authenticate_user(username, password)
+    account: AccountInDB | None = await SecurityService.authenticate_user(username, password, client_ip)
 
     if not account:
         raise IncorrectLoginOrPasswordException()
 
     # Building and giving token
     tokens: TokenPair = TokenPair()
-    tokens.generate_tokens(account.id)
+    await tokens.generate_tokens(account.id)
     access_token  : str = str(tokens.access_token.value)
     refresh_token : str = str(tokens.refresh_token.value)
 
@@ -36,7 +39,17 @@ async def logout(tokens: PydanticTokenPair) -> ClassicOkResponse:
     """
     # Invalidating tokens
     token_model: TokenPair = tokens.export_pydantic_to_model()
-    token_model.revoke_tokens()
+    await token_model.revoke_tokens()
+
+    # Returning a confirmation message
+    return ClassicOkResponse()
+
+
+async def logout_all_sessions(context: AuthContext) -> ClassicOkResponse:
+    """
+    This method logs out every session of the user, by revoking all the tokens issued for the account.
+    """
+    await revoke_sessions(context.account_id)
 
     # Returning a confirmation message
     return ClassicOkResponse()
@@ -49,10 +62,21 @@ async def refresh_user_tokens(tokens: PydanticTokenPair) -> PydanticTokenPair:
     """
     # Refreshing tokens
     token_model: TokenPair = tokens.export_pydantic_to_model(AvailableTokenAttributes.REFRESH_TOKEN.value)
-    token_model.refresh_tokens()
+    await token_model.refresh_tokens()
 
     access_token  : str = str(token_model.access_token.value)
     refresh_token : str = str(token_model.refresh_token.value)
 
     return PydanticTokenPair(access_token=access_token,
                              refresh_token=refresh_token)
+
+
+async def get_password_pool_stats(context: AuthContext) -> PydanticPasswordPoolStats:
+    """
+    This method returns the usage of the pool hashing the passwords, on the worker that answers.
+    """
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
+
+    return SecurityService.PasswordPool.get_stats()
+
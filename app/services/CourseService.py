@@ -1,12 +1,14 @@
 from fastapi import HTTPException
+from tortoise.transactions import in_transaction
 
-from app.models.aliases import AuthenticatedAccount
 from app.models.pydantic.CourseModel import PydanticCourseModel, PydanticCreateCourseModel, PydanticModifyCourseModel
 from app.models.pydantic.CourseTypeModel import PydanticCourseTypeModel
 
 from app.models.tortoise.course import CourseInDB
 from app.models.tortoise.course_type import CourseTypeInDB
-from app.services.PermissionService import check_permissions
+from app.services import NodeHoursService
+from app.services.ArborescenceService import ArborescenceCache
+from app.services.PermissionService import AuthContext
 
 from app.utils.enums.http_errors import CommonErrorMessages
 from app.utils.enums.permission_enums import AvailableServices, AvailableOperations
@@ -14,14 +16,13 @@ from app.utils.enums.permission_enums import AvailableServices, AvailableOperati
 #TODO
 
 
-async def get_course_by_id(course_id: int, current_account: AuthenticatedAccount) -> PydanticCourseModel:
+async def get_course_by_id(course_id: int, context: AuthContext) -> PydanticCourseModel:
     """
         This method retrieves course from id.
         """
 
-    await check_permissions(AvailableServices.COURSE_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.COURSE_SERVICE,
+                        AvailableOperations.GET)
 
     course: CourseInDB | None = await CourseInDB.get_or_none(id=course_id).prefetch_related("course_type")
 
@@ -37,14 +38,13 @@ async def get_course_by_id(course_id: int, current_account: AuthenticatedAccount
                                course_type=course_type)
 
 
-async def add_course(body: PydanticCreateCourseModel, current_account: AuthenticatedAccount) -> PydanticCourseModel:
+async def add_course(body: PydanticCreateCourseModel, context: AuthContext) -> PydanticCourseModel:
     """
     This method creates a new course.
     """
 
-    await check_permissions(AvailableServices.COURSE_SERVICE,
-                            AvailableOperations.CREATE,
-                            current_account)
+    await context.check(AvailableServices.COURSE_SERVICE,
+                        AvailableOperations.CREATE)
 
     if body.group_count < 0:
         raise HTTPException(status_code=422, detail=CommonErrorMessages.GROUP_VALUE_INCORRECT.value)
@@ -68,14 +68,13 @@ async def add_course(body: PydanticCreateCourseModel, current_account: Authentic
                                course_type=course_type_pydantic)
 
 
-async def modify_course(course_id: int, body: PydanticModifyCourseModel, current_account: AuthenticatedAccount) -> None:
+async def modify_course(course_id: int, body: PydanticModifyCourseModel, context: AuthContext) -> None:
     """
     This method modifies the course of the given course id.
     """
 
-    await check_permissions(AvailableServices.COURSE_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account)
+    await context.check(AvailableServices.COURSE_SERVICE,
+                        AvailableOperations.UPDATE)
 
     if body.duration is not None:
         if body.duration < 0:
@@ -85,30 +84,44 @@ async def modify_course(course_id: int, body: PydanticModifyCourseModel, current
         if body.group_count < 0:
             raise HTTPException(status_code=422, detail=CommonErrorMessages.GROUP_VALUE_INCORRECT.value)
 
-    course_to_modify: CourseInDB | None = await CourseInDB.get_or_none(id=course_id)
+    async with in_transaction():
+        # The row is locked, so that the planned hours replaced in the totals are the stored ones.
+        course_to_modify: CourseInDB | None = await CourseInDB.filter(id=course_id).select_for_update().first()
 
-    if course_to_modify is None:
-        raise HTTPException(status_code=404, detail=CommonErrorMessages.COURSE_NOT_FOUND.value)
+        if course_to_modify is None:
+            raise HTTPException(status_code=404, detail=CommonErrorMessages.COURSE_NOT_FOUND.value)
+
+        planned_before: int = course_to_modify.duration * course_to_modify.group_count
+        try:
+            await course_to_modify.update_from_dict(body.model_dump(exclude_none=True)) # type: ignore
+            await course_to_modify.save()
 
-    try:
-        await course_to_modify.update_from_dict(body.model_dump(exclude_none=True)) # type: ignore
-        await course_to_modify.save()
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e)) from e
 
-    except ValueError as e:
-        raise HTTPException(status_code=409, detail=str(e)) from e
+        await NodeHoursService.add_to_course(course_to_modify.id,
+                                             course_to_modify.duration * course_to_modify.group_count - planned_before, 0)
+    # Courses are displayed in the arborescence.
+    await ArborescenceCache.bump_version(course_to_modify.academic_year)
 
 
-async def delete_course(course_id: int, current_account: AuthenticatedAccount) -> None:
+async def delete_course(course_id: int, context: AuthContext) -> None:
     """
     This method delete the course of the given course id.
     """
-    await check_permissions(AvailableServices.COURSE_SERVICE,
-                            AvailableOperations.DELETE,
-                            current_account)
+    await context.check(AvailableServices.COURSE_SERVICE,
+                        AvailableOperations.DELETE)
 
-    course: CourseInDB | None = await CourseInDB.get_or_none(id=course_id)
+    async with in_transaction():
+        # The row is locked, so that no affectation is added to it until it is deleted.
+        course: CourseInDB | None = await CourseInDB.filter(id=course_id).select_for_update().first()
 
-    if course is None:
-        raise HTTPException(status_code=404, detail=CommonErrorMessages.UE_NOT_FOUND.value)
+        if course is None:
+            raise HTTPException(status_code=404, detail=CommonErrorMessages.UE_NOT_FOUND.value)
+
+        # Its affectations are deleted along with it. The nodes above it can't be found anymore once it is deleted.
+        planned, assigned = await NodeHoursService.get_course_totals(course)
+        await NodeHoursService.add_to_course(course.id, -planned, -assigned)
 
-    await course.delete()
+        await course.delete()
+    await ArborescenceCache.bump_version(course.academic_year)
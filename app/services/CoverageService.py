@@ -0,0 +1,159 @@
+"""
+Coverage services.
+Computes which groups of the courses have an assigned teacher, for an UE or for a whole node subtree.
+The courses and the affectation hours (summed by course and group) are read in a few grouped queries.
+"""
+from fastapi import HTTPException
+from tortoise.functions import Sum
+
+from app.models.pydantic.CoverageModel import (PydanticCourseCoverage,
+                                               PydanticCoverageTotals,
+                                               PydanticNodeCoverage,
+                                               PydanticUECoverage)
+from app.models.tortoise.affectation import AffectationInDB
+from app.models.tortoise.course import CourseInDB
+from app.models.tortoise.node import NodeInDB
+from app.models.tortoise.ue import UEInDB
+from app.services.PermissionService import AuthContext
+from app.utils.enums.http_errors import CommonErrorMessages
+from app.utils.enums.permission_enums import AvailableOperations, AvailableServices
+
+
+# Course rows : (id, course type id, duration, group count).
+CourseRow = tuple[int, int, int, int]
+COURSE_ROW_FIELDS: tuple[str, ...] = ("id", "course_type_id", "duration", "group_count")
+
+
+async def get_course_coverages(course_ids: list[int]) -> dict[int, PydanticCourseCoverage]:
+    """
+    This method computes the coverage of the given courses, in two queries.
+    """
+    if len(course_ids) == 0:
+        return {}
+
+    course_rows: list[CourseRow] = await CourseInDB.filter(id__in=course_ids).values_list(*COURSE_ROW_FIELDS)
+    return await compute_course_coverages(course_rows)
+
+
+async def compute_course_coverages(course_rows: list[CourseRow]) -> dict[int, PydanticCourseCoverage]:
+    """
+    This method computes the coverage of the courses already read, in one query.
+    Affectations on a group above the group count of their course are only counted in the assigned hours.
+    """
+    if len(course_rows) == 0:
+        return {}
+
+    course_ids: list[int] = list({row[0] for row in course_rows})
+    group_rows: list[tuple[int, int, int | None]] = await AffectationInDB.filter(course_id__in=course_ids)\
+                                                                         .annotate(total=Sum("hours"))\
+                                                                         .group_by("course_id", "group")\
+                                                                         .values_list("course_id", "group", "total")
+    groups: dict[int, set[int]] = {}
+    hours : dict[int, int]      = {}
+    for course_id, group, total in group_rows:
+        groups.setdefault(course_id, set()).add(group)
+        hours[course_id] = hours.get(course_id, 0) + (total or 0)
+
+    coverages: dict[int, PydanticCourseCoverage] = {}
+    for course_id, course_type_id, duration, group_count in set(course_rows):
+        assigned: set[int] = groups.get(course_id, set())
+        unassigned: list[int] = [group for group in range(1, group_count + 1) if group not in assigned]
+        coverages[course_id] = PydanticCourseCoverage(course_id=course_id,
+                                                      course_type_id=course_type_id,
+                                                      duration=duration,
+                                                      group_count=group_count,
+                                                      assigned_groups=[group for group in range(1, group_count + 1)
+                                                                       if group in assigned],
+                                                      unassigned_groups=unassigned,
+                                                      planned_hours=duration * group_count,
+                                                      assigned_hours=hours.get(course_id, 0),
+                                                      unassigned_hours=duration * len(unassigned))
+    return coverages
+
+
+def sum_coverages(coverages: list[PydanticCourseCoverage]) -> PydanticCoverageTotals:
+    """
+    This method sums the coverage of the given courses.
+    """
+    totals: PydanticCoverageTotals = PydanticCoverageTotals()
+    for coverage in coverages:
+        totals.course_count      += 1
+        totals.group_count       += coverage.group_count
+        totals.assigned_groups   += len(coverage.assigned_groups)
+        totals.unassigned_groups += len(coverage.unassigned_groups)
+        totals.planned_hours     += coverage.planned_hours
+        totals.assigned_hours    += coverage.assigned_hours
+        totals.unassigned_hours  += coverage.unassigned_hours
+    return totals
+
+
+def build_ue_coverage(ue_id: int, name: str, academic_year: int, coverages: list[PydanticCourseCoverage],
+                      only_gaps: bool) -> PydanticUECoverage:
+    """
+    This method builds the coverage of an UE from the coverage of its courses.
+    If only_gaps is True, the fully assigned courses are left out of the list (but not out of the totals).
+    """
+    return PydanticUECoverage(ue_id=ue_id,
+                              name=name,
+                              academic_year=academic_year,
+                              totals=sum_coverages(coverages),
+                              courses=[coverage for coverage in coverages
+                                       if not only_gaps or coverage.unassigned_groups])
+
+
+async def get_ue_coverage(ue_id: int, context: AuthContext, only_gaps: bool = False) -> PydanticUECoverage:
+    """
+    This method returns the coverage of the courses of an UE.
+    """
+    await context.check(AvailableServices.UE_SERVICE,
+                        AvailableOperations.GET)
+
+    ue: UEInDB | None = await UEInDB.get_or_none(id=ue_id)
+    if ue is None:
+        raise HTTPException(status_code=404, detail=CommonErrorMessages.UE_NOT_FOUND.value)
+
+    course_ids: list[int] = await CourseInDB.filter(ue__id=ue_id).values_list("id", flat=True)
+    coverages: dict[int, PydanticCourseCoverage] = await get_course_coverages(course_ids)
+    return build_ue_coverage(ue.id, ue.name, ue.academic_year,
+                             [coverages[course_id] for course_id in sorted(coverages)], only_gaps)
+
+
+async def get_node_coverage(node_id: int, academic_year: int, context: AuthContext,
+                            only_gaps: bool = False) -> PydanticNodeCoverage:
+    """
+    This method returns the coverage of the courses of every UE located under the node.
+    If only_gaps is True, only the UEs and courses with unassigned groups are listed.
+    It takes four queries : the node, the UEs of its subtree, their courses and the affectation hours.
+    """
+    await context.check(AvailableServices.NODE_SERVICE,
+                        AvailableOperations.GET)
+
+    node: NodeInDB | None = await NodeInDB.get_or_none(id=node_id, academic_year=academic_year)
+    if node is None:
+        raise HTTPException(status_code=404, detail=CommonErrorMessages.NODE_NOT_FOUND.value)
+
+    # The closure table links the node to itself, so its own UEs are included.
+    ue_rows: list[tuple[int, str]] = await UEInDB.filter(parent__ancestor_links__ancestor_id=node_id)\
+                                                 .distinct()\
+                                                 .order_by("id")\
+                                                 .values_list("id", "name")
+    # The courses are read with their UE, a course shared by several UEs comes once per UE.
+    ue_course_rows: list[tuple[int, int, int, int, int]] = await CourseInDB.filter(ue__id__in=[ue_id for ue_id, _ in ue_rows])\
+                                                                           .values_list("ue__id", *COURSE_ROW_FIELDS) if ue_rows else []
+    courses_by_ue: dict[int, list[int]] = {}
+    course_rows  : list[CourseRow]      = []
+    for ue_id, course_id, course_type_id, duration, group_count in ue_course_rows:
+        courses_by_ue.setdefault(ue_id, []).append(course_id)
+        course_rows.append((course_id, course_type_id, duration, group_count))
+
+    coverages: dict[int, PydanticCourseCoverage] = await compute_course_coverages(course_rows)
+    ues: list[PydanticUECoverage] = [build_ue_coverage(ue_id, name, academic_year,
+                                                       [coverages[course_id] for course_id in sorted(courses_by_ue.get(ue_id, []))],
+                                                       only_gaps)
+                                     for ue_id, name in ue_rows]
+
+    return PydanticNodeCoverage(node_id=node.id,
+                                name=node.name,
+                                academic_year=academic_year,
+                                totals=sum_coverages([coverages[course_id] for course_id in sorted(coverages)]),
+                                ues=[ue for ue in ues if not only_gaps or ue.totals.unassigned_groups > 0])
@@ -0,0 +1,139 @@
+"""
+This module maintains and reads the closure table of the Node hierarchy.
+Subtree reads cost O(subtree) and ancestor reads cost O(depth).
+CAREFUL ! None of these methods check for permissions.
+"""
+
+from fastapi import HTTPException
+from tortoise.transactions import in_transaction
+
+from app.models.tortoise.node import NodeInDB
+from app.models.tortoise.node_closure import NodeClosureInDB
+from app.utils.enums.http_errors import CommonErrorMessages
+from app.utils.printers import print_info
+
+# Number of closure rows inserted per query when rebuilding the table.
+REBUILD_BATCH_SIZE: int = 1000
+
+
+async def insert_node(node: NodeInDB) -> None:
+    """
+    This method adds the closure rows of a newly created node.
+    The node inherits the ancestors of its parent, one level deeper.
+    """
+    rows: list[NodeClosureInDB] = [NodeClosureInDB(ancestor_id=node.id,
+                                                   descendant_id=node.id,
+                                                   depth=0,
+                                                   academic_year=node.academic_year)]
+
+    parent_id: int | None = node.parent_id  # type: ignore
+    if parent_id is not None:
+        parent_ancestors: list[tuple[int, int]] = await NodeClosureInDB.filter(descendant_id=parent_id)\
+                                                                       .values_list("ancestor_id", "depth")
+        rows.extend(NodeClosureInDB(ancestor_id=ancestor_id,
+                                    descendant_id=node.id,
+                                    depth=depth + 1,
+                                    academic_year=node.academic_year)
+                    for ancestor_id, depth in parent_ancestors)
+
+    await NodeClosureInDB.bulk_create(rows)
+
+
+async def move_node(node: NodeInDB, new_parent_id: int | None) -> None:
+    """
+    This method updates the closure rows of a node (and of its whole subtree) moved under a new parent.
+    It must be called inside the transaction that saves the new parent.
+    Raises a 400 if the new parent is inside the subtree of the node.
+    """
+    subtree: list[tuple[int, int]] = await NodeClosureInDB.filter(ancestor_id=node.id)\
+                                                          .values_list("descendant_id", "depth")
+    subtree_ids: list[int] = [descendant_id for descendant_id, _ in subtree]
+
+    if new_parent_id is not None and new_parent_id in subtree_ids:
+        raise HTTPException(status_code=400,
+                            detail=CommonErrorMessages.NODE_CANT_BE_MOVED_UNDER_ITSELF.value)
+
+    # We unlink the subtree from its former ancestors. Links inside the subtree do not change.
+    await NodeClosureInDB.filter(descendant_id__in=subtree_ids)\
+                         .exclude(ancestor_id__in=subtree_ids)\
+                         .delete()
+
+    if new_parent_id is None:
+        return
+
+    new_ancestors: list[tuple[int, int]] = await NodeClosureInDB.filter(descendant_id=new_parent_id)\
+                                                                .values_list("ancestor_id", "depth")
+    await NodeClosureInDB.bulk_create([NodeClosureInDB(ancestor_id=ancestor_id,
+                                                       descendant_id=descendant_id,
+                                                       depth=ancestor_depth + descendant_depth + 1,
+                                                       academic_year=node.academic_year)
+                                       for ancestor_id, ancestor_depth in new_ancestors
+                                       for descendant_id, descendant_depth in subtree])
+
+
+async def get_ancestors(node_id: int) -> list[tuple[int, str, int]]:
+    """
+    Returns the (id, name, academic year) of the ancestors of the node, from the root to the node itself.
+    Raises a 404 if the node does not exist.
+    """
+    ancestors: list[tuple[int, str, int]] = await NodeClosureInDB.filter(descendant_id=node_id)\
+                                                                 .order_by("-depth")\
+                                                                 .values_list("ancestor_id",
+                                                                              "ancestor__name",
+                                                                              "ancestor__academic_year")
+    if len(ancestors) == 0:
+        raise HTTPException(status_code=404,
+                            detail=CommonErrorMessages.NODE_NOT_FOUND.value)
+    return ancestors
+
+
+async def rebuild_closure() -> int:
+    """
+    This method rebuilds the whole closure table from the parent links of the nodes.
+    Nodes that are part of a parent cycle cannot be reached from a root and are left out.
+    Returns the number of rows inserted.
+    """
+    node_rows: list[tuple[int, int | None, int]] = await NodeInDB.all().values_list("id", "parent_id", "academic_year")
+
+    children: dict[int | None, list[int]] = {}
+    years   : dict[int, int] = {}
+    for node_id, parent_id, academic_year in node_rows:
+        children.setdefault(parent_id, []).append(node_id)
+        years[node_id] = academic_year
+
+    # Walking from the roots, every node inherits the path of its parent.
+    rows : list[NodeClosureInDB] = []
+    paths: dict[int, list[int]]  = {}
+    queue: list[int] = list(children.get(None, []))
+    for node_id in queue:
+        paths[node_id] = [node_id]
+    while queue:
+        node_id: int = queue.pop()
+        path: list[int] = paths[node_id]
+        rows.extend(NodeClosureInDB(ancestor_id=ancestor_id,
+                                    descendant_id=node_id,
+                                    depth=len(path) - 1 - position,
+                                    academic_year=years[node_id])
+                    for position, ancestor_id in enumerate(path))
+        for child_id in children.get(node_id, []):
+            paths[child_id] = path + [child_id]
+            queue.append(child_id)
+
+    async with in_transaction():
+        await NodeClosureInDB.all().delete()
+        await NodeClosureInDB.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+    return len(rows)
+
+
+async def ensure_closure() -> None:
+    """
+    This method rebuilds the closure table if it does not describe every node.
+    It is used at startup, since nodes can be loaded without going through the services.
+    It MUST run inside of `Postgresql.exclusive_transaction`, so that the workers do not rebuild it together.
+    """
+    if await NodeClosureInDB.filter(depth=0).count() == await NodeInDB.all().count():
+        return
+
+    print_info("Rebuilding the node hierarchy index...")
+    inserted: int = await rebuild_closure()
+    print_info(f"{inserted} node hierarchy links created.")
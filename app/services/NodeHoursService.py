@@ -0,0 +1,253 @@
+"""
+This module maintains the hour totals of the nodes.
+Writes on the courses, the UE attachments and the affectations only update
+the nodes located above them, along the closure table of the hierarchy.
+CAREFUL ! None of these methods check for permissions.
+"""
+
+from tortoise import connections
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from app.models.tortoise.affectation import AffectationInDB
+from app.models.tortoise.course import CourseInDB
+from app.models.tortoise.node import NodeInDB
+from app.models.tortoise.node_closure import NodeClosureInDB
+from app.models.tortoise.node_hours import NodeHoursInDB
+from app.models.tortoise.ue import UEInDB
+from app.utils.printers import print_info, print_warning
+
+# Hour totals : (planned hours, assigned hours).
+Totals = tuple[int, int]
+
+# Number of nodes updated per query when applying deltas, far below the limit of parameters of Postgres.
+DELTAS_BATCH_SIZE: int = 1000
+
+
+async def create_node_hours(node: NodeInDB) -> None:
+    """
+    This method creates the (empty) totals of a newly created node.
+    """
+    await NodeHoursInDB.create(node_id=node.id, academic_year=node.academic_year)
+
+
+async def get_covering_nodes(ue_id: int) -> set[int]:
+    """
+    Returns the ids of the nodes the UE is counted in : its parents and all their ancestors.
+    """
+    return set(await NodeClosureInDB.filter(descendant__ues__id=ue_id)
+                                    .values_list("ancestor_id", flat=True))
+
+
+async def get_ue_totals(ue_ids: list[int]) -> dict[int, Totals]:
+    """
+    Returns the totals of each given UE, in two queries.
+    """
+    totals: dict[int, Totals] = {ue_id: (0, 0) for ue_id in ue_ids}
+    if len(ue_ids) == 0:
+        return totals
+
+    course_rows: list[tuple[int, int, int]] = await CourseInDB.filter(ue__id__in=ue_ids)\
+                                                              .values_list("ue__id", "duration", "group_count")
+    for ue_id, duration, group_count in course_rows:
+        planned, assigned = totals[ue_id]
+        totals[ue_id] = (planned + duration * group_count, assigned)
+
+    affectation_rows: list[tuple[int, int]] = await AffectationInDB.filter(course__ue__id__in=ue_ids)\
+                                                                   .values_list("course__ue__id", "hours")
+    for ue_id, hours in affectation_rows:
+        planned, assigned = totals[ue_id]
+        totals[ue_id] = (planned, assigned + hours)
+    return totals
+
+
+async def add_to_nodes(node_ids: set[int], planned: int, assigned: int) -> None:
+    """
+    This method adds the given hours to the totals of the given nodes, in a single query.
+    The arborescence version of their academic year MUST be bumped once the transaction is committed.
+    """
+    if len(node_ids) == 0 or (planned == 0 and assigned == 0):
+        return
+
+    await NodeHoursInDB.filter(node_id__in=node_ids)\
+                       .update(planned_hours=F("planned_hours") + planned,
+                               assigned_hours=F("assigned_hours") + assigned)
+
+
+async def update_coverage(ue_id: int, covering_before: set[int], totals: Totals | None = None) -> None:
+    """
+    This method updates the totals after the parents of an UE changed.
+    `covering_before` MUST be read with `get_covering_nodes` before the change.
+    When the UE is deleted, its totals MUST be read before the deletion too.
+    The arborescence version of the academic year of the UE MUST be bumped once the transaction is committed.
+    """
+    if totals is None:
+        totals = (await get_ue_totals([ue_id]))[ue_id]
+    planned, assigned = totals
+
+    covering_after: set[int] = await get_covering_nodes(ue_id)
+    await add_to_nodes(covering_after - covering_before, planned, assigned)
+    await add_to_nodes(covering_before - covering_after, -planned, -assigned)
+
+
+async def apply_deltas(deltas: dict[int, Totals]) -> None:
+    """
+    This method adds the given (planned, assigned) hours to the totals of each node, in a single query.
+    """
+    rows: list[tuple[int, int, int]] = [(node_id, planned, assigned)
+                                        for node_id, (planned, assigned) in sorted(deltas.items())
+                                        if planned != 0 or assigned != 0]
+    if len(rows) == 0:
+        return
+
+    connection = connections.get("default")
+    for start in range(0, len(rows), DELTAS_BATCH_SIZE):
+        batch: list[tuple[int, int, int]] = rows[start:start + DELTAS_BATCH_SIZE]
+        placeholders: str = ", ".join(f"(${3 * index + 1}::int, ${3 * index + 2}::int, ${3 * index + 3}::int)"
+                                      for index in range(len(batch)))
+        await connection.execute_query(f'''UPDATE "NodeHours"
+                                          SET "planned_hours" = "NodeHours"."planned_hours" + "delta"."planned",
+                                              "assigned_hours" = "NodeHours"."assigned_hours" + "delta"."assigned"
+                                          FROM (VALUES {placeholders}) AS "delta" ("node_id", "planned", "assigned")
+                                          WHERE "NodeHours"."node_id" = "delta"."node_id"''',
+                                       [value for row in batch for value in row])
+
+
+async def add_to_courses(course_hours: dict[int, Totals]) -> set[int]:
+    """
+    This method adds the given (planned, assigned) hours of each course to the totals of the nodes located above it.
+    The nodes are read along the closure table in a single query, then updated in a single query.
+    Returns the academic years of the updated nodes : their arborescence versions MUST be bumped
+    once the transaction is committed.
+    """
+    course_hours = {course_id: hours for course_id, hours in course_hours.items() if hours != (0, 0)}
+    if len(course_hours) == 0:
+        return set()
+
+    # Like `get_covering_nodes`, a node is counted once per UE of the course located under it.
+    links: set[tuple[int, int, int, int]] = set(await NodeClosureInDB.filter(descendant__ues__courses__id__in=list(course_hours))
+                                                                     .values_list("descendant__ues__courses__id",
+                                                                                  "descendant__ues__id",
+                                                                                  "ancestor_id",
+                                                                                  "academic_year"))
+    deltas: dict[int, Totals] = {}
+    academic_years: set[int] = set()
+    for course_id, _, node_id, academic_year in links:
+        if course_id not in course_hours:
+            continue
+        planned, assigned = deltas.get(node_id, (0, 0))
+        deltas[node_id] = (planned + course_hours[course_id][0], assigned + course_hours[course_id][1])
+        academic_years.add(academic_year)
+
+    await apply_deltas(deltas)
+    return academic_years
+
+
+async def add_to_course(course_id: int, planned: int, assigned: int) -> set[int]:
+    """
+    This method adds the given hours to the totals of the nodes located above the course.
+    Returns the academic years of the updated nodes, see `add_to_courses`.
+    """
+    return await add_to_courses({course_id: (planned, assigned)})
+
+
+async def get_course_totals(course: CourseInDB) -> Totals:
+    """
+    Returns the totals of a single course, with the hours of its affectations.
+    """
+    assigned: list[int] = await AffectationInDB.filter(course_id=course.id).values_list("hours", flat=True)
+    return course.duration * course.group_count, sum(assigned)
+
+
+async def compute_totals(node_ids: list[int] | None = None) -> dict[int, Totals]:
+    """
+    This method computes the totals of the given nodes (all of them if None) from scratch.
+    """
+    links = NodeClosureInDB.all() if node_ids is None else NodeClosureInDB.filter(ancestor_id__in=node_ids)
+    closure_rows: list[tuple[int, int]] = await links.values_list("ancestor_id", "descendant_id")
+
+    descendants: set[int] = {descendant_id for _, descendant_id in closure_rows}
+    ue_rows: list[tuple[int, int]] = await UEInDB.filter(parent__id__in=descendants)\
+                                                 .values_list("id", "parent__id") if descendants else []
+    ues_by_node: dict[int, set[int]] = {}
+    for ue_id, parent_id in ue_rows:
+        ues_by_node.setdefault(parent_id, set()).add(ue_id)
+
+    # Each node counts the distinct UEs of its subtree.
+    ues_under: dict[int, set[int]] = {node_id: set() for node_id in node_ids or []}
+    for ancestor_id, descendant_id in closure_rows:
+        ues_under.setdefault(ancestor_id, set()).update(ues_by_node.get(descendant_id, set()))
+
+    ue_totals: dict[int, Totals] = await get_ue_totals(list({ue_id for ue_id, _ in ue_rows}))
+    return {node_id: (sum(ue_totals[ue_id][0] for ue_id in ue_ids),
+                      sum(ue_totals[ue_id][1] for ue_id in ue_ids))
+            for node_id, ue_ids in ues_under.items()}
+
+
+async def refresh_nodes(node_ids: list[int]) -> None:
+    """
+    This method computes the totals of the given nodes again.
+    Used when a whole subtree is moved, for the nodes that were or are now above it.
+    The arborescence version of their academic year MUST be bumped once the transaction is committed.
+    """
+    if len(node_ids) == 0:
+        return
+
+    totals: dict[int, Totals] = await compute_totals(node_ids)
+    rows: list[NodeHoursInDB] = await NodeHoursInDB.filter(node_id__in=node_ids)
+    for row in rows:
+        row.planned_hours, row.assigned_hours = totals[row.node_id]  # type: ignore
+    if rows:
+        await NodeHoursInDB.bulk_update(rows, fields=["planned_hours", "assigned_hours"])
+
+
+async def check_drift() -> list[tuple[int, Totals | None, Totals]]:
+    """
+    This method compares the stored totals to totals computed from scratch.
+    Returns the (node id, stored totals, expected totals) of every node that drifted.
+    """
+    expected: dict[int, Totals] = await compute_totals()
+    node_ids: list[int] = await NodeInDB.all().values_list("id", flat=True)
+    stored: dict[int, Totals] = {node_id: (planned, assigned)
+                                 for node_id, planned, assigned
+                                 in await NodeHoursInDB.all().values_list("node_id", "planned_hours", "assigned_hours")}
+
+    return [(node_id, stored.get(node_id), expected.get(node_id, (0, 0)))
+            for node_id in sorted(node_ids)
+            if stored.get(node_id) != expected.get(node_id, (0, 0))]
+
+
+async def rebuild_node_hours() -> set[int]:
+    """
+    This method rebuilds the totals of every node from scratch.
+    Returns the academic years of the rebuilt nodes : their arborescence versions
+    MUST be bumped once the transaction is committed.
+    """
+    expected: dict[int, Totals] = await compute_totals()
+    node_rows: list[tuple[int, int]] = await NodeInDB.all().values_list("id", "academic_year")
+
+    rows: list[NodeHoursInDB] = [NodeHoursInDB(node_id=node_id,
+                                               academic_year=academic_year,
+                                               planned_hours=expected.get(node_id, (0, 0))[0],
+                                               assigned_hours=expected.get(node_id, (0, 0))[1])
+                                 for node_id, academic_year in node_rows]
+    async with in_transaction():
+        await NodeHoursInDB.all().delete()
+        await NodeHoursInDB.bulk_create(rows, batch_size=1000)
+
+    print_info(f"{len(rows)} node hour totals created.")
+    return {academic_year for _, academic_year in node_rows}
+
+
+async def ensure_node_hours() -> set[int]:
+    """
+    This method rebuilds the totals if some nodes have none, since nodes can be loaded without going through the services.
+    Comparing the totals to the data reads every course : it is left to the `node_hours` command.
+    It MUST run inside of `Postgresql.exclusive_transaction`, so that the workers do not rebuild them together.
+    Returns the academic years of the rebuilt nodes.
+    """
+    if await NodeHoursInDB.all().count() == await NodeInDB.all().count():
+        return set()
+
+    print_warning("Some nodes have no hour totals, rebuilding them...")
+    return await rebuild_node_hours()
@@ -3,17 +3,20 @@ This module provides methods to manage nodes.
 Nodes are the "folders" before an UE.
 """
 
-from typing import Optional, Union, cast
+from typing import Optional, cast
 from fastapi import HTTPException
+from tortoise.transactions import in_transaction
 from app.models.pydantic.NodeModel import (PydanticNodeCreateModel,
                                            PydanticNodeModel,
                                            PydanticNodeModelWithChildIds,
                                            PydanticNodeUpdateModel,
                                            PydanticUEInNodeModel)
-from app.models.tortoise.account import AccountInDB
 from app.models.tortoise.node import NodeInDB
 from app.models.tortoise.ue import UEInDB
-from app.services.PermissionService import check_permissions
+from app.services import NodeHierarchyService, NodeHoursService
+from app.services.ArborescenceService import (ArborescenceCache, NodeTreeIndex,
+                                              check_etag, load_subtree_index, make_etag)
+from app.services.PermissionService import AuthContext
 from app.utils.enums.http_errors import CommonErrorMessages
 from app.utils.enums.permission_enums import AvailableOperations, AvailableServices
 
@@ -31,16 +34,6 @@ async def get_root(academic_year: int) -> NodeInDB:
                             detail=CommonErrorMessages.ROOT_NODE_NOT_FOUND.value)
     return root
 
-async def get_node_map(academic_year: int) -> dict[int, NodeInDB]:
-    """
-    Returns a dict that associates nodes in the database to their ids.
-    It fetches ALL the nodes to do so, use sparignly.
-    CAREFUL ! Does not check for permissions !
-    """
-    all_nodes : list[NodeInDB] = await NodeInDB.filter(academic_year=academic_year)\
-                                               .prefetch_related("child_nodes")
-    return {node.id: node for node in all_nodes}
-
 async def add_ues_to_node_model(node: PydanticNodeModel | PydanticNodeModelWithChildIds, academic_year: int) -> PydanticNodeModel | PydanticNodeModelWithChildIds:
     """
     This method adds the UEs to the given node model.
@@ -54,33 +47,6 @@ async def add_ues_to_node_model(node: PydanticNodeModel | PydanticNodeModelWithC
 
     return node
 
-async def build_tree_recursive(current_node: NodeInDB, node_map: dict[int, NodeInDB]) -> PydanticNodeModel:
-    """
-    This method builds the tree described by the nodes inside of a pydantic model.
-    This method is recursive.
-    CAREFUL ! It does not checks for permissions.
-    Args:
-        current_node (NodeInDB): Node to start the building from.
-        node_map (dict[int, NodeInDB]): A dict used to avoid frequent queries to the database.
-    Returns:
-        PydanticNodeModel : A tree-like structure, completed with he children relationships.
-    """
-    children: Union[list[PydanticNodeModel], list[PydanticUEInNodeModel]] = []
-    if current_node.child_nodes is not None:
-        for c in await current_node.child_nodes.all():
-            child: NodeInDB | None = node_map.get(c.id)
-            if child is not None :
-                children.append(await build_tree_recursive(child, node_map))
-    
-    pydantic_node: PydanticNodeModel = PydanticNodeModel(
-        id=current_node.id,
-        academic_year=current_node.academic_year,
-        name=current_node.name,
-        child_nodes=children
-    )
-
-    return cast(PydanticNodeModel, await add_ues_to_node_model(pydantic_node, current_node.academic_year))
-
 async def build_node_with_child_id(node: NodeInDB, children: Optional[list[NodeInDB]] = None) -> PydanticNodeModelWithChildIds:
     """
     This method builds a node with its children ids.
@@ -97,15 +63,14 @@ async def build_node_with_child_id(node: NodeInDB, children: Optional[list[NodeI
     )
     return cast(PydanticNodeModelWithChildIds, await add_ues_to_node_model(res, node.academic_year))
 
-async def get_node_by_id(node_id: int, current_account: AccountInDB) -> PydanticNodeModelWithChildIds:
+async def get_node_by_id(node_id: int, context: AuthContext) -> PydanticNodeModelWithChildIds:
     """
     This method returns the Node of the given node id.
     Also returns the contents of the sub-nodes.
     """
-    await check_permissions(
+    await context.check(
         AvailableServices.NODE_SERVICE,
-        AvailableOperations.GET,
-        current_account)
+        AvailableOperations.GET)
 
     node: NodeInDB | None = await NodeInDB.get_or_none(id=node_id)\
                                           .prefetch_related("child_nodes")
@@ -118,15 +83,14 @@ async def get_node_by_id(node_id: int, current_account: AccountInDB) -> Pydantic
         return await build_node_with_child_id(node)
 
 
-async def get_root_node(academic_year: int, current_account: AccountInDB) -> PydanticNodeModelWithChildIds:
+async def get_root_node(academic_year: int, context: AuthContext) -> PydanticNodeModelWithChildIds:
     """
     This method returns the root Node of the given academic year.
     Also returns the sub-nodes ids.
     """
-    await check_permissions(
+    await context.check(
         AvailableServices.NODE_SERVICE,
-        AvailableOperations.GET,
-        current_account)
+        AvailableOperations.GET)
 
     root: NodeInDB = await get_root(academic_year)
     if root.child_nodes is not None:
@@ -135,58 +99,65 @@ async def get_root_node(academic_year: int, current_account: AccountInDB) -> Pyd
         return await build_node_with_child_id(root)
 
 
-async def get_root_arborescence(academic_year: int, current_account: AccountInDB) -> PydanticNodeModel:
+async def get_root_arborescence(academic_year: int, context: AuthContext, if_none_match: str | None = None) -> tuple[PydanticNodeModel, str]:
     """
-    This method returns the complete arborescence starting from the root.
+    This method returns the complete arborescence starting from the root, with its ETag.
+    Raises a 304 if the client already has the current version.
     """
-    await check_permissions(
+    await context.check(
         AvailableServices.NODE_SERVICE,
-        AvailableOperations.GET,
-        current_account)
+        AvailableOperations.GET)
 
-    root: NodeInDB                = await get_root(academic_year)
-    node_map: dict[int, NodeInDB] = await get_node_map(academic_year)
+    index: NodeTreeIndex = await ArborescenceCache.get_index(academic_year)
+    check_etag(index.get_etag(), if_none_match)
 
-    return await build_tree_recursive(root, node_map)
+    return index.get_tree(index.get_root_id()), index.get_etag()
 
 
-async def get_all_child_nodes(node: int | NodeInDB, academic_year: int, current_account: AccountInDB | None = None) -> PydanticNodeModel:
+async def get_all_child_nodes(node: int | NodeInDB, academic_year: int, context: AuthContext | None = None,
+                              if_none_match: str | None = None, depth: int | None = None,
+                              expand: list[int] | None = None) -> tuple[PydanticNodeModel, str]:
     """
-    This method returns the child Nodes of the given node id.
-    To avoid re_checking permissions, we pass the current_account as an optional parameter.
+    This method returns the child Nodes of the given node id, with the ETag of the arborescence.
+    The UEs of the subtree come with their courses.
+    Only `depth` levels are displayed, plus the children of the expanded nodes.
+    To avoid re_checking permissions, the context is an optional parameter.
+    Raises a 304 if the client already has the current version.
     """
-    if current_account is not None:
-        await check_permissions(
+    if context is not None:
+        await context.check(
             AvailableServices.NODE_SERVICE,
-            AvailableOperations.GET,
-            current_account)
-
-    # If the node to search from has not been provided, we fetch it.
-    if isinstance(node, int):
-        node_temp: NodeInDB | None = await NodeInDB.get_or_none(id=node)\
-                                                   .prefetch_related("child_nodes")
-        if node_temp is None:
-            raise HTTPException(status_code=404,
-                                detail=CommonErrorMessages.NODE_NOT_FOUND.value)
-        node = node_temp
+            AvailableOperations.GET)
+
+    node_id: int = node if isinstance(node, int) else node.id
+    version: int = await ArborescenceCache.get_version(academic_year)
+    etag   : str = make_etag(academic_year, version)
+    check_etag(etag, if_none_match)
+
+    index: NodeTreeIndex = await load_subtree_index(node_id, academic_year, depth, expand, version)
+    return index.get_tree(node_id, depth, expand), etag
 
-    # We fetch all the nodes of the given academic year
-    # We use an eager loading method since it requires less requests to the database.
-    all_nodes : list[NodeInDB] = await NodeInDB.filter(academic_year=academic_year)\
-                                               .prefetch_related("child_nodes")
 
-    node_map: dict[int, NodeInDB] = {node.id: node for node in all_nodes}
-    return await build_tree_recursive(node, node_map)
+async def get_node_ancestors(node_id: int, context: AuthContext) -> list[PydanticNodeModel]:
+    """
+    This method returns the ancestors of the given node, from the root to the node itself.
+    Used to display breadcrumbs.
+    """
+    await context.check(
+        AvailableServices.NODE_SERVICE,
+        AvailableOperations.GET)
+
+    return [PydanticNodeModel(id=ancestor_id, name=name, academic_year=academic_year)
+            for ancestor_id, name, academic_year in await NodeHierarchyService.get_ancestors(node_id)]
 
 
-async def create_node(academic_year: int, node_to_add: PydanticNodeCreateModel, current_account: AccountInDB) -> PydanticNodeModelWithChildIds:
+async def create_node(academic_year: int, node_to_add: PydanticNodeCreateModel, context: AuthContext) -> PydanticNodeModelWithChildIds:
     """
     This method creates a new Node.
     """
-    await check_permissions(
+    await context.check(
         AvailableServices.NODE_SERVICE,
-        AvailableOperations.CREATE,
-        current_account)
+        AvailableOperations.CREATE)
     
     if node_to_add.parent_id is not None and not await NodeInDB.exists(id=node_to_add.parent_id, academic_year=academic_year):
         raise HTTPException(status_code=404,
@@ -208,17 +179,21 @@ async def create_node(academic_year: int, node_to_add: PydanticNodeCreateModel,
         parent=parent
     )
 
-    await node.save()
+    async with in_transaction():
+        await node.save()
+        await NodeHierarchyService.insert_node(node)
+        await NodeHoursService.create_node_hours(node)
+    await ArborescenceCache.bump_version(academic_year)
+
     return await build_node_with_child_id(node)
 
-async def update_node(academic_year: int, node_id: int, new_data: PydanticNodeUpdateModel, current_account: AccountInDB) -> None:
+async def update_node(academic_year: int, node_id: int, new_data: PydanticNodeUpdateModel, context: AuthContext) -> None:
     """
     This method updates the Node of the given node id.
     """
-    await check_permissions(
+    await context.check(
         AvailableServices.NODE_SERVICE,
-        AvailableOperations.UPDATE,
-        current_account)
+        AvailableOperations.UPDATE)
 
     node_to_update: NodeInDB | None = await NodeInDB.get_or_none(id=node_id, academic_year=academic_year)
     if node_to_update is None:
@@ -234,25 +209,39 @@ async def update_node(academic_year: int, node_id: int, new_data: PydanticNodeUp
         raise HTTPException(status_code=400,
                             detail=CommonErrorMessages.FOLDER_AND_UE_NOT_ENABLED.value)
 
+    new_parent: NodeInDB | None = None
     if new_data.parent_id is not None:
-        parent: NodeInDB | None = await NodeInDB.get_or_none(id=new_data.parent_id)
-        if parent is None:
+        new_parent = await NodeInDB.get_or_none(id=new_data.parent_id)
+        if new_parent is None:
             raise HTTPException(status_code=404,
                                 detail=CommonErrorMessages.NODE_NOT_FOUND.value)
-        node_to_update.parent = parent
+        node_to_update.parent = new_parent
         new_data.parent_id = None
 
-    node_to_update.update_from_dict(new_data.model_dump(exclude_none=True))# type: ignore
-    await node_to_update.save()
+    old_ancestors: set[int] = set()
+    if new_parent is not None:
+        old_ancestors = {row[0] for row in await NodeHierarchyService.get_ancestors(node_id)} - {node_id}
 
-async def delete_node(academic_year: int, node_id: int, current_account: AccountInDB) -> None:
+    node_to_update.update_from_dict(new_data.model_dump(exclude_none=True))# type: ignore
+    async with in_transaction():
+        # The hierarchy index refuses to move a node under itself, so it is updated first.
+        if new_parent is not None:
+            await NodeHierarchyService.move_node(node_to_update, new_parent.id)
+        await node_to_update.save()
+
+        # The nodes that are above the node both before and after the move keep the same totals.
+        if new_parent is not None:
+            new_ancestors: set[int] = {row[0] for row in await NodeHierarchyService.get_ancestors(new_parent.id)}
+            await NodeHoursService.refresh_nodes(list(old_ancestors ^ new_ancestors))
+    await ArborescenceCache.bump_version(academic_year)
+
+async def delete_node(academic_year: int, node_id: int, context: AuthContext) -> None:
     """
     This method deletes the Node of the given node id.
     """
-    await check_permissions(
+    await context.check(
         AvailableServices.NODE_SERVICE,
-        AvailableOperations.DELETE,
-        current_account)
+        AvailableOperations.DELETE)
 
     node_to_delete: NodeInDB | None = await NodeInDB.get_or_none(id=node_id, academic_year=academic_year)\
                                                     .prefetch_related("child_nodes")
@@ -273,3 +262,4 @@ async def delete_node(academic_year: int, node_id: int, current_account: Account
                             detail=CommonErrorMessages.NODE_CANT_DELETE_CHILDREN.value)
 
     await node_to_delete.delete()
+    await ArborescenceCache.bump_version(academic_year)
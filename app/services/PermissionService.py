@@ -1,43 +1,299 @@
 """
-This module provides a service to check if a user has the permission to perform 
+This module provides a service to check if a user has the permission to perform
 a certain operation on a certain service.
+The permissions of every role are compiled in memory, and each account is cached with its role,
+so that most requests do not need any query to authenticate. Changes are broadcast to every worker through Redis.
 """
+import asyncio
+import os
+import time
+from collections import OrderedDict
 
+from dotenv import load_dotenv
 from fastapi import HTTPException
 from app.models.tortoise.account import AccountInDB
 from app.models.tortoise.account_metadata import AccountMetadataInDB
-from app.models.tortoise.permission import PermissionInDB
 from app.models.tortoise.role import RoleInDB
+from app.utils.CustomExceptions import RequiredFieldIsNone
+from app.utils.databases.redis_helper import Redis
 from app.utils.enums.http_errors import CommonErrorMessages
 from app.utils.enums.permission_enums import AvailableOperations, AvailableServices
+from app.utils.printers import print_error
 
+# Academic year of the roles used to check the permissions.
+# TODO : Add automatic recognition of the current academic year.
+PERMISSIONS_ACADEMIC_YEAR: int = 2024
 
-async def check_permissions(service: AvailableServices,
-                            operation: AvailableOperations,
-                            current_account: AccountInDB,
-                            academic_year: int = 2024) -> None:
+# Channel on which the workers announce the changes of roles and permissions.
+INVALIDATION_CHANNEL: str = "permissions:invalidate"
+PERMISSIONS_MESSAGE : str = "permissions"
+ALL_ACCOUNTS_MESSAGE: str = "accounts"
+ACCOUNT_MESSAGE     : str = "account:{account_id}"
+
+
+async def publish_invalidation(message: str) -> None:
+    """
+    This method announces a change to every worker, including this one.
+    """
+    redis_db = Redis.get_async_redis()
+    if redis_db is None:
+        raise RequiredFieldIsNone("Redis instance is None !")
+
+    await redis_db.publish(INVALIDATION_CHANNEL, message)
+
+
+class PermissionMatrix:
+    """
+    Per-worker matrix of the permissions : role name -> allowed (service, operation) pairs.
+    Changes are announced on the invalidation channel. The version counter in Redis is also checked
+    every CHECK_INTERVAL seconds, in case a message was missed.
+    Any change on the roles or their permissions MUST call `bump_version`.
+    """
+
+    VERSION_KEY    : str   = "permissions:version"
+    CHECK_INTERVAL : float = 30.0
+
+    roles      : dict[str, frozenset[tuple[str, str]]] = {}
+    version    : int | None = None
+    checked_at : float = 0.0
+    generation : int = 0
+
+    @classmethod
+    async def get_version(cls) -> int:
+        """
+        Returns the current version of the permissions.
+        """
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        version: bytes | None = await redis_db.get(cls.VERSION_KEY)
+        return 0 if version is None else int(version)
+
+    @classmethod
+    async def bump_version(cls) -> None:
+        """
+        Marks the permissions as modified, for all the workers.
+        """
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        await redis_db.incr(cls.VERSION_KEY)
+        cls.invalidate()
+        await publish_invalidation(PERMISSIONS_MESSAGE)
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        Forgets the compiled permissions of this worker.
+        """
+        cls.version = None
+        cls.generation += 1
+
+    @classmethod
+    async def load(cls, version: int) -> None:
+        """
+        This method compiles the permissions of every role, in a single query.
+        """
+        generation: int = cls.generation
+        rows: list[tuple[str, str | None, str | None]] = await RoleInDB.all().values_list("name",
+                                                                                         "permissions__service_id",
+                                                                                         "permissions__operation_id")
+        roles: dict[str, set[tuple[str, str]]] = {}
+        for role_name, service_name, operation_name in rows:
+            allowed: set[tuple[str, str]] = roles.setdefault(role_name, set())
+            # Roles without any permission still appear, with empty columns.
+            if service_name is not None and operation_name is not None:
+                allowed.add((service_name, operation_name))
+
+        cls.roles = {role_name: frozenset(allowed) for role_name, allowed in roles.items()}
+        # If the permissions changed while loading, they are loaded again on the next check.
+        if cls.generation == generation:
+            cls.version = version
+
+    @classmethod
+    async def is_allowed(cls, role_name: str, service: AvailableServices, operation: AvailableOperations) -> bool:
+        """
+        Returns True if the role is allowed to perform the operation on the service.
+        The matrix is compiled again only if its version changed.
+        """
+        now: float = time.monotonic()
+        if cls.version is None or now - cls.checked_at >= cls.CHECK_INTERVAL:
+            cls.checked_at = now
+            version: int = await cls.get_version()
+            if cls.version != version:
+                await cls.load(version)
+
+        return (service.value.service_name, operation.value.operation_name) in cls.roles.get(role_name, frozenset())
+
+
+class AccountRoleCache:
+    """
+    Per-worker LRU cache of the accounts and their roles : (account id, academic year) -> (login, role name).
+    Only plain values are cached, so that concurrent requests never share a model instance.
+    Changes are announced on the invalidation channel, entries also expire after TTL seconds
+    in case a message was missed. Accounts without a role are not cached.
+    Any change on an account or on its role MUST call `invalidate_account`.
+    """
+
+    MAX_SIZE : int   = 10000
+    TTL      : float = 300.0
+
+    entries    : OrderedDict[tuple[int, int], tuple[str, str, float]] = OrderedDict()
+    generation : int = 0
+
+    @classmethod
+    def configure(cls) -> None:
+        """
+        Reads the size and the TTL of the cache from the environment (ROLE_CACHE_SIZE, ROLE_CACHE_TTL).
+        """
+        load_dotenv(".env")
+        cls.MAX_SIZE = int(os.getenv(key="ROLE_CACHE_SIZE", default=str(cls.MAX_SIZE)))
+        cls.TTL      = float(os.getenv(key="ROLE_CACHE_TTL", default=str(cls.TTL)))
+
+    @classmethod
+    def get(cls, account_id: int, academic_year: int) -> tuple[str, str] | None:
+        """
+        Returns the cached login and role of the account for the academic year, or None.
+        """
+        entry: tuple[str, str, float] | None = cls.entries.get((account_id, academic_year))
+        if entry is None:
+            return None
+
+        login, role_name, expires_at = entry
+        if expires_at <= time.monotonic():
+            del cls.entries[(account_id, academic_year)]
+            return None
+        cls.entries.move_to_end((account_id, academic_year))
+        return login, role_name
+
+    @classmethod
+    def put(cls, account_id: int, login: str, academic_year: int, role_name: str, generation: int) -> None:
+        """
+        Caches the login and the role of the account, unless an invalidation happened since `generation` was read.
+        """
+        if cls.generation != generation:
+            return
+
+        cls.entries[(account_id, academic_year)] = (login, role_name, time.monotonic() + cls.TTL)
+        cls.entries.move_to_end((account_id, academic_year))
+        while len(cls.entries) > cls.MAX_SIZE:
+            cls.entries.popitem(last=False)
+
+    @classmethod
+    def evict(cls, account_id: int | None = None) -> None:
+        """
+        Forgets the roles of the account (of every account if None), in this worker.
+        """
+        cls.generation += 1
+        if account_id is None:
+            cls.entries.clear()
+            return
+
+        for key in [key for key in cls.entries if key[0] == account_id]:
+            del cls.entries[key]
+
+    @classmethod
+    async def invalidate_account(cls, account_id: int) -> None:
+        """
+        Forgets the roles of the account, in all the workers.
+        """
+        cls.evict(account_id)
+        await publish_invalidation(ACCOUNT_MESSAGE.format(account_id=account_id))
+
+    @classmethod
+    async def invalidate_all(cls) -> None:
+        """
+        Forgets the roles of every account, in all the workers.
+        """
+        cls.evict()
+        await publish_invalidation(ALL_ACCOUNTS_MESSAGE)
+
+
+def handle_invalidation(message: str) -> None:
     """
-    This method checks if the provided user has the permission to perform the provided 
-    operation on the provided service.
+    This method applies a change announced on the invalidation channel.
     """
-    academic_year = 2024 # TODO : Add automatic recognition of the current academic year.
-    # We fetch the user's role.
-    meta : AccountMetadataInDB | None = await AccountMetadataInDB.get_or_none(account_id=current_account.id,
-                                                                              academic_year=academic_year).prefetch_related("role")
+    if message == PERMISSIONS_MESSAGE:
+        PermissionMatrix.invalidate()
+    elif message == ALL_ACCOUNTS_MESSAGE:
+        AccountRoleCache.evict()
+    elif message.startswith("account:"):
+        AccountRoleCache.evict(int(message.removeprefix("account:")))
 
-    if meta is None:
-        raise HTTPException(status_code=403, detail=CommonErrorMessages.FORBIDDEN_ACTION)
 
-    role    : RoleInDB | None = meta.role
-    if role is None:
-        raise HTTPException(status_code=403, detail=CommonErrorMessages.FORBIDDEN_ACTION)
+async def listen_for_invalidations() -> None:
+    """
+    This method applies the changes announced by the workers, until it is cancelled.
+    It is meant to run as a background task.
+    """
+    while True:
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        pubsub = redis_db.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                handle_invalidation(message["data"].decode())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Messages may have been missed : everything is loaded again.
+            print_error(f"Permission invalidations interrupted : {e}")
+            PermissionMatrix.invalidate()
+            AccountRoleCache.evict()
+            await asyncio.sleep(1.0)
+        finally:
+            await pubsub.close()
+
+
+class AuthContext:
+    """
+    Authentication context of a request : the account, its role for the academic year,
+    and a permission checker that does not need any query.
+    """
+    account_id    : int
+    login         : str
+    academic_year : int
+    role_name     : str | None
+
+    def __init__(self, account_id: int, login: str, academic_year: int, role_name: str | None):
+        self.account_id    = account_id
+        self.login         = login
+        self.academic_year = academic_year
+        self.role_name     = role_name
+
+    async def check(self, service: AvailableServices, operation: AvailableOperations) -> None:
+        """
+        This method checks if the account has the permission to perform the operation on the service.
+        """
+        if self.role_name is None or not await PermissionMatrix.is_allowed(self.role_name, service, operation):
+            raise HTTPException(status_code=403, detail=CommonErrorMessages.FORBIDDEN_ACTION.value)
+
+
+async def load_auth_context(account_id: int) -> AuthContext | None:
+    """
+    This method loads the login of the account and its role with a single joined query, or from the cache of the worker.
+    Returns None if the account does not exist.
+    """
+    academic_year: int = PERMISSIONS_ACADEMIC_YEAR
+    cached: tuple[str, str] | None = AccountRoleCache.get(account_id, academic_year)
+    if cached is not None:
+        return AuthContext(account_id, cached[0], academic_year, cached[1])
 
-    # We fetch the permissions of the role.
-    # We also filter the permissions to get only the ones that match the service and the operation.
-    permissions: list[PermissionInDB] = await role.permissions.filter(service_id=service.value.service_name,
-                                                                      operation_id=operation.value.operation_name)
+    generation: int = AccountRoleCache.generation
+    metadata: tuple[str, str] | None = await AccountMetadataInDB.filter(account_id=account_id,
+                                                                        academic_year=academic_year)\
+                                                                .first()\
+                                                                .values_list("account__login", "role_id")
+    if metadata is not None:
+        login, role_name = metadata
+        AccountRoleCache.put(account_id, login, academic_year, role_name, generation)
+        return AuthContext(account_id, login, academic_year, role_name)
 
-    # If the list is empty, the user does not have the permission.
-    # Otherwise, the user has the permission to do the operation on the service.
-    if len(permissions) == 0:
-        raise HTTPException(status_code=403, detail=CommonErrorMessages.FORBIDDEN_ACTION)
+    # The account has no role for the academic year.
+    account_login: str | None = await AccountInDB.filter(id=account_id).first().values_list("login", flat=True)
+    return None if account_login is None else AuthContext(account_id, account_login, academic_year, None)
@@ -17,20 +17,20 @@ from app.models.pydantic.tools.pagination import PydanticPagination
 from app.models.tortoise.account import AccountInDB
 from app.models.tortoise.profile import ProfileInDB
 from app.models.tortoise.status import StatusInDB
-from app.services.PermissionService import check_permissions
+from app.services import WorkloadService
+from app.services.PermissionService import AuthContext
 from app.utils.CustomExceptions import (MailAlreadyUsedException, MailInvalidException)
 from app.utils.databases.utils import get_fields_from_model
 from app.utils.enums.http_errors import CommonErrorMessages
 from app.utils.enums.permission_enums import (AvailableOperations, AvailableServices)
 
 
-async def modify_profile(profile_id: int, model: PydanticProfileModify, current_account: AccountInDB) -> None:
+async def modify_profile(profile_id: int, model: PydanticProfileModify, context: AuthContext) -> None:
     """
     This method modifies the profile qualified by the id provided.
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.UPDATE)
 
     academic_year: int = model.academic_year
 
@@ -57,6 +57,7 @@ async def modify_profile(profile_id: int, model: PydanticProfileModify, current_
     if not await StatusInDB.filter(id=model.status_id).exists():
         raise HTTPException(status_code=404, detail=CommonErrorMessages.STATUS_NOT_FOUND)
 
+    status_id_before: int = profile_to_modify.status_id  # type: ignore
     try:
         if model.account_id == -1:
             profile_to_modify.account_id = None
@@ -67,14 +68,17 @@ async def modify_profile(profile_id: int, model: PydanticProfileModify, current_
     except ValueError as e:
         raise HTTPException(status_code=409, detail=str(e)) from e
 
+    # The coefficients applied to the affectations depend on the status.
+    if profile_to_modify.status_id != status_id_before:  # type: ignore
+        await WorkloadService.refresh_profiles([profile_to_modify.id], profile_to_modify.academic_year)
 
-async def create_profile(model: PydanticProfileCreate, current_account: AccountInDB) -> None:
+
+async def create_profile(model: PydanticProfileCreate, context: AuthContext) -> None:
     """
     This method creates a new profile.
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE,
-                            AvailableOperations.CREATE,
-                            current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.CREATE)
 
     academic_year: int = model.academic_year
 
@@ -96,7 +100,7 @@ async def create_profile(model: PydanticProfileCreate, current_account: AccountI
         raise HTTPException(status_code=404, detail=CommonErrorMessages.STATUS_NOT_FOUND)
 
     try:
-        await ProfileInDB.create(
+        profile: ProfileInDB = await ProfileInDB.create(
             firstname=model.firstname,
             lastname=model.lastname,
             mail=model.mail,
@@ -108,12 +112,14 @@ async def create_profile(model: PydanticProfileCreate, current_account: AccountI
     except ValidationError as e:
         raise MailInvalidException from e
 
+    await WorkloadService.refresh_profiles([profile.id], academic_year)
+
 
-async def get_all_profiles(academic_year: int, current_account: AccountInDB, body: PydanticPagination) -> list[PydanticProfileResponse]:
+async def get_all_profiles(academic_year: int, context: AuthContext, body: PydanticPagination) -> list[PydanticProfileResponse]:
     """
     Retrieves all profiles.
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE, AvailableOperations.GET, current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE, AvailableOperations.GET)
 
     valid_fields : dict[str, Any] = get_fields_from_model(ProfileInDB)
     order_field  : str = body.order_by.lstrip('-')
@@ -128,11 +134,11 @@ async def get_all_profiles(academic_year: int, current_account: AccountInDB, bod
             paginated_profile]  # Use model_validate for each profile
 
 
-async def get_profile_by_id(profile_id: int, current_account: AccountInDB) -> PydanticProfileResponse:
+async def get_profile_by_id(profile_id: int, context: AuthContext) -> PydanticProfileResponse:
     """
     Retrieves a profile by their ID.
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE, AvailableOperations.GET, current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE, AvailableOperations.GET)
 
     profile: ProfileInDB | None = await ProfileInDB.get_or_none(id=profile_id)
     if profile is None:
@@ -141,13 +147,12 @@ async def get_profile_by_id(profile_id: int, current_account: AccountInDB) -> Py
     return PydanticProfileResponse.model_validate(profile)  # Use model_validate to create the response model
 
 
-async def get_profiles_not_linked_to_account(academic_year: int, current_account: AccountInDB,body : PydanticPagination) -> list[PydanticProfileResponse]:
+async def get_profiles_not_linked_to_account(academic_year: int, context: AuthContext,body : PydanticPagination) -> list[PydanticProfileResponse]:
     """
     Retrieves all profiles not linked to an account.
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.GET)
 
     valid_fields: dict[str, Any] = get_fields_from_model(ProfileInDB)
     order_field: str = body.order_by.lstrip('-')
@@ -163,28 +168,26 @@ async def get_profiles_not_linked_to_account(academic_year: int, current_account
 
 
 
-async def get_current_profile(current_account: AccountInDB) -> PydanticProfileResponse:
+async def get_current_profile(context: AuthContext) -> PydanticProfileResponse:
     """
     Retrieves the current profile.
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.GET)
 
-    profile: ProfileInDB | None = await ProfileInDB.get_or_none(account=current_account.id)
+    profile: ProfileInDB | None = await ProfileInDB.get_or_none(account=context.account_id)
     if profile is None:
         raise HTTPException(status_code=404, detail=CommonErrorMessages.PROFILE_NOT_FOUND)
 
     return PydanticProfileResponse.model_validate(profile)
 
 
-async def search_profile_by_keywords(keywords: str, academic_year: int, current_account: AccountInDB, body: PydanticPagination) -> list[PydanticProfileResponse]:
+async def search_profile_by_keywords(keywords: str, academic_year: int, context: AuthContext, body: PydanticPagination) -> list[PydanticProfileResponse]:
     """
     Searches for a profile by keywords.
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.GET)
 
     valid_fields : dict[str, Any] = get_fields_from_model(ProfileInDB)
     order_field  : str = body.order_by.lstrip('-')
@@ -207,12 +210,12 @@ async def search_profile_by_keywords(keywords: str, academic_year: int, current_
     return [PydanticProfileResponse.model_validate(profile) for profile in profiles]
 
 
-async def delete_profile(profile_id: int, current_account: AccountInDB) -> None:
+async def delete_profile(profile_id: int, context: AuthContext) -> None:
     """
     This method deletes the profile by id
     raise exception if profile is not found
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE, AvailableOperations.DELETE, current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE, AvailableOperations.DELETE)
 
     profile: ProfileInDB | None = await ProfileInDB.get_or_none(id=profile_id)
 
@@ -222,13 +225,12 @@ async def delete_profile(profile_id: int, current_account: AccountInDB) -> None:
     await profile.delete()
 
 
-async def get_number_of_profile(academic_year: int, current_account: AccountInDB) -> PydanticNumberOfProfile:
+async def get_number_of_profile(academic_year: int, context: AuthContext) -> PydanticNumberOfProfile:
     """
     This method get the number of profile.
     """
-    await check_permissions(AvailableServices.PROFILE_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.GET)
 
     number_profile_with_account: int = await ProfileInDB.filter(academic_year=academic_year).exclude(account_id=None).count()
 
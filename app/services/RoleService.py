@@ -4,25 +4,23 @@ Provides the methods to use when interacting with a role.
 """
 from fastapi import HTTPException
 
-from app.models.aliases import AuthenticatedAccount
 from app.models.pydantic.PydanticRole import (PydanticCreateRoleModel,
                                               PydanticUpdateRoleModel,
                                               PydanticRoleResponseModel)
 from app.models.tortoise.permission import PermissionInDB
 from app.models.tortoise.role import RoleInDB
-from app.services.PermissionService import check_permissions
+from app.services.PermissionService import AccountRoleCache, AuthContext, PermissionMatrix
 from app.utils.enums.http_errors import CommonErrorMessages
 from app.utils.enums.permission_enums import AvailableServices, AvailableOperations
 
 
-async def get_all_roles(current_account: AuthenticatedAccount) -> list[PydanticRoleResponseModel]:
+async def get_all_roles(context: AuthContext) -> list[PydanticRoleResponseModel]:
     """
     This method retrieves all roles.
     """
 
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
 
     roles: list[RoleInDB] = await RoleInDB.all()
     roles_list : list[PydanticRoleResponseModel] = []
@@ -37,14 +35,13 @@ async def get_all_roles(current_account: AuthenticatedAccount) -> list[PydanticR
     return roles_list
 
 
-async def get_role_by_id(name: str, current_account: AuthenticatedAccount) -> PydanticRoleResponseModel:
+async def get_role_by_id(name: str, context: AuthContext) -> PydanticRoleResponseModel:
     """
         This method retrieves a role with given name.
     """
 
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.GET)
 
     role: RoleInDB | None = await RoleInDB.get_or_none(name=name)
 
@@ -57,14 +54,13 @@ async def get_role_by_id(name: str, current_account: AuthenticatedAccount) -> Py
     )
 
 
-async def add_role(role: PydanticCreateRoleModel, current_account: AuthenticatedAccount) -> None:
+async def add_role(role: PydanticCreateRoleModel, context: AuthContext) -> None:
     """
         This method delete a role with given name.
     """
 
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.CREATE,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.CREATE)
 
     if await RoleInDB.filter(name=role.name).exists():
         raise HTTPException(status_code=409, detail=CommonErrorMessages.ROLE_ALREADY_EXIST.value)
@@ -73,22 +69,25 @@ async def add_role(role: PydanticCreateRoleModel, current_account: Authenticated
 
     await role_to_create.save()
 
-    if role.permissions:
-        for permission in role.permissions:
-            perm: PermissionInDB | None = await PermissionInDB.get_or_none(id=permission)
-            if not perm:
-                raise HTTPException(status_code=404, detail=CommonErrorMessages.PERMISSION_NOT_FOUND.value)
-            await role_to_create.permissions.add(perm)
+    try:
+        if role.permissions:
+            for permission in role.permissions:
+                perm: PermissionInDB | None = await PermissionInDB.get_or_none(id=permission)
+                if not perm:
+                    raise HTTPException(status_code=404, detail=CommonErrorMessages.PERMISSION_NOT_FOUND.value)
+                await role_to_create.permissions.add(perm)
+    finally:
+        # Permissions may have been added even if one of them was not found.
+        await PermissionMatrix.bump_version()
 
 
-async def modify_role(role_name : str, body: PydanticUpdateRoleModel , current_account: AuthenticatedAccount) -> None:
+async def modify_role(role_name : str, body: PydanticUpdateRoleModel , context: AuthContext) -> None:
     """
     This method modifies a role with given name.
     """
 
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.UPDATE)
 
     role: RoleInDB | None = await RoleInDB.get_or_none(name=role_name)
 
@@ -98,14 +97,13 @@ async def modify_role(role_name : str, body: PydanticUpdateRoleModel , current_a
     return None
 
 
-async def delete_role(role_name: str, current_account: AuthenticatedAccount) -> None:
+async def delete_role(role_name: str, context: AuthContext) -> None:
     """
     This method delete a role with given name.
     """
 
-    await check_permissions(AvailableServices.ACCOUNT_SERVICE,
-                            AvailableOperations.DELETE,
-                            current_account)
+    await context.check(AvailableServices.ACCOUNT_SERVICE,
+                        AvailableOperations.DELETE)
 
     role: RoleInDB | None = await RoleInDB.get_or_none(name=role_name)
 
@@ -113,3 +111,6 @@ async def delete_role(role_name: str, current_account: AuthenticatedAccount) ->
         raise HTTPException(status_code=404, detail=CommonErrorMessages.ROLE_NOT_FOUND.value)
 
     await role.delete()
+    await PermissionMatrix.bump_version()
+    # The accounts that had this role lost their metadata with it.
+    await AccountRoleCache.invalidate_all()
@@ -1,41 +1,260 @@
 """
-This module handles the security operations such as user authentication with login and password 
+This module handles the security operations such as user authentication with login and password
 and hashing of passwords.
+The bcrypt operations run in a bounded thread pool, so that they do not block the event loop.
+Login attempts are throttled before reaching it.
 """
-from typing import Optional
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
 
 import bcrypt
+from dotenv import load_dotenv
+from fastapi import HTTPException
 from passlib.context import CryptContext
+from redis.commands.core import AsyncScript
 
+from app.models.pydantic.StatsModel import PydanticPasswordPoolStats
 from app.models.tortoise.account import AccountInDB
+from app.utils.CustomExceptions import RequiredFieldIsNone
+from app.utils.databases.redis_helper import Redis
+from app.utils.enums.http_errors import CommonErrorMessages
 
 
 pwd_context: CryptContext = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+T = TypeVar("T")
 
-def get_password_hash(password: str) -> str:
+
+class PasswordPool:
+    """
+    Per-worker thread pool running the bcrypt operations. bcrypt releases the GIL while hashing.
+    At most SIZE operations run at the same time and QUEUE_LIMIT wait for a thread :
+    the next ones are rejected with a 503 instead of waiting indefinitely.
+    """
+
+    SIZE        : int = min(4, os.cpu_count() or 1)
+    QUEUE_LIMIT : int = 32
+
+    executor   : ThreadPoolExecutor | None = None
+    pending    : int = 0
+    completed  : int = 0
+    rejected   : int = 0
+    total_wait : float = 0.0
+    max_wait   : float = 0.0
+    total_run  : float = 0.0
+
+    @classmethod
+    def configure(cls) -> None:
+        """
+        Reads the size of the pool and of its queue from the environment (BCRYPT_POOL_SIZE, BCRYPT_QUEUE_LIMIT).
+        It MUST be called before the first operation, which creates the threads.
+        """
+        load_dotenv(".env")
+        cls.SIZE        = int(os.getenv(key="BCRYPT_POOL_SIZE") or cls.SIZE)
+        cls.QUEUE_LIMIT = int(os.getenv(key="BCRYPT_QUEUE_LIMIT", default=str(cls.QUEUE_LIMIT)))
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        """
+        Returns the thread pool, created on first use.
+        """
+        if cls.executor is None:
+            cls.executor = ThreadPoolExecutor(max_workers=cls.SIZE, thread_name_prefix="bcrypt")
+        return cls.executor
+
+    @classmethod
+    async def run(cls, function: Callable[..., T], *args: Any) -> T:
+        """
+        This method runs the function in the pool, and records how long it waited for a thread.
+        """
+        if cls.pending >= cls.SIZE + cls.QUEUE_LIMIT:
+            cls.rejected += 1
+            raise HTTPException(status_code=503, detail=CommonErrorMessages.SERVER_BUSY.value,
+                                headers={"Retry-After": "1"})
+
+        def timed() -> tuple[float, float, T]:
+            started: float = time.perf_counter()
+            result: T = function(*args)
+            return started, time.perf_counter(), result
+
+        submitted: float = time.perf_counter()
+        cls.pending += 1
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(cls.get_executor(), timed)
+        finally:
+            cls.pending -= 1
+
+        cls.completed  += 1
+        cls.total_wait += started - submitted
+        cls.max_wait    = max(cls.max_wait, started - submitted)
+        cls.total_run  += finished - started
+        return result
+
+    @classmethod
+    def get_stats(cls) -> PydanticPasswordPoolStats:
+        """
+        Returns the usage of the pool since the worker started.
+        """
+        return PydanticPasswordPoolStats(size=cls.SIZE,
+                                         queue_limit=cls.QUEUE_LIMIT,
+                                         pending=cls.pending,
+                                         completed=cls.completed,
+                                         rejected=cls.rejected,
+                                         average_wait_ms=1000 * cls.total_wait / max(1, cls.completed),
+                                         max_wait_ms=1000 * cls.max_wait,
+                                         average_run_ms=1000 * cls.total_run / max(1, cls.completed))
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        This method stops the threads of the pool.
+        """
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=False, cancel_futures=True)
+            cls.executor = None
+
+
+# Takes a token from each of the given buckets (the login, then the client), only if all of them have one. Buckets refill continuously and are forgotten once full.
+# Returns whether the attempt is allowed, and otherwise the seconds to wait.
+TOKEN_BUCKETS_SCRIPT: str = """
+local now = tonumber(ARGV[1])
+local allowed = 1
+local retry_after = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call("HMGET", key, "tokens", "updated")
+    local tokens = math.min(capacity, (tonumber(bucket[1]) or capacity) + (now - (tonumber(bucket[2]) or now)) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        allowed = 0
+        retry_after = math.max(retry_after, (1 - tokens) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    redis.call("HSET", key, "tokens", tostring(levels[i] - allowed), "updated", tostring(now))
+    redis.call("EXPIRE", key, math.ceil(capacity / rate))
+end
+return {allowed, tostring(retry_after)}
+"""
+
+
+class LoginThrottle:
+    """
+    Admission control of the login attempts, checked before any password is verified :
+    a token bucket per login and per client IP shared by the workers through Redis,
+    and a cap on the password checks in flight on this worker.
+    A bucket with a capacity of 0 is disabled.
+    Unknown logins cost the same as the known ones, so they can't be told apart nor used to save CPU.
+    """
+
+    LOGIN_CAPACITY  : int   = 5
+    LOGIN_RATE      : float = 5 / 60
+    CLIENT_CAPACITY : int   = 20
+    CLIENT_RATE     : float = 20 / 60
+    MAX_IN_FLIGHT   : int   = 2 * PasswordPool.SIZE
+
+    in_flight  : int = 0
+    dummy_hash : bytes | None = None
+    script     : AsyncScript | None = None
+
+    @classmethod
+    def configure(cls) -> None:
+        """
+        Reads the buckets and the cap on the password checks from the environment (LOGIN_BUCKET_CAPACITY,
+        LOGIN_BUCKET_PER_MINUTE, LOGIN_CLIENT_BUCKET_CAPACITY, LOGIN_CLIENT_BUCKET_PER_MINUTE, LOGIN_MAX_IN_FLIGHT).
+        It MUST be called after `PasswordPool.configure`, whose size is the default of the cap.
+        """
+        load_dotenv(".env")
+        cls.LOGIN_CAPACITY  = int(os.getenv(key="LOGIN_BUCKET_CAPACITY", default=str(cls.LOGIN_CAPACITY)))
+        cls.LOGIN_RATE      = float(os.getenv(key="LOGIN_BUCKET_PER_MINUTE", default=str(cls.LOGIN_RATE * 60))) / 60
+        cls.CLIENT_CAPACITY = int(os.getenv(key="LOGIN_CLIENT_BUCKET_CAPACITY", default=str(cls.CLIENT_CAPACITY)))
+        cls.CLIENT_RATE     = float(os.getenv(key="LOGIN_CLIENT_BUCKET_PER_MINUTE", default=str(cls.CLIENT_RATE * 60))) / 60
+        cls.MAX_IN_FLIGHT   = int(os.getenv(key="LOGIN_MAX_IN_FLIGHT") or 2 * PasswordPool.SIZE)
+
+    @classmethod
+    async def admit(cls, login: str, client_ip: str) -> None:
+        """
+        This method consumes a login attempt, or raises a 429 if the login or the client made too many.
+        """
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        # Logins are hashed so that the size of the keys does not depend on the input.
+        login_key: str = f"login:bucket:login:{hashlib.sha256(login.encode('utf-8')).hexdigest()[:32]}"
+        client_key: str = f"login:bucket:client:{client_ip}"
+        keys: list[str] = []
+        args: list[float] = [time.time()]
+        for key, capacity, rate in ((login_key, cls.LOGIN_CAPACITY, cls.LOGIN_RATE),
+                                    (client_key, cls.CLIENT_CAPACITY, cls.CLIENT_RATE)):
+            if capacity > 0:
+                keys.append(key)
+                args.extend((capacity, rate))
+        if len(keys) == 0:
+            return
+
+        # The script is sent once, then called by its digest.
+        if cls.script is None or cls.script.registered_client is not redis_db:
+            cls.script = redis_db.register_script(TOKEN_BUCKETS_SCRIPT)
+        allowed, retry_after = await cls.script(keys=keys, args=args)  # type: ignore
+        if not int(allowed):
+            raise HTTPException(status_code=429, detail=CommonErrorMessages.TOO_MANY_LOGIN_ATTEMPTS.value,
+                                headers={"Retry-After": str(max(1, round(float(retry_after))))})
+
+    @classmethod
+    async def get_dummy_hash(cls) -> bytes:
+        """
+        Returns a hash that no password matches, verified in place of the hash of unknown logins.
+        """
+        if cls.dummy_hash is None:
+            cls.dummy_hash = (await get_password_hash(os.urandom(16).hex())).encode('utf-8')
+        return cls.dummy_hash
+
+
+async def get_password_hash(password: str) -> str:
     """
     This Method is designed to get the Hash of a password
     """
-    password_hash: bytes = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    password_hash: bytes = await PasswordPool.run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
     return password_hash.decode('utf-8')
 
-async def authenticate_user(login: str, password: str) -> Optional["AccountInDB"]:
+async def authenticate_user(login: str, password: str, client_ip: str) -> Optional["AccountInDB"]:
     """
-    This method allows us to authenticate the user referenced by the login, 
+    This method allows us to authenticate the user referenced by the login,
     using the password provided.
-    :param login:    Login for the user.
-    :param password: Password used to check the authenticity of the connection.
+    :param login:     Login for the user.
+    :param password:  Password used to check the authenticity of the connection.
+    :param client_ip: Address of the client, used to throttle its attempts.
     :return: None value if the user could not be authenticated, a UserInDB otherwise.
     """
-    # Checking if the user exists or not and checking its password.
-    account: AccountInDB | None = await AccountInDB.get_or_none(login=login)
-    if account is None or not verify_password(account, password):
-        return None
+    await LoginThrottle.admit(login, client_ip)
+    if LoginThrottle.in_flight >= LoginThrottle.MAX_IN_FLIGHT:
+        raise HTTPException(status_code=503, detail=CommonErrorMessages.SERVER_BUSY.value,
+                            headers={"Retry-After": "1"})
+
+    LoginThrottle.in_flight += 1
+    try:
+        # Checking if the user exists or not and checking its password.
+        account: AccountInDB | None = await AccountInDB.get_or_none(login=login)
+        if account is None:
+            await PasswordPool.run(bcrypt.checkpw, password.encode('utf-8'), await LoginThrottle.get_dummy_hash())
+            return None
+        if not await verify_password(account, password):
+            return None
+    finally:
+        LoginThrottle.in_flight -= 1
     return account
 
-def verify_password(account: AccountInDB, password: str) -> bool:
+async def verify_password(account: AccountInDB, password: str) -> bool:
     """
     This method will compare a hash provided with the hash of the object concerned.
     """
-    return bcrypt.checkpw(password.encode('utf-8'), account.hash.encode('utf-8'))
+    return await PasswordPool.run(bcrypt.checkpw, password.encode('utf-8'), account.hash.encode('utf-8'))
@@ -0,0 +1,334 @@
+"""
+Assignment suggestion services.
+Proposes teachers for the unassigned course groups of an academic year,
+with a min-cost flow from the courses to the profiles that still have quota left.
+Groups cannot be split across quotas, so the flow is a heuristic : its proposals are cheap, not always the cheapest.
+"""
+import heapq
+import math
+
+from app.models.pydantic.AffectationModel import (PydanticAffectationBatch,
+                                                  PydanticAffectationInCreate,
+                                                  PydanticAssignmentSuggestion,
+                                                  PydanticCourseGroup)
+from app.models.pydantic.CoverageModel import PydanticCourseCoverage
+from app.models.pydantic.WorkloadModel import PydanticProfileWorkload
+from app.models.tortoise.affectation import AffectationInDB
+from app.models.tortoise.course import CourseInDB
+from app.services import AffectationService
+from app.services.CoverageService import get_course_coverages
+from app.services.PermissionService import AuthContext
+from app.services.WorkloadService import WorkloadTable, load_workload_table
+from app.utils.enums.permission_enums import AvailableOperations, AvailableServices
+
+# Cost of giving a group to a profile, depending on what the profile already teaches.
+# The weighted hours of the group are added to it, so preferences always come first.
+SAME_COURSE_COST : float = 0.0
+SAME_UE_COST     : float = 1000.0
+SAME_TYPE_COST   : float = 2000.0
+NO_LINK_COST     : float = 3000.0
+
+# Only the cheapest profiles of each course are considered, to keep the graph small.
+CANDIDATES_PER_COURSE: int = 20
+# Profiles without any link to a course are only considered among this many,
+# taken by coefficient for the type of the course, then by remaining quota.
+UNLINKED_PER_COURSE: int = 20
+
+# Weighted hours are floats : this margin absorbs rounding errors when checking the quotas.
+EPSILON: float = 1e-6
+
+
+class AssignmentSolver:
+    """
+    Min-cost flow between the courses (one unit per unassigned group) and the profiles.
+    The capacity of a profile is its remaining quota, in weighted hours. Since a group cannot be split,
+    this capacity is checked on every edge leaving a profile, for the course the flow enters it with.
+    Augmenting paths are found with Dijkstra on reduced costs (successive shortest paths).
+    These capacities depend on the course, so the potentials do not always keep the reduced costs
+    non-negative : the flow is not guaranteed to be of minimum cost (see `find_path`).
+    """
+    courses    : list[tuple[int, int, list[int]]]  # course index -> (id, duration, unassigned groups)
+    profiles   : list[int]                         # profile index -> id
+    remaining  : list[float]                       # profile index -> remaining weighted hours
+    weights    : dict[tuple[int, int], float]      # (course index, profile index) -> weighted hours of a group
+    candidates : list[list[tuple[int, float]]]     # course index -> [(profile index, cost)]
+    costs      : dict[tuple[int, int], float]      # (course index, profile index) -> cost
+    supply     : list[int]                         # course index -> groups left to assign
+    flow       : dict[tuple[int, int], int]        # (course index, profile index) -> groups assigned
+    assigned   : dict[int, dict[int, int]]         # profile index -> {course index: groups assigned}
+
+    def __init__(self, coverages: list[PydanticCourseCoverage], table: WorkloadTable,
+                 workloads: list[PydanticProfileWorkload], links: dict[int, tuple[set[int], set[int], set[int]]],
+                 course_ues: dict[int, set[int]]):
+        """
+        `workloads` MUST be computed from `table`, in the same order.
+        `links` maps the profile ids to the (course ids, UE ids, course type ids) they already teach.
+        The candidates of a course are only looked for among the profiles teaching it, its UEs or its type,
+        and a few others with the lowest coefficient and the most remaining quota, rather than among every profile.
+        """
+        self.courses   = [(coverage.course_id, coverage.duration, coverage.unassigned_groups) for coverage in coverages]
+        self.profiles  = [workload.profile_id for workload in workloads]
+        self.remaining = [workload.remaining_quota for workload in workloads]
+        self.supply    = [len(coverage.unassigned_groups) for coverage in coverages]
+        self.flow      = {}
+        self.assigned  = {}
+        self.weights   = {}
+        self.costs     = {}
+        self.candidates = []
+
+        # Profiles with quota left, by remaining quota, then indexed by what they already teach.
+        by_quota : list[int] = sorted((profile_index for profile_index, remaining in enumerate(self.remaining)
+                                       if remaining > EPSILON),
+                                      key=lambda profile_index: -self.remaining[profile_index])
+        by_course: dict[int, list[int]] = {}
+        by_ue    : dict[int, list[int]] = {}
+        by_type  : dict[int, list[int]] = {}
+        empty: tuple[set[int], set[int], set[int]] = (set(), set(), set())
+        for profile_index in by_quota:
+            courses, ues, types = links.get(self.profiles[profile_index], empty)
+            for course_id in courses:
+                by_course.setdefault(course_id, []).append(profile_index)
+            for ue_id in ues:
+                by_ue.setdefault(ue_id, []).append(profile_index)
+            for course_type_id in types:
+                by_type.setdefault(course_type_id, []).append(profile_index)
+
+        # course type id -> (profiles by coefficient then remaining quota, number of them with the lowest coefficient)
+        unlinked: dict[int, tuple[list[int], int]] = {}
+        for course_type_id in {coverage.course_type_id for coverage in coverages}:
+            pool: list[int] = sorted(by_quota, key=lambda profile_index: table.get_multiplier(profile_index, course_type_id))
+            cheapest: int = sum(1 for profile_index in pool
+                                if table.get_multiplier(profile_index, course_type_id) == table.get_multiplier(pool[0], course_type_id))
+            unlinked[course_type_id] = (pool, cheapest)
+
+        for course_index, coverage in enumerate(coverages):
+            ue_ids: set[int] = course_ues.get(coverage.course_id, set())
+            shortlist: set[int] = set(by_course.get(coverage.course_id, []))
+            for ue_id in ue_ids:
+                shortlist.update(by_ue.get(ue_id, []))
+            type_profiles: list[int] = by_type.get(coverage.course_type_id, [])
+            shortlist.update(get_window(type_profiles, len(type_profiles), course_index))
+            shortlist.update(get_window(*unlinked[coverage.course_type_id], course_index))
+
+            options: list[tuple[float, int, int, float]] = []
+            for profile_index in shortlist:
+                profile_id: int = self.profiles[profile_index]
+                weight: float = coverage.duration * table.get_multiplier(profile_index, coverage.course_type_id)
+                if weight > self.remaining[profile_index] + EPSILON:
+                    continue
+                courses, ues, types = links.get(profile_id, empty)
+                if coverage.course_id in courses:
+                    cost = SAME_COURSE_COST
+                elif not ue_ids.isdisjoint(ues):
+                    cost = SAME_UE_COST
+                elif coverage.course_type_id in types:
+                    cost = SAME_TYPE_COST
+                else:
+                    cost = NO_LINK_COST
+                # Among equal costs, the candidates rotate with the course,
+                # so that the courses do not all compete for the same profiles.
+                options.append((cost + weight, (profile_index - course_index) % len(self.profiles), profile_index, weight))
+
+            self.candidates.append([])
+            for cost, _, profile_index, weight in heapq.nsmallest(CANDIDATES_PER_COURSE, options):
+                self.candidates[course_index].append((profile_index, cost))
+                self.costs[(course_index, profile_index)] = cost
+                self.weights[(course_index, profile_index)] = weight
+
+    def fits(self, profile_index: int, course_in: int, course_out: int | None = None) -> bool:
+        """
+        Returns True if the profile can take a group of `course_in`, after giving away a group of `course_out`.
+        """
+        freed: float = 0.0 if course_out is None else self.weights[(course_out, profile_index)]
+        return self.weights[(course_in, profile_index)] <= self.remaining[profile_index] + freed + EPSILON
+
+    def find_path(self, start: int, potentials: list[float], dead: set[int]) -> list[int] | None:
+        """
+        This method finds a cheap augmenting path, from the course `start` to the sink.
+        Nodes are the course indexes, then the profile indexes shifted by the number of courses, then the sink.
+        An edge that only fits once a profile gave a group away can have a negative reduced cost :
+        it is counted as 0 so that Dijkstra stays valid, the path is then not always the cheapest.
+        Nodes that could not reach the sink during a search are added to `dead` and not searched again,
+        even if a later reassignment would open a path through them.
+        Returns the nodes of the path, or None if no group of the course can be assigned anymore.
+        """
+        course_count: int = len(self.courses)
+        sink: int = len(potentials) - 1
+        distances: dict[int, float] = {}
+        tentative: dict[int, float] = {start: 0.0}
+        # The start course is noted as coming from -1.
+        parents: dict[int, int] = {}
+        # Entries are (distance, rank, node, parent). At equal distance, the sink comes first, then the profiles :
+        # most reduced costs are 0, and the search stops as soon as it reaches the sink.
+        heap: list[tuple[float, int, int, int]] = [(0.0, sink - start, start, -1)]
+
+        def push(target: int, reduced: float, parent: int) -> None:
+            """
+            Pushes the target in the heap if this edge brings it closer.
+            """
+            candidate: float = distance + (reduced if reduced > 0.0 else 0.0)
+            if target not in dead and candidate < tentative.get(target, math.inf):
+                tentative[target] = candidate
+                heapq.heappush(heap, (candidate, sink - target, target, parent))
+
+        while heap:
+            distance, _, node, parent = heapq.heappop(heap)
+            if node in distances:
+                continue
+            distances[node] = distance
+            parents[node] = parent
+            if node == sink:
+                break
+
+            if node < course_count:
+                # Forward edges : giving a group of the course to a profile.
+                for profile_index, cost in self.candidates[node]:
+                    target: int = course_count + profile_index
+                    if target not in distances:
+                        push(target, cost + potentials[node] - potentials[target], node)
+                continue
+
+            profile_index: int = node - course_count
+            course_in: int = parent
+            if self.fits(profile_index, course_in):
+                push(sink, potentials[node] - potentials[sink], node)
+            # Reverse edges : the profile gives one of its groups to someone else.
+            for course_out in self.assigned.get(profile_index, {}):
+                if course_out != course_in and course_out not in distances and self.fits(profile_index, course_in, course_out):
+                    push(course_out, -self.costs[(course_out, profile_index)] + potentials[node] - potentials[course_out], node)
+
+        if sink not in distances:
+            dead.update(distances)
+            return None
+
+        # Shifting all the potentials by the same amount keeps the reduced costs,
+        # so only the nodes closer than the sink need to be updated.
+        for node, distance in distances.items():
+            potentials[node] += distance - distances[sink]
+
+        path: list[int] = [sink]
+        while parents[path[-1]] != -1:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
+    def move(self, course_index: int, profile_index: int, groups: int) -> None:
+        """
+        This method gives (or takes back, if negative) groups of a course to a profile.
+        """
+        key: tuple[int, int] = (course_index, profile_index)
+        self.flow[key] = self.flow.get(key, 0) + groups
+        self.remaining[profile_index] -= groups * self.weights[key]
+        courses: dict[int, int] = self.assigned.setdefault(profile_index, {})
+        courses[course_index] = courses.get(course_index, 0) + groups
+        if courses[course_index] == 0:
+            del courses[course_index]
+
+    def solve(self) -> dict[tuple[int, int], int]:
+        """
+        This method assigns as many groups as possible, at the lowest cost.
+        Returns the number of groups of each course given to each profile, by (course index, profile index).
+        """
+        course_count: int = len(self.courses)
+        potentials: list[float] = [0.0] * (course_count + len(self.profiles) + 1)
+        dead: set[int] = set()
+
+        for first_course in range(course_count):
+            while self.supply[first_course] > 0:
+                path: list[int] | None = self.find_path(first_course, potentials, dead)
+                if path is None:
+                    break
+
+                groups: int = 1
+                if len(path) == 3:
+                    # Without reassignment, as many groups as the profile can take are moved at once.
+                    profile_index: int = path[1] - course_count
+                    weight: float = self.weights[(first_course, profile_index)]
+                    groups = self.supply[first_course] if weight <= 0 else \
+                             min(self.supply[first_course], max(1, int((self.remaining[profile_index] + EPSILON) // weight)))
+
+                for course_node, profile_node in zip(path[:-1:2], path[1:-1:2]):
+                    self.move(course_node, profile_node - course_count, groups)
+                for profile_node, course_node in zip(path[1:-2:2], path[2:-1:2]):
+                    self.move(course_node, profile_node - course_count, -groups)
+                self.supply[first_course] -= groups
+
+        return {key: groups for key, groups in self.flow.items() if groups > 0}
+
+
+def get_window(profile_indexes: list[int], span: int, offset: int, size: int = UNLINKED_PER_COURSE) -> list[int]:
+    """
+    Returns `size` consecutive profiles of the list, starting at a position that rotates with the offset
+    among the first `span` ones. The courses thus do not all compete for the same profiles.
+    """
+    if len(profile_indexes) <= size or span <= 0:
+        return profile_indexes[:size]
+    start: int = (offset * size) % span
+    return profile_indexes[start:start + size] + profile_indexes[:max(0, start + size - len(profile_indexes))]
+
+
+async def suggest_assignments(academic_year: int, context: AuthContext,
+                              node_id: int | None = None, commit: bool = False) -> PydanticAssignmentSuggestion:
+    """
+    This method proposes a teacher for each unassigned group of the academic year (or of the subtree of a node).
+    By default, nothing is written. If commit is True, the proposals are created through the affectation batch.
+    """
+    await context.check(AvailableServices.AFFECTATION_SERVICE,
+                        AvailableOperations.GET)
+
+    courses = CourseInDB.filter(academic_year=academic_year)
+    if node_id is not None:
+        courses = courses.filter(ue__parent__ancestor_links__ancestor_id=node_id)
+    course_ids: list[int] = await courses.distinct().values_list("id", flat=True)
+
+    coverages: list[PydanticCourseCoverage] = [coverage for _, coverage in sorted((await get_course_coverages(course_ids)).items())
+                                               if coverage.unassigned_groups]
+
+    table: WorkloadTable = await load_workload_table(academic_year)
+    workloads: list[PydanticProfileWorkload] = table.compute()
+
+    # Existing affectations hint at what each profile prefers to teach.
+    links: dict[int, tuple[set[int], set[int], set[int]]] = {}
+    for profile_id, course_id, course_type_id, ue_id in await AffectationInDB.filter(profile__academic_year=academic_year)\
+                                                                             .values_list("profile_id", "course_id",
+                                                                                          "course__course_type_id",
+                                                                                          "course__ue__id"):
+        taught_courses, taught_ues, taught_types = links.setdefault(profile_id, (set(), set(), set()))
+        taught_courses.add(course_id)
+        taught_types.add(course_type_id)
+        if ue_id is not None:
+            taught_ues.add(ue_id)
+
+    course_ues: dict[int, set[int]] = {}
+    if coverages:
+        for course_id, ue_id in await CourseInDB.filter(id__in=[coverage.course_id for coverage in coverages])\
+                                                .values_list("id", "ue__id"):
+            if ue_id is not None:
+                course_ues.setdefault(course_id, set()).add(ue_id)
+
+    solver: AssignmentSolver = AssignmentSolver(coverages, table, workloads, links, course_ues)
+    flow: dict[tuple[int, int], int] = solver.solve()
+
+    profiles_by_course: dict[int, list[int]] = {}
+    for course_index, profile_index in sorted(flow):
+        profiles_by_course.setdefault(course_index, []).append(profile_index)
+
+    proposals: list[PydanticAffectationInCreate] = []
+    unassigned: list[PydanticCourseGroup] = []
+    for course_index, (course_id, duration, groups) in enumerate(solver.courses):
+        remaining_groups: list[int] = list(groups)
+        for profile_index in profiles_by_course.get(course_index, []):
+            for _ in range(flow[(course_index, profile_index)]):
+                proposals.append(PydanticAffectationInCreate(profile_id=solver.profiles[profile_index],
+                                                             course_id=course_id,
+                                                             hours=duration,
+                                                             group=remaining_groups.pop(0)))
+        unassigned.extend(PydanticCourseGroup(course_id=course_id, group=group) for group in remaining_groups)
+
+    suggestion: PydanticAssignmentSuggestion = PydanticAssignmentSuggestion(academic_year=academic_year,
+                                                                            proposals=proposals,
+                                                                            unassigned=unassigned)
+    if commit and proposals:
+        suggestion.created = (await AffectationService.apply_affectation_batch(PydanticAffectationBatch(create=proposals),
+                                                                               context)).created
+    return suggestion
@@ -3,21 +3,28 @@ This module is used to provide utility classes to manage Tokens.
 It provides models and methods to do so.
 """
 
+import asyncio
 import enum
+import hashlib
+import math
 import os
+import secrets
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Any, Optional, TypeAlias
 
-import bcrypt
 from jwt import encode, decode, exceptions  # type: ignore
-import redis
+import redis.asyncio
 from dotenv import load_dotenv
 from fastapi import HTTPException
 from passlib.context import CryptContext
+from redis.asyncio.client import Pipeline
 from app.utils.CustomExceptions import MissingEnvironnmentException, RequiredFieldIsNone
 
 from app.utils.databases.redis_helper import Redis
 from app.utils.enums.http_errors import CommonErrorMessages
+from app.utils.printers import print_error
 
 pwd_context: CryptContext = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -27,23 +34,32 @@ class JWTData:
     Class used to describe the encoded data from the JSON Web Tokens.
     """
     account_id: int
-    salt: str
+    jti: str
+    generation: int
     iat: datetime
     exp: datetime
 
-    def __init__(self, account_id: int, salt: str, iat: datetime, exp: datetime):
+    def __init__(self, account_id: int, jti: str, generation: int, iat: datetime, exp: datetime):
         self.account_id = account_id
-        self.salt = salt
+        self.jti = jti
+        self.generation = generation
         self.iat = iat
         self.exp = exp
 
+    def get_revoked_key(self) -> str:
+        """
+        Returns the Redis key under which the token is blocklisted.
+        """
+        return REVOKED_KEY.format(jti=self.jti)
+
     def export(self) -> dict[str, Any]:
         """
         Exports the JWTData to a dictionary.
         """
         return {
             "account_id": self.account_id,
-            "salt": self.salt,
+            "jti": self.jti,
+            "gen": self.generation,
             "iat": self.iat,
             "exp": self.exp
         }
@@ -95,6 +111,275 @@ class AvailableTokenAttributes(enum.Enum):
     REFRESH_TOKEN = TokenAttributes(TokenTypes.REFRESH_TOKEN)
 
 
+# Channel on which the workers announce the revoked tokens and sessions.
+REVOCATION_CHANNEL: str = "tokens:revoked"
+# Key under which a revoked token is blocklisted, by its identifier.
+REVOKED_KEY         : str = "revoked:{jti}"
+REVOKED_KEYS_PATTERN: str = "revoked:*"
+# Key holding the session generation of an account. Tokens issued for a previous generation are revoked.
+SESSIONS_KEY        : str = "sessions:{account_id}"
+
+
+class RevocationFilter:
+    """
+    Per-worker Bloom filter of the keys of the revoked tokens.
+    A token that is not in the filter was not revoked, so only the hits need to be checked in Redis.
+    It is seeded from Redis and kept up to date through the revocation channel. Until then, or if the
+    channel is disconnected, every token is checked in Redis.
+    """
+
+    CAPACITY   : int   = 100000
+    ERROR_RATE : float = 0.001
+
+    bits        : bytearray = bytearray()
+    bit_count   : int = 0
+    hash_count  : int = 0
+    capacity    : int = 0
+    count       : int = 0
+    loaded      : bool = False
+    pending     : list[bytes] | None = None
+
+    @classmethod
+    def configure(cls) -> None:
+        """
+        Reads the sizing of the filter from the environment (REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE).
+        """
+        load_dotenv(".env")
+        cls.CAPACITY   = int(os.getenv(key="REVOCATION_FILTER_CAPACITY", default=str(cls.CAPACITY)))
+        cls.ERROR_RATE = float(os.getenv(key="REVOCATION_FILTER_ERROR_RATE", default=str(cls.ERROR_RATE)))
+
+    @classmethod
+    def reset(cls, capacity: int) -> None:
+        """
+        Empties the filter, sized for `capacity` tokens at the configured error rate.
+        """
+        cls.capacity   = capacity
+        cls.bit_count  = max(8, math.ceil(-capacity * math.log(cls.ERROR_RATE) / math.log(2) ** 2))
+        cls.hash_count = max(1, round(cls.bit_count / capacity * math.log(2)))
+        cls.bits       = bytearray((cls.bit_count + 7) // 8)
+        cls.count      = 0
+
+    @classmethod
+    def get_positions(cls, value: bytes) -> list[int]:
+        """
+        Returns the bits of the value, by double hashing.
+        """
+        digest: bytes = hashlib.blake2b(value, digest_size=16).digest()
+        first: int  = int.from_bytes(digest[:8], "little")
+        second: int = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % cls.bit_count for i in range(cls.hash_count)]
+
+    @classmethod
+    def add(cls, value: bytes) -> None:
+        """
+        Adds a revoked token to the filter.
+        """
+        if cls.pending is not None:
+            cls.pending.append(value)
+        if cls.bit_count == 0:
+            return
+
+        for position in cls.get_positions(value):
+            cls.bits[position >> 3] |= 1 << (position & 7)
+        cls.count += 1
+
+    @classmethod
+    def might_contain(cls, value: bytes) -> bool:
+        """
+        Returns False if the token was surely not revoked.
+        """
+        if not cls.loaded:
+            return True
+
+        return all(cls.bits[position >> 3] & (1 << (position & 7)) for position in cls.get_positions(value))
+
+    @classmethod
+    async def load(cls, redis_db: "redis.asyncio.Redis[bytes]") -> None:
+        """
+        This method seeds the filter with the tokens blocklisted in Redis.
+        The expired tokens are dropped, and the filter is sized for twice the remaining ones.
+        The tokens announced while loading are added afterwards.
+        """
+        cls.pending = []
+        try:
+            values: list[bytes] = [value async for value in redis_db.scan_iter(match=REVOKED_KEYS_PATTERN, count=1000)]
+            values.extend(cls.pending)
+        finally:
+            cls.pending = None
+
+        cls.reset(max(cls.CAPACITY, 2 * len(values)))
+        for value in values:
+            cls.add(value)
+        cls.loaded = True
+
+
+class SessionGenerations:
+    """
+    Per-worker LRU cache of the session generations : account id -> generation.
+    Changes are announced on the revocation channel. The cache is only used while the channel
+    is listened to, and entries also expire after TTL seconds.
+    Any change MUST go through `revoke_sessions`.
+    """
+
+    MAX_SIZE : int   = 10000
+    TTL      : float = 300.0
+
+    entries   : OrderedDict[int, tuple[int, float]] = OrderedDict()
+    epoch     : int = 0
+    listening : bool = False
+
+    @classmethod
+    def configure(cls) -> None:
+        """
+        Reads the size and the TTL of the cache from the environment (SESSION_CACHE_SIZE, SESSION_CACHE_TTL).
+        """
+        load_dotenv(".env")
+        cls.MAX_SIZE = int(os.getenv(key="SESSION_CACHE_SIZE", default=str(cls.MAX_SIZE)))
+        cls.TTL      = float(os.getenv(key="SESSION_CACHE_TTL", default=str(cls.TTL)))
+
+    @classmethod
+    async def get(cls, account_id: int) -> int:
+        """
+        Returns the current session generation of the account.
+        """
+        entry: tuple[int, float] | None = cls.entries.get(account_id)
+        if cls.listening and entry is not None and entry[1] > time.monotonic():
+            cls.entries.move_to_end(account_id)
+            return entry[0]
+
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        epoch: int = cls.epoch
+        value: bytes | None = await redis_db.get(SESSIONS_KEY.format(account_id=account_id))
+        generation: int = 0 if value is None else int(value)
+        # The generation is not cached if it changed while reading it.
+        if cls.epoch == epoch:
+            cls.entries[account_id] = (generation, time.monotonic() + cls.TTL)
+            cls.entries.move_to_end(account_id)
+            while len(cls.entries) > cls.MAX_SIZE:
+                cls.entries.popitem(last=False)
+        return generation
+
+    @classmethod
+    def evict(cls, account_id: int | None = None) -> None:
+        """
+        Forgets the generation of the account (of every account if None), in this worker.
+        """
+        cls.epoch += 1
+        if account_id is None:
+            cls.entries.clear()
+        else:
+            cls.entries.pop(account_id, None)
+
+
+async def revoke_sessions(account_id: int) -> None:
+    """
+    This method revokes every token issued for the account, in all the workers.
+    """
+    redis_db = Redis.get_async_redis()
+    if redis_db is None:
+        raise RequiredFieldIsNone("Redis instance is None !")
+
+    sessions_key: str = SESSIONS_KEY.format(account_id=account_id)
+    async with redis_db.pipeline(transaction=False) as pipeline:
+        await pipeline.incr(sessions_key)
+        await pipeline.publish(REVOCATION_CHANNEL, sessions_key)
+        await pipeline.execute()
+    SessionGenerations.evict(account_id)
+
+
+async def listen_for_revocations() -> None:
+    """
+    This method keeps the revocation filter and the session generations of the worker up to date,
+    until it is cancelled. It is meant to run as a background task.
+    """
+    while True:
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        pubsub = redis_db.pubsub(ignore_subscribe_messages=True)
+        try:
+            # Subscribing first, so that no revocation is missed while loading.
+            await pubsub.subscribe(REVOCATION_CHANNEL)
+            await RevocationFilter.load(redis_db)
+            SessionGenerations.evict()
+            SessionGenerations.listening = True
+            async for message in pubsub.listen():
+                if message["data"].startswith(b"sessions:"):
+                    SessionGenerations.evict(int(message["data"].removeprefix(b"sessions:")))
+                    continue
+
+                RevocationFilter.add(message["data"])
+                # The filter is full of expired tokens : they are dropped by loading it again.
+                if RevocationFilter.count > RevocationFilter.capacity:
+                    await RevocationFilter.load(redis_db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Revocations may have been missed : every token is checked in Redis until the filter is loaded again.
+            print_error(f"Token revocations interrupted : {e}")
+            await asyncio.sleep(1.0)
+        finally:
+            RevocationFilter.loaded = False
+            SessionGenerations.listening = False
+            await pubsub.close()
+
+
+class DecodedTokenCache:
+    """
+    Per-worker LRU cache of the verified payloads : (token type, digest of the token) -> payload.
+    A token sent again is not verified nor parsed again, until it expires.
+    Only the decoding is cached : the revocation is still checked on every use.
+    """
+
+    MAX_SIZE : int = 10000
+
+    entries : OrderedDict[tuple[str, bytes], tuple[JWTData, float]] = OrderedDict()
+
+    @classmethod
+    def configure(cls) -> None:
+        """
+        Reads the size of the cache from the environment (TOKEN_CACHE_SIZE).
+        """
+        load_dotenv(".env")
+        cls.MAX_SIZE = int(os.getenv(key="TOKEN_CACHE_SIZE", default=str(cls.MAX_SIZE)))
+
+    @staticmethod
+    def get_key(token_type: TokenTypes, value: str) -> tuple[str, bytes]:
+        """
+        Returns the key of the token. Tokens of different types are signed with different secrets.
+        """
+        return token_type.value, hashlib.blake2b(value.encode(), digest_size=16).digest()
+
+    @classmethod
+    def get(cls, key: tuple[str, bytes]) -> JWTData | None:
+        """
+        Returns the payload of the token, or None if it is not cached or expired.
+        """
+        entry: tuple[JWTData, float] | None = cls.entries.get(key)
+        if entry is None:
+            return None
+
+        if entry[1] <= time.time():
+            del cls.entries[key]
+            return None
+        cls.entries.move_to_end(key)
+        return entry[0]
+
+    @classmethod
+    def put(cls, key: tuple[str, bytes], data: JWTData) -> None:
+        """
+        Caches the payload of a verified token, until it expires.
+        """
+        cls.entries[key] = (data, data.exp.timestamp())
+        cls.entries.move_to_end(key)
+        while len(cls.entries) > cls.MAX_SIZE:
+            cls.entries.popitem(last=False)
+
+
 # -------- Classic models -------- #
 class Token:
     """
@@ -109,7 +394,7 @@ class Token:
         self.attributes = attributes
         self.value      = value
 
-    def generate(self, account_id: int) -> None:
+    def generate(self, account_id: int, generation: int) -> None:
         """
         This method generates a single token.
         It uses the attributes specified to generate the correct token using the 
@@ -118,10 +403,11 @@ class Token:
         """
         # Generating data for the token
         creation_date: datetime = datetime.now(tz=timezone.utc)
-        expire_date: datetime   = datetime.now() + timedelta(minutes=float(self.attributes.expire_time))
+        expire_date: datetime   = creation_date + timedelta(minutes=float(self.attributes.expire_time))
 
         jwt_data: JWTData = JWTData(account_id=account_id,
-                                    salt=str(bcrypt.gensalt()),
+                                    jti=secrets.token_urlsafe(12),
+                                    generation=generation,
                                     iat=creation_date,
                                     exp=expire_date)
 
@@ -129,44 +415,77 @@ class Token:
                                 key=self.attributes.secret,
                                 algorithm=self.attributes.algorithm)
 
-    def revoke(self, redis_db: Optional["redis.Redis[bytes]"] = Redis.get_redis()) -> None:
+    async def revoke(self, redis_db: Optional["redis.asyncio.Redis[bytes]"] = None) -> None:
         """
         This method handles the necessary operations to revoke the token.
         """
         if self.value is None:
             return
 
+        redis_db = redis_db or Redis.get_async_redis()
         if redis_db is None:
             raise RequiredFieldIsNone("Redis instance is None !")
 
         # Extracting payload
-        data: JWTData = self.extract_payload()
-        # Adding the token to redis blocklist with an expiration equal to
-        # the expiration date - creation date.
-        ttl: timedelta = data.exp - data.iat
-        redis_db.setex(self.value, ttl, self.attributes.token_type.value)
+        data: JWTData = await self.extract_payload(redis_db)
+        await self.add_revocation(redis_db, data)
+
+    async def add_revocation(self, redis_db: "redis.asyncio.Redis[bytes] | Pipeline[bytes]", data: JWTData) -> None:
+        """
+        This method adds the token to the redis blocklist, without checking it.
+        If a pipeline is given, the command is only queued : the pipeline MUST be executed afterwards.
+        """
+        if self.value is None:
+            return
+
+        # Adding the identifier of the token to redis blocklist, until the token expires.
+        revoked_key: str = data.get_revoked_key()
+        ttl: int = max(1, math.ceil(data.exp.timestamp() - time.time()))
+        await redis_db.setex(revoked_key, ttl, self.attributes.token_type.value)
+        # Every worker adds the token to its revocation filter, this one included.
+        await redis_db.publish(REVOCATION_CHANNEL, revoked_key)
+        RevocationFilter.add(revoked_key.encode())
         self.value = None
 
-    def extract_payload(self) -> JWTData:
+    async def extract_payload(self, redis_db: Optional["redis.asyncio.Redis[bytes]"] = None) -> JWTData:
         """
         This method extracts the payload from the current token.
         """
+        data: JWTData = self.decode_payload()
 
-        # We check if the token has been revoked
-        if self.is_revoked():
+        # We check if the token has been revoked, by itself or with all the sessions of the account
+        if await self.is_revoked(data, redis_db) or data.generation != await SessionGenerations.get(data.account_id):
             raise HTTPException(status_code=401, detail=CommonErrorMessages.TOKEN_REVOKED)
 
+        return data
+
+    def decode_payload(self) -> JWTData:
+        """
+        This method decodes the payload of the current token, without checking if it has been revoked.
+        The tokens already verified are taken from the cache.
+        """
+        if self.value is None:
+            raise RequiredFieldIsNone("Token value is None !")
+
+        cache_key: tuple[str, bytes] = DecodedTokenCache.get_key(self.attributes.token_type, self.value)
+        cached: JWTData | None = DecodedTokenCache.get(cache_key)
+        if cached is not None:
+            return cached
+
         # We try to extract the payload from the token
         try:
             # We use a different key whether it is a Refresh or an Auth token.
             # Both are supplied in the ENV variables
             if self.value is not None:
+                # Tokens issued before the identifiers were introduced are rejected.
                 data: Any = decode(jwt=self.value,
-                                       key=str(self.attributes.secret),
-                                       algorithms=[self.attributes.algorithm])
+                                       key=self.attributes.secret,
+                                       algorithms=[self.attributes.algorithm],
+                                       options={"require": ["jti", "gen", "iat", "exp"]})
 
                 data = JWTData(account_id=data["account_id"],
-                               salt=data["salt"],
+                               jti=data["jti"],
+                               generation=data["gen"],
                                iat=datetime.fromtimestamp(data["iat"]),
                                exp=datetime.fromtimestamp(data["exp"]))
             else:
@@ -181,17 +500,30 @@ class Token:
             raise HTTPException(status_code=401, detail=CommonErrorMessages.TOKEN_INVALID) from e
 
         # We return the payload
+        DecodedTokenCache.put(cache_key, data)
         return data
 
-    def is_revoked(self, redis_db: Optional["redis.Redis[bytes]"] = Redis.get_redis()) -> bool:
+    async def is_revoked(self,
+                         data: JWTData | None = None,
+                         redis_db: Optional["redis.asyncio.Redis[bytes]"] = None) -> bool:
         """
         This method checks if the token has been blacklisted inside Redis DB.
+        The payload is decoded if it is not provided.
         """
         # We check if the token is revoked (in the redis DB)
         # If the result is None, the token was not revoked
+        if self.value is None:
+            return False
+
+        revoked_key: str = (data or self.decode_payload()).get_revoked_key()
+        # Most tokens were not revoked : those are answered without Redis.
+        if not RevocationFilter.might_contain(revoked_key.encode()):
+            return False
+
+        redis_db = redis_db or Redis.get_async_redis()
         if redis_db is None:
             raise RequiredFieldIsNone("Redis instance is None !")
-        return not (self.value is None or redis_db.get(self.value) is None)
+        return await redis_db.get(revoked_key) is not None
 
 
 class TokenPair:
@@ -219,37 +551,62 @@ class TokenPair:
             "token_type":    "bearer"
         }
 
-    def generate_tokens(self, account_id: int) -> None:
+    async def generate_tokens(self, account_id: int, generation: int | None = None) -> None:
         """
-        This method generates a pair of tokens.
-        It stores them inside the current object instance.
+        This method generates a pair of tokens, for the current session generation of the account
+        if none is given. It stores them inside the current object instance.
         """
-        self.access_token.generate(account_id)
-        self.refresh_token.generate(account_id)
+        if generation is None:
+            generation = await SessionGenerations.get(account_id)
+
+        self.access_token.generate(account_id, generation)
+        self.refresh_token.generate(account_id, generation)
 
-    def revoke_tokens(self) -> None:
+    async def revoke_tokens(self) -> None:
         """
         This method revokes the access token and refresh token inside the current object.
+        Both tokens are checked in one round-trip to Redis, and revoked in another one.
         """
-        self.access_token.revoke()
-        self.refresh_token.revoke()
+        tokens: list[Token] = [token for token in (self.access_token, self.refresh_token) if token.value is not None]
+        if not tokens:
+            return
 
-    def refresh_tokens(self) -> None:
+        redis_db = Redis.get_async_redis()
+        if redis_db is None:
+            raise RequiredFieldIsNone("Redis instance is None !")
+
+        payloads: list[JWTData] = [token.decode_payload() for token in tokens]
+
+        # We check if one of the tokens has been revoked
+        suspects: list[str] = [data.get_revoked_key() for data in payloads
+                               if RevocationFilter.might_contain(data.get_revoked_key().encode())]
+        if suspects and any(value is not None for value in await redis_db.mget(suspects)):
+            raise HTTPException(status_code=401, detail=CommonErrorMessages.TOKEN_REVOKED)
+
+        async with redis_db.pipeline(transaction=False) as pipeline:
+            for token, data in zip(tokens, payloads):
+                await token.add_revocation(pipeline, data)
+            await pipeline.execute()
+
+    async def refresh_tokens(self) -> None:
         """
         This method uses the refresh token to create a new access token and refresh token.
         It stores the tokens inside the current object instance.
         """
-        # Trying to decode the token given
-        token_payload: JWTData = self.refresh_token.extract_payload()
+        # Trying to decode the token given. Its revocation is checked along the access token's.
+        token_payload: JWTData = self.refresh_token.decode_payload()
         account_id: int = token_payload.account_id
+        generation: int = await SessionGenerations.get(account_id)
+        if token_payload.generation != generation:
+            raise HTTPException(status_code=401, detail=CommonErrorMessages.TOKEN_REVOKED)
 
         # We need to add the refresh_token and the acces_token to the blocklist since it does not
         # (and may not) have expired yet.
-        self.revoke_tokens()
+        await self.revoke_tokens()
 
         # If we managed to get here, account and token are valid inputs. we can generate both tokens.
         # Generating new tokens
-        self.generate_tokens(account_id=account_id)
+        await self.generate_tokens(account_id=account_id, generation=generation)
 
 # This allows us to regroup the Token models into one type.
 AvailableTokenModels: TypeAlias = Token | TokenPair
@@ -3,31 +3,31 @@ UE-related operations service.
 Provides the methods to use when interacting with an UE.
 """
 from fastapi import HTTPException
+from tortoise.transactions import in_transaction
 
 from app.models.pydantic.AffectationModel import PydanticAffectation
 from app.models.pydantic.CourseModel import PydanticCourseModel
 from app.models.pydantic.CourseTypeModel import PydanticCourseTypeModel
 from app.models.pydantic.UEModel import PydanticCreateUEModel, PydanticUEModel, PydanticModifyUEModel
-from app.models.tortoise.account import AccountInDB
 from app.models.tortoise.course import CourseInDB
 from app.models.tortoise.course_type import CourseTypeInDB
 from app.models.tortoise.node import NodeInDB
 from app.models.tortoise.ue import UEInDB
-from app.services import AffectationService
-from app.services.PermissionService import check_permissions
+from app.services import AffectationService, NodeHoursService
+from app.services.ArborescenceService import ArborescenceCache
+from app.services.PermissionService import AuthContext
 from app.utils.enums.http_errors import CommonErrorMessages
 from app.utils.enums.permission_enums import AvailableServices, AvailableOperations
 
-async def get_ue_by_id(ue_id: int, current_account: AccountInDB) -> PydanticUEModel:
+async def get_ue_by_id(ue_id: int, context: AuthContext) -> PydanticUEModel:
     """
     This method returns the UE of the given UE id.
     """
 
     # todo :ACADEMIC_YEAR A RAJOUTE A L AVENIR
 
-    await check_permissions(AvailableServices.UE_SERVICE,
-                            AvailableOperations.GET,
-                            current_account)
+    await context.check(AvailableServices.UE_SERVICE,
+                        AvailableOperations.GET)
 
     ue: UEInDB | None = await UEInDB.get_or_none(id=ue_id).prefetch_related("courses__course_type")
 
@@ -56,14 +56,13 @@ async def get_ue_by_id(ue_id: int, current_account: AccountInDB) -> PydanticUEMo
                            ue_id=ue.id)
 
 
-async def add_ue(body: PydanticCreateUEModel, current_account: AccountInDB) -> None:
+async def add_ue(body: PydanticCreateUEModel, context: AuthContext) -> None:
     """
     This method creates a new UE.
     """
 
-    await check_permissions(AvailableServices.UE_SERVICE,
-                            AvailableOperations.CREATE,
-                            current_account)
+    await context.check(AvailableServices.UE_SERVICE,
+                        AvailableOperations.CREATE)
     
     parent_node: NodeInDB | None = await NodeInDB.get_or_none(id=body.parent_id)
     if parent_node is None:
@@ -78,34 +77,35 @@ async def add_ue(body: PydanticCreateUEModel, current_account: AccountInDB) -> N
     ue_to_create: UEInDB = UEInDB(name=body.name,
                                   academic_year=body.academic_year)
 
-    await UEInDB.save(ue_to_create)
-
-    created_courses : list[CourseInDB] = []
-    if body.courses:
-        for course_data in body.courses:
-            course = await CourseInDB.create(
-                academic_year=course_data.academic_year,
-                duration=course_data.duration,
-                group_count=course_data.group_count,
-                course_type_id=course_data.course_type_id,
-            )
-            created_courses.append(course)
-
-    await ue_to_create.courses.add(*created_courses)
-    await ue_to_create.parent.add(parent_node)
-    await ue_to_create.save()
-
-async def get_ue_by_affected_profile(academic_year: int, profile_id: int, current_account: AccountInDB) -> list[PydanticUEModel]:
+    async with in_transaction():
+        await UEInDB.save(ue_to_create)
+
+        created_courses : list[CourseInDB] = []
+        if body.courses:
+            for course_data in body.courses:
+                course = await CourseInDB.create(
+                    academic_year=course_data.academic_year,
+                    duration=course_data.duration,
+                    group_count=course_data.group_count,
+                    course_type_id=course_data.course_type_id,
+                )
+                created_courses.append(course)
+
+        await ue_to_create.courses.add(*created_courses)
+        await ue_to_create.parent.add(parent_node)
+        await ue_to_create.save()
+        await NodeHoursService.update_coverage(ue_to_create.id, set())
+    await ArborescenceCache.bump_version(ue_to_create.academic_year)
+
+async def get_ue_by_affected_profile(academic_year: int, profile_id: int, context: AuthContext) -> list[PydanticUEModel]:
     """
     This method returns the UE's in which the profile is affected.
     """
 
-    await check_permissions(AvailableServices.UE_SERVICE,
-                            AvailableOperations.GET,
-                            current_account,
-                            academic_year)
+    await context.check(AvailableServices.UE_SERVICE,
+                        AvailableOperations.GET)
 
-    affectations: list[PydanticAffectation] = await AffectationService.get_teacher_affectations(profile_id, current_account)
+    affectations: list[PydanticAffectation] = await AffectationService.get_teacher_affectations(profile_id, context)
     
     # We get all courses affected to the teacher.
     courses: list[PydanticCourseModel] = []
@@ -133,14 +133,13 @@ async def get_ue_by_affected_profile(academic_year: int, profile_id: int, curren
     return [ue for ue in ues.values()]
 
 
-async def modify_ue(ue_id: int, body: PydanticModifyUEModel, current_account: AccountInDB) -> None:
+async def modify_ue(ue_id: int, body: PydanticModifyUEModel, context: AuthContext) -> None:
     """
     This method modifies the UE of the given UE id.
     """
 
-    await check_permissions(AvailableServices.UE_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account)
+    await context.check(AvailableServices.UE_SERVICE,
+                        AvailableOperations.UPDATE)
 
     ue_to_modify: UEInDB | None = await UEInDB.get_or_none(id=ue_id)
 
@@ -157,33 +156,39 @@ async def modify_ue(ue_id: int, body: PydanticModifyUEModel, current_account: Ac
     except ValueError as e:
         raise HTTPException(status_code=409, detail=str(e)) from e
 
+    # The name of the UE is displayed inside the arborescence.
+    await ArborescenceCache.bump_version(ue_to_modify.academic_year)
     return None
 
 
-async def delete_ue(ue_id: int, current_account: AccountInDB) -> None:
+async def delete_ue(ue_id: int, context: AuthContext) -> None:
     """
     This method deletes the UE of the given UE id.
     """
 
-    await check_permissions(AvailableServices.UE_SERVICE,
-                            AvailableOperations.DELETE,
-                            current_account)
+    await context.check(AvailableServices.UE_SERVICE,
+                        AvailableOperations.DELETE)
 
     ue: UEInDB | None = await UEInDB.get_or_none(id=ue_id)
 
     if ue is None:
         raise HTTPException(status_code=404, detail=CommonErrorMessages.UE_NOT_FOUND.value)
 
-    await ue.delete()
+    # The totals of the UE can't be read anymore once it is deleted.
+    covering_nodes: set[int] = await NodeHoursService.get_covering_nodes(ue.id)
+    totals: NodeHoursService.Totals = (await NodeHoursService.get_ue_totals([ue.id]))[ue.id]
+
+    async with in_transaction():
+        await ue.delete()
+        await NodeHoursService.update_coverage(ue.id, covering_nodes, totals)
+    await ArborescenceCache.bump_version(ue.academic_year)
 
-async def attach_ue_to_node(ue_id: int, node_id: int, academic_year: int, current_account: AccountInDB) -> None:
+async def attach_ue_to_node(ue_id: int, node_id: int, academic_year: int, context: AuthContext) -> None:
     """
     This method marks the node provided as the parent for the UE.
     """
-    await check_permissions(AvailableServices.UE_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account,
-                            academic_year)
+    await context.check(AvailableServices.UE_SERVICE,
+                        AvailableOperations.UPDATE)
     
     ue: UEInDB | None = await UEInDB.get_or_none(id=ue_id)
     if ue is None:
@@ -196,18 +201,20 @@ async def attach_ue_to_node(ue_id: int, node_id: int, academic_year: int, curren
     if await NodeInDB.filter(parent_id=node_id).exists():
         raise HTTPException(status_code=409, detail=CommonErrorMessages.FOLDER_AND_UE_NOT_ENABLED.value)
     
-    await ue.parent.add(node)
-    await ue.save()
+    covering_nodes: set[int] = await NodeHoursService.get_covering_nodes(ue.id)
+    async with in_transaction():
+        await ue.parent.add(node)
+        await ue.save()
+        await NodeHoursService.update_coverage(ue.id, covering_nodes)
+    await ArborescenceCache.bump_version(ue.academic_year)
 
 
-async def detach_ue_from_node(ue_id: int, node_id: int, academic_year: int, current_account: AccountInDB) -> None:
+async def detach_ue_from_node(ue_id: int, node_id: int, academic_year: int, context: AuthContext) -> None:
     """
     This method removes the parent node from the UE.
     """
-    await check_permissions(AvailableServices.UE_SERVICE,
-                            AvailableOperations.UPDATE,
-                            current_account,
-                            academic_year)
+    await context.check(AvailableServices.UE_SERVICE,
+                        AvailableOperations.UPDATE)
     
     ue: UEInDB | None = await UEInDB.get_or_none(id=ue_id)
     if ue is None:
@@ -217,5 +224,9 @@ async def detach_ue_from_node(ue_id: int, node_id: int, academic_year: int, curr
     if node is None:
         raise HTTPException(status_code=404, detail=CommonErrorMessages.NODE_NOT_FOUND.value)
     
-    await ue.parent.remove(node)
-    await ue.save()
+    covering_nodes: set[int] = await NodeHoursService.get_covering_nodes(ue.id)
+    async with in_transaction():
+        await ue.parent.remove(node)
+        await ue.save()
+        await NodeHoursService.update_coverage(ue.id, covering_nodes)
+    await ArborescenceCache.bump_version(ue.academic_year)
@@ -0,0 +1,336 @@
+"""
+Workload services.
+Computes the weighted service hours of the profiles of an academic year,
+from their affectations, the coefficients of their status and their quota.
+The results are materialized in the ProfileWorkload table : affectation writes
+apply their delta to it, and a periodic full refresh reconciles any drift.
+"""
+import asyncio
+import os
+from array import array
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from tortoise.expressions import F
+from tortoise.functions import Sum
+from tortoise.transactions import in_transaction
+
+from app.models.pydantic.WorkloadModel import PydanticProfileWorkload
+from app.models.tortoise.affectation import AffectationInDB
+from app.models.tortoise.coefficient import CoefficientInDB
+from app.models.tortoise.course import CourseInDB
+from app.models.tortoise.profile import ProfileInDB
+from app.models.tortoise.profile_workload import ProfileWorkloadInDB
+from app.services.PermissionService import AuthContext
+from app.utils.databases.redis_helper import Redis
+from app.utils.enums.http_errors import CommonErrorMessages
+from app.utils.enums.permission_enums import AvailableOperations, AvailableServices
+from app.utils.printers import print_error, print_info
+
+# Multiplier used when no coefficient is defined for a course type and a status.
+DEFAULT_MULTIPLIER: float = 1.0
+
+# Seconds between two full refreshes of the materialized workloads, unless WORKLOAD_REFRESH_INTERVAL is set.
+DEFAULT_REFRESH_INTERVAL: int = 900
+# Only one worker refreshes the workloads per interval.
+REFRESH_LOCK_KEY: str = "workload:refresh"
+# Weighted hours closer than this are considered equal by the refresh.
+WEIGHTED_HOURS_TOLERANCE: float = 1e-6
+
+
+class WorkloadTable:
+    """
+    Column-oriented data needed to compute the workloads of an academic year.
+    Profiles, statuses and course types are mapped to dense indexes so that
+    the coefficients and the totals are stored in flat arrays.
+    """
+    academic_year  : int
+    profiles       : list[tuple[int, str, str, int]]  # profile index -> (id, firstname, lastname, status id)
+    quotas         : array                            # profile index -> quota
+    status_indexes : array                            # profile index -> status index
+    type_indexes   : dict[int, int]                   # course type id -> course type index
+    multipliers    : array                            # status index * type count + type index -> multiplier
+    hours_profiles : array                            # hours row -> profile index
+    hours_types    : array                            # hours row -> course type index
+    hours          : array                            # hours row -> affectation hours
+
+    def __init__(self, academic_year: int,
+                 profile_rows: list[tuple[int, str, str, int | None, int, int | None]],
+                 coefficient_rows: list[tuple[int, int, float]],
+                 hours_rows: list[tuple[int, int, int | None]]):
+        self.academic_year = academic_year
+
+        profile_indexes: dict[int, int] = {}
+        status_indexes : dict[int, int] = {}
+        self.profiles       = []
+        self.quotas         = array("d")
+        self.status_indexes = array("l")
+        for profile_id, firstname, lastname, quota, status_id, status_quota in sorted(profile_rows, key=lambda row: row[0]):
+            profile_indexes[profile_id] = len(self.profiles)
+            self.profiles.append((profile_id, firstname, lastname, status_id))
+            # A profile without a quota of its own (0, the default) takes the one of its status.
+            self.quotas.append(quota or status_quota or 0)
+            self.status_indexes.append(status_indexes.setdefault(status_id, len(status_indexes)))
+
+        self.type_indexes = {}
+        for _, course_type_id, _ in coefficient_rows:
+            self.type_indexes.setdefault(course_type_id, len(self.type_indexes))
+        for _, course_type_id, _ in hours_rows:
+            self.type_indexes.setdefault(course_type_id, len(self.type_indexes))
+
+        type_count: int = len(self.type_indexes)
+        self.multipliers = array("d", [DEFAULT_MULTIPLIER]) * (len(status_indexes) * type_count)
+        for status_id, course_type_id, multiplier in coefficient_rows:
+            if status_id in status_indexes:
+                self.multipliers[status_indexes[status_id] * type_count + self.type_indexes[course_type_id]] = multiplier
+
+        # Hours of profiles outside of the academic year are ignored.
+        rows: list[tuple[int, int, int | None]] = [row for row in hours_rows if row[0] in profile_indexes]
+        self.hours_profiles = array("l", [profile_indexes[profile_id] for profile_id, _, _ in rows])
+        self.hours_types    = array("l", [self.type_indexes[course_type_id] for _, course_type_id, _ in rows])
+        self.hours          = array("d", [hours or 0 for _, _, hours in rows])
+
+    def get_multiplier(self, profile_index: int, course_type_id: int) -> float:
+        """
+        This method returns the coefficient applied to the hours of a course type for a profile.
+        """
+        type_index: int | None = self.type_indexes.get(course_type_id)
+        if type_index is None:
+            return DEFAULT_MULTIPLIER
+        return self.multipliers[self.status_indexes[profile_index] * len(self.type_indexes) + type_index]
+
+    def compute(self) -> list[PydanticProfileWorkload]:
+        """
+        This method computes the workload of every profile in a single pass over the hours.
+        """
+        profile_count: int = len(self.profiles)
+        type_count   : int = len(self.type_indexes)
+        assigned: array = array("d", [0.0]) * profile_count
+        weighted: array = array("d", [0.0]) * profile_count
+
+        multipliers    = self.multipliers
+        status_indexes = self.status_indexes
+        for profile_index, type_index, hours in zip(self.hours_profiles, self.hours_types, self.hours):
+            assigned[profile_index] += hours
+            weighted[profile_index] += hours * multipliers[status_indexes[profile_index] * type_count + type_index]
+
+        return [PydanticProfileWorkload(academic_year=self.academic_year,
+                                        profile_id=profile_id,
+                                        firstname=firstname,
+                                        lastname=lastname,
+                                        status_id=status_id,
+                                        quota=int(quota),
+                                        assigned_hours=int(assigned_hours),
+                                        weighted_hours=weighted_hours,
+                                        remaining_quota=max(quota - weighted_hours, 0.0),
+                                        balance=weighted_hours - quota)
+                for (profile_id, firstname, lastname, status_id), quota, assigned_hours, weighted_hours
+                in zip(self.profiles, self.quotas, assigned, weighted)]
+
+
+async def load_workload_table(academic_year: int, profile_ids: list[int] | None = None) -> WorkloadTable:
+    """
+    This method loads the data needed to compute the workloads of an academic year in three queries.
+    Affectation hours are summed by profile and course type inside the database.
+    If profile ids are given, only these profiles are loaded.
+    """
+    profiles = ProfileInDB.filter(academic_year=academic_year)
+    affectations = AffectationInDB.filter(profile__academic_year=academic_year)
+    if profile_ids is not None:
+        profiles = profiles.filter(id__in=profile_ids)
+        affectations = affectations.filter(profile_id__in=profile_ids)
+
+    profile_rows: list[tuple[int, str, str, int | None, int, int | None]] = await profiles.values_list("id", "firstname", "lastname",
+                                                                                                     "quota", "status_id",
+                                                                                                     "status__quota")
+    coefficient_rows: list[tuple[int, int, float]] = await CoefficientInDB.filter(academic_year=academic_year)\
+                                                                          .values_list("status_id", "course_type_id", "multiplier")
+    hours_rows: list[tuple[int, int, int | None]] = await affectations.annotate(total=Sum("hours"))\
+                                                                      .group_by("profile_id", "course__course_type_id")\
+                                                                      .values_list("profile_id", "course__course_type_id", "total")
+    return WorkloadTable(academic_year, profile_rows, coefficient_rows, hours_rows)
+
+
+def build_workload(row: ProfileWorkloadInDB) -> PydanticProfileWorkload:
+    """
+    This method builds the workload of a profile from its materialized row.
+    The row MUST be loaded with its profile and the status of the profile.
+    """
+    quota: int = row.profile.quota or row.profile.status.quota or 0
+    return PydanticProfileWorkload(academic_year=row.academic_year,
+                                   profile_id=row.profile.id,
+                                   firstname=row.profile.firstname,
+                                   lastname=row.profile.lastname,
+                                   status_id=row.profile.status.id,
+                                   quota=quota,
+                                   assigned_hours=row.assigned_hours,
+                                   weighted_hours=row.weighted_hours,
+                                   remaining_quota=max(quota - row.weighted_hours, 0.0),
+                                   balance=row.weighted_hours - quota)
+
+
+async def get_workloads(academic_year: int, context: AuthContext) -> list[PydanticProfileWorkload]:
+    """
+    This method returns the workload of every profile of the academic year.
+    """
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.GET)
+
+    rows: list[ProfileWorkloadInDB] = await ProfileWorkloadInDB.filter(academic_year=academic_year)\
+                                                               .select_related("profile__status")\
+                                                               .order_by("profile_id")
+    workloads: list[PydanticProfileWorkload] = [build_workload(row) for row in rows]
+
+    # The profiles that have not been materialized yet are computed, and stored for the next reads.
+    materialized: set[int] = {workload.profile_id for workload in workloads}
+    missing: list[int] = [profile_id for profile_id in await ProfileInDB.filter(academic_year=academic_year)
+                                                                         .values_list("id", flat=True)
+                          if profile_id not in materialized]
+    if missing:
+        computed: list[PydanticProfileWorkload] = (await load_workload_table(academic_year, missing)).compute()
+        await store_workloads(academic_year, computed)
+        workloads = sorted(workloads + computed, key=lambda workload: workload.profile_id)
+    return workloads
+
+
+async def get_profile_workload(profile_id: int, academic_year: int, context: AuthContext) -> PydanticProfileWorkload:
+    """
+    This method returns the workload of a single profile.
+    """
+    await context.check(AvailableServices.PROFILE_SERVICE,
+                        AvailableOperations.GET)
+
+    row: ProfileWorkloadInDB | None = await ProfileWorkloadInDB.get_or_none(profile_id=profile_id,
+                                                                            academic_year=academic_year)\
+                                                               .select_related("profile__status")
+    if row is not None:
+        return build_workload(row)
+
+    # The profile has not been materialized yet.
+    workloads: list[PydanticProfileWorkload] = (await load_workload_table(academic_year, [profile_id])).compute()
+    if len(workloads) == 0:
+        raise HTTPException(status_code=404, detail=CommonErrorMessages.PROFILE_NOT_FOUND)
+    await store_workloads(academic_year, workloads)
+    return workloads[0]
+
+
+async def add_affectation_hours(profile_id: int, course_id: int, hours: int) -> None:
+    """
+    This method applies the hours of an affectation (negative when removed) to the workload of its profile.
+    It MUST be called inside the transaction writing the affectation.
+    CAREFUL : It is not checking the permissions.
+    """
+    if hours == 0:
+        return
+
+    profile: tuple[int, int] | None = await ProfileInDB.filter(id=profile_id).first().values_list("status_id", "academic_year")
+    course_type_id: int | None = await CourseInDB.filter(id=course_id).first().values_list("course_type_id", flat=True)
+    if profile is None or course_type_id is None:
+        return
+    status_id, academic_year = profile
+
+    multiplier: float | None = await CoefficientInDB.filter(status_id=status_id,
+                                                            course_type_id=course_type_id,
+                                                            academic_year=academic_year)\
+                                                    .first()\
+                                                    .values_list("multiplier", flat=True)
+    if multiplier is None:
+        multiplier = DEFAULT_MULTIPLIER
+
+    updated: int = await ProfileWorkloadInDB.filter(profile_id=profile_id)\
+                                            .update(assigned_hours=F("assigned_hours") + hours,
+                                                    weighted_hours=F("weighted_hours") + hours * multiplier)
+    if updated == 0:
+        await refresh_profiles([profile_id], academic_year)
+
+
+async def refresh_profiles(profile_ids: list[int], academic_year: int) -> None:
+    """
+    This method computes the workloads of the given profiles again.
+    Used when the status of a profile changes, or when a profile is created.
+    CAREFUL : It is not checking the permissions.
+    """
+    await recompute_workloads(academic_year, profile_ids)
+
+
+async def recompute_workloads(academic_year: int, profile_ids: list[int] | None = None) -> int:
+    """
+    This method computes the workloads of the academic year again (only of the given profiles, if any) and stores them.
+    Their rows are locked before reading the affectations : a delta applied meanwhile waits for the new totals
+    and is added on top of them, instead of being overwritten.
+    Returns the number of rows written.
+    """
+    async with in_transaction():
+        rows = ProfileWorkloadInDB.filter(academic_year=academic_year)
+        if profile_ids is not None:
+            rows = rows.filter(profile_id__in=profile_ids)
+        # Always in the order of the profiles, so that the writes locking several of them can't deadlock.
+        await rows.order_by("profile_id").select_for_update()
+        return await store_workloads(academic_year, (await load_workload_table(academic_year, profile_ids)).compute())
+
+
+async def store_workloads(academic_year: int, workloads: list[PydanticProfileWorkload]) -> int:
+    """
+    This method writes the given workloads into the materialized table, if they changed.
+    Two reads may materialize the same profile at once : the row created by the other one is overwritten
+    with the same totals, instead of breaking the unicity of the profile.
+    Returns the number of rows written.
+    """
+    async with in_transaction():
+        rows: dict[int, ProfileWorkloadInDB] = {row.profile_id: row  # type: ignore
+                                                for row in await ProfileWorkloadInDB.filter(profile_id__in=[workload.profile_id
+                                                                                                            for workload in workloads])}
+        to_update: list[ProfileWorkloadInDB] = []
+        to_create: list[ProfileWorkloadInDB] = []
+        for workload in workloads:
+            row: ProfileWorkloadInDB | None = rows.get(workload.profile_id)
+            if row is None:
+                to_create.append(ProfileWorkloadInDB(profile_id=workload.profile_id,
+                                                     academic_year=academic_year,
+                                                     assigned_hours=workload.assigned_hours,
+                                                     weighted_hours=workload.weighted_hours))
+            elif row.assigned_hours != workload.assigned_hours \
+                 or abs(row.weighted_hours - workload.weighted_hours) > WEIGHTED_HOURS_TOLERANCE:
+                row.assigned_hours = workload.assigned_hours
+                row.weighted_hours = workload.weighted_hours
+                to_update.append(row)
+
+        if to_create:
+            await ProfileWorkloadInDB.bulk_create(to_create, batch_size=1000,
+                                                  on_conflict=["profile_id"],
+                                                  update_fields=["assigned_hours", "weighted_hours"])
+        if to_update:
+            await ProfileWorkloadInDB.bulk_update(to_update, fields=["assigned_hours", "weighted_hours"], batch_size=1000)
+        return len(to_create) + len(to_update)
+
+
+async def refresh_workloads() -> int:
+    """
+    This method computes every workload again and fixes the materialized rows that drifted.
+    Returns the number of rows written.
+    """
+    written: int = 0
+    academic_years: list[int] = await ProfileInDB.all().distinct().values_list("academic_year", flat=True)
+    for academic_year in academic_years:
+        written += await recompute_workloads(academic_year)
+    return written
+
+
+async def refresh_workloads_periodically() -> None:
+    """
+    This method refreshes the materialized workloads every WORKLOAD_REFRESH_INTERVAL seconds, starting now.
+    It is meant to run as a background task. Workers share a Redis lock so that only one of them refreshes.
+    """
+    load_dotenv(".env")
+    refresh_interval: int = int(os.getenv(key="WORKLOAD_REFRESH_INTERVAL", default=str(DEFAULT_REFRESH_INTERVAL)))
+    while True:
+        try:
+            redis_db = Redis.get_async_redis()
+            if redis_db is not None and await redis_db.set(REFRESH_LOCK_KEY, 1, nx=True, ex=refresh_interval):
+                written: int = await refresh_workloads()
+                if written > 0:
+                    print_info(f"{written} profile workloads refreshed.")
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # The task must survive a failed refresh, the next one will catch up.
+            print_error(f"Workload refresh failed : {e}")
+        await asyncio.sleep(refresh_interval)
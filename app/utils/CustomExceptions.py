@@ -31,6 +31,14 @@ class RequiredFieldIsNone(Exception):
 
 
 # HTTP Exceptions.
+class NotModifiedException(HTTPException):
+    """
+    This Exception is meant to be used when the resource requested has not changed since the
+    version the client already has. It has no body.
+    """
+    def __init__(self, headers: Dict[str, str] | None = None) -> None:
+        super().__init__(304, None, headers)
+
 class IncorrectLoginOrPasswordException(HTTPException):
     """
     This Exception is meant to be used when the login or the password provided are incorrect.
@@ -0,0 +1,76 @@
+"""
+This module provides the Tortoise engine used for PostgreSQL : the asyncpg one,
+with a connection pool that records how long the queries wait for a connection.
+"""
+import time
+from typing import Any
+
+import asyncpg
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
+
+from app.models.pydantic.StatsModel import PydanticDatabasePoolStats
+
+
+class MonitoredPool:
+    """
+    Wrapper of an asyncpg pool that records the acquisitions of connections.
+    Tortoise only acquires connections by awaiting `acquire`, the rest is delegated to the pool.
+    """
+    pool       : asyncpg.Pool
+    waiting    : int
+    acquired   : int
+    total_wait : float
+    max_wait   : float
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool       = pool
+        self.waiting    = 0
+        self.acquired   = 0
+        self.total_wait = 0.0
+        self.max_wait   = 0.0
+
+    async def acquire(self, *, timeout: float | None = None) -> Any:
+        """
+        Acquires a connection from the pool, and records how long it took.
+        """
+        started: float = time.perf_counter()
+        self.waiting += 1
+        try:
+            connection: Any = await self.pool.acquire(timeout=timeout)
+        finally:
+            self.waiting -= 1
+
+        wait: float = time.perf_counter() - started
+        self.acquired   += 1
+        self.total_wait += wait
+        self.max_wait    = max(self.max_wait, wait)
+        return connection
+
+    def get_stats(self) -> PydanticDatabasePoolStats:
+        """
+        Returns the usage of the pool since the worker started.
+        """
+        return PydanticDatabasePoolStats(min_size=self.pool.get_min_size(),
+                                         max_size=self.pool.get_max_size(),
+                                         size=self.pool.get_size(),
+                                         idle=self.pool.get_idle_size(),
+                                         waiting=self.waiting,
+                                         acquired=self.acquired,
+                                         average_wait_ms=1000 * self.total_wait / max(1, self.acquired),
+                                         max_wait_ms=1000 * self.max_wait)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
+
+
+class MonitoredAsyncpgClient(AsyncpgDBClient):
+    """
+    asyncpg client whose pool records the acquisitions of connections.
+    """
+
+    async def create_pool(self, **kwargs: Any) -> asyncpg.Pool:
+        return MonitoredPool(await super().create_pool(**kwargs))  # type: ignore
+
+
+# Tortoise loads the client of an engine from this name.
+client_class = MonitoredAsyncpgClient
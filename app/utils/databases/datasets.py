@@ -144,7 +144,7 @@ async def load_json_into_model_via_pydantic(
                 element.pop(f"{m2m_field}_m2m")
 
             if "hash" in element:  # Handle hashed fields if needed
-                element["hash"] = SecurityService.get_password_hash(element["hash"])
+                element["hash"] = await SecurityService.get_password_hash(element["hash"])
 
             # Create the model instance
             instance: Model = await model.create(**element)
@@ -4,15 +4,17 @@ This module provides utility methods to initialize the necessary databases.
 import os
 
 from dotenv import load_dotenv
-from fastapi import FastAPI
 
+from app.services import NodeHierarchyService, NodeHoursService
+from app.services.ArborescenceService import ArborescenceCache
+from app.services.PermissionService import PermissionMatrix
 from app.utils.databases.datasets import load_dummy_datasets, load_persistent_datasets
 from app.utils.databases.postgresql import Postgresql
 from app.utils.databases.redis_helper import Redis
 from app.utils.printers import print_info
 
 
-async def startup_databases(app: FastAPI) -> None:
+async def startup_databases() -> None:
     """
     This method initializes the needed databases.
     It also loads the dummy data if the current environnment is the development one.
@@ -22,7 +24,7 @@ async def startup_databases(app: FastAPI) -> None:
         Redis.load_redis()
 
     print_info("Loading Postgres client...")
-    await Postgresql.init_postgres_db(app)
+    await Postgresql.init_postgres_db()
 
     # Load dummy dataset if in development environment
     load_dotenv("./.env")
@@ -30,3 +32,12 @@ async def startup_databases(app: FastAPI) -> None:
         await load_dummy_datasets()
     else :
         await load_persistent_datasets()
+
+    # Every worker compiles the permissions it starts with, the running ones are not told about it.
+    await PermissionMatrix.load(await PermissionMatrix.get_version())
+    # The first worker repairs the index and the totals, the others wait for it and find them complete.
+    async with Postgresql.exclusive_transaction():
+        await NodeHierarchyService.ensure_closure()
+        rebuilt_years: set[int] = await NodeHoursService.ensure_node_hours()
+    for academic_year in rebuilt_years:
+        await ArborescenceCache.bump_version(academic_year)
@@ -0,0 +1,42 @@
+"""
+This module is a command that checks the hour totals of the nodes against the data.
+Usage, from the root of the project :
+    python -m app.utils.databases.node_hours [--rebuild]
+Without --rebuild, it only lists the nodes whose totals drifted.
+"""
+import asyncio
+import sys
+
+from tortoise import Tortoise
+
+from app.services import NodeHoursService
+from app.services.ArborescenceService import ArborescenceCache
+from app.utils.databases.postgresql import Postgresql
+from app.utils.printers import print_info, print_warning
+
+
+async def check_node_hours(rebuild: bool) -> int:
+    """
+    This method lists the drifted totals, and rebuilds them if asked to.
+    Returns the number of drifted totals.
+    """
+    await Postgresql.init_postgres_db(generate_schemas=False)
+    try:
+        drifted = await NodeHoursService.check_drift()
+        for node_id, stored, expected in drifted:
+            print_warning(f"Node {node_id} : stored {stored}, expected {expected}.")
+        print_info(f"{len(drifted)} node hour totals drifted.")
+
+        if rebuild and len(drifted) > 0:
+            async with Postgresql.exclusive_transaction():
+                rebuilt_years: set[int] = await NodeHoursService.rebuild_node_hours()
+            for academic_year in rebuilt_years:
+                await ArborescenceCache.bump_version(academic_year)
+        return len(drifted)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    DRIFTED: int = asyncio.run(check_node_hours("--rebuild" in sys.argv[1:]))
+    sys.exit(1 if DRIFTED > 0 and "--rebuild" not in sys.argv[1:] else 0)
@@ -1,14 +1,31 @@
 """
 This module loads the instance of the postgres database inside the Tortoise ORM.
 """
+import hashlib
 import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
 from dotenv import load_dotenv
-from fastapi import FastAPI
-from tortoise import Tortoise
-from tortoise.contrib.fastapi import register_tortoise # type: ignore
+from tortoise import Tortoise, connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+from tortoise.utils import get_schema_sql
 
+from app.models.pydantic.StatsModel import PydanticDatabasePoolStats
 from app.utils.CustomExceptions import MissingEnvironnmentException
+from app.utils.databases.asyncpg_client import MonitoredPool
+from app.utils.printers import print_info, print_warning
+
+# Key of the advisory lock taken by the worker checking the schema or the data. The other workers wait for it.
+SCHEMA_LOCK_KEY: int = 0x536F62656B  # "Sobek"
+# The fingerprint of the schema is stored outside of the models, so that it can be read before generating them.
+SCHEMA_METADATA_STATEMENT: str = '''CREATE TABLE IF NOT EXISTS "SchemaMetadata" (
+    "key" VARCHAR(64) PRIMARY KEY,
+    "value" TEXT NOT NULL,
+    "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+)'''
+SCHEMA_FINGERPRINT_KEY: str = "schema_fingerprint"
 
 class Postgresql:
     """
@@ -17,10 +34,12 @@ class Postgresql:
     """
 
     @staticmethod
-    def get_db_url() -> str:
+    def get_db_config() -> dict[str, Any]:
         """
-        This method builds the URL that needs to be used to interact with the database.
-        :return: The postgresql database URL.
+        This method builds the configuration that needs to be used to interact with the database.
+        The pool is sized per worker : the sum of the maximum sizes of the workers MUST stay below
+        the max_connections of the server.
+        :return: The Tortoise configuration.
         """
         load_dotenv(".env")
 
@@ -39,9 +58,37 @@ class Postgresql:
         if db is None :
             raise MissingEnvironnmentException("POSTGRES_DB")
 
-        dms = "postgres"
-
-        return f"{dms}://{user}:{password}@{host}:{port}/{db}"
+        credentials: dict[str, Any] = {
+            "host": host,
+            "port": int(port),
+            "user": user,
+            "password": password,
+            "database": db,
+            "minsize": int(os.getenv(key="POSTGRES_POOL_MIN_SIZE", default="1")),
+            "maxsize": int(os.getenv(key="POSTGRES_POOL_MAX_SIZE", default="5")),
+            "statement_cache_size": int(os.getenv(key="POSTGRES_STATEMENT_CACHE_SIZE", default="100")),
+            # Idle connections are closed after this many seconds, and any connection after this many queries.
+            "max_inactive_connection_lifetime": float(os.getenv(key="POSTGRES_CONNECTION_LIFETIME", default="300")),
+            "max_queries": int(os.getenv(key="POSTGRES_CONNECTION_MAX_QUERIES", default="50000")),
+        }
+        command_timeout: str | None = os.getenv(key="POSTGRES_COMMAND_TIMEOUT", default=None)
+        if command_timeout:
+            credentials["command_timeout"] = float(command_timeout)
+
+        return {
+            "connections": {
+                "default": {
+                    "engine": "app.utils.databases.asyncpg_client",
+                    "credentials": credentials,
+                }
+            },
+            "apps": {
+                "models": {
+                    "models": Postgresql.get_available_models(),
+                    "default_connection": "default",
+                }
+            },
+        }
 
 
     @staticmethod
@@ -50,35 +97,80 @@ class Postgresql:
         This method returns a list of available models.
         These are located inside the tortoise module.
         """
-        model_files = list(
+        model_files = sorted(
             filter(lambda x : x.endswith(".py")
                     and x != "__init__.py", os.listdir("./app/models/tortoise")))
         return ["app.models.tortoise." + x[:-3] for x in model_files]
 
     @staticmethod
-    async def init_postgres_db(app: FastAPI) -> None:
+    async def init_postgres_db(generate_schemas: bool = True) -> None:
         """
         This method initialises the postgres database connection.
         It also initialises the models if they are not already present.
+        The connections MUST be closed with `Tortoise.close_connections`.
         """
-        # Fetching basic data
-        url    = Postgresql.get_db_url()
-        models = Postgresql.get_available_models()        # Listing models available.
+        config: dict[str, Any] = Postgresql.get_db_config()
 
         # Initialize Tortoise ORM
-        await Tortoise.init( # type: ignore
-            db_url=url,
-            modules={'models': models}
-        )
+        await Tortoise.init(config=config)
+        credentials: dict[str, Any] = config["connections"]["default"]["credentials"]
+        print_info(f"Postgres pool : {credentials['minsize']} to {credentials['maxsize']} connections.")
 
         # Generate the schema
-        await Tortoise.generate_schemas()
-
-        # Register Tortoise ORM with FastAPI
-        register_tortoise(
-            app,
-            db_url=url,
-            modules={"models": models},
-            generate_schemas=True,
-            add_exception_handlers=True,
-        )
+        if generate_schemas:
+            await Postgresql.ensure_schema()
+
+    @staticmethod
+    async def ensure_schema() -> bool:
+        """
+        This method generates the schema, only if the models changed since it was last generated.
+        The models are fingerprinted by the statements creating them. Workers check it one at a time,
+        under an advisory lock : the first one generates the schema, the others find it up to date.
+        Returns True if the schema was generated.
+        """
+        schema: str = get_schema_sql(connections.get("default"), safe=True)
+        # The statements of the many-to-many tables do not always come in the same order.
+        statements: list[str] = sorted(statement.strip() for statement in schema.split(";") if statement.strip())
+        fingerprint: str = hashlib.sha256(";".join(statements).encode("utf-8")).hexdigest()
+
+        async with Postgresql.exclusive_transaction() as connection:
+            await connection.execute_script(SCHEMA_METADATA_STATEMENT)
+            rows: list[dict[str, Any]] = await connection.execute_query_dict(
+                'SELECT "value" FROM "SchemaMetadata" WHERE "key" = $1', [SCHEMA_FINGERPRINT_KEY])
+            if len(rows) > 0 and rows[0]["value"] == fingerprint:
+                return False
+
+            # The tables are only created if they do not exist : changed tables MUST be migrated by hand.
+            if len(rows) > 0:
+                print_warning("The models changed since the schema was generated : existing tables are not altered.")
+            await connection.execute_script(schema)
+            await connection.execute_query('''INSERT INTO "SchemaMetadata" ("key", "value") VALUES ($1, $2)
+                                              ON CONFLICT ("key") DO UPDATE SET "value" = EXCLUDED."value",
+                                                                                "updated_at" = CURRENT_TIMESTAMP''',
+                                           [SCHEMA_FINGERPRINT_KEY, fingerprint])
+
+        print_info(f"Schema generated, fingerprint {fingerprint[:12]}.")
+        return True
+
+    @staticmethod
+    @asynccontextmanager
+    async def exclusive_transaction() -> AsyncIterator[BaseDBAsyncClient]:
+        """
+        This method opens a transaction holding the advisory lock of the startup checks, released with it.
+        The queries of the block run inside of it, one worker at a time.
+        """
+        async with in_transaction() as connection:
+            await connection.execute_query("SELECT pg_advisory_xact_lock($1)", [SCHEMA_LOCK_KEY])
+            yield connection
+
+    @staticmethod
+    def get_pool_stats() -> PydanticDatabasePoolStats:
+        """
+        This method returns the usage of the connection pool of this worker.
+        """
+        # The pool is only created with the first connection.
+        pool: MonitoredPool | None = connections.get("default")._pool  # type: ignore  # pylint: disable=protected-access
+        if pool is None:
+            return PydanticDatabasePoolStats(min_size=0, max_size=0, size=0, idle=0, waiting=0,
+                                             acquired=0, average_wait_ms=0.0, max_wait_ms=0.0)
+        return pool.get_stats()
@@ -1,30 +1,40 @@
 """
-This module provides the Redis connection pool to use.
+This module provides the Redis connection pools to use.
 """
 import os
 from typing import Optional
 
 import redis
+import redis.asyncio
 from dotenv import load_dotenv
 
 
 class Redis:
     """
-    Helper class that provides the Redis connection pool.
+    Helper class that provides the Redis connection pools.
+    The asyncio client MUST be used in the request handlers, so that a slow Redis call does not block the event loop.
     """
 
-    redis_instance: Optional["redis.Redis[bytes]"] = None
+    redis_instance       : Optional["redis.Redis[bytes]"] = None
+    async_redis_instance : Optional["redis.asyncio.Redis[bytes]"] = None
+
+    @staticmethod
+    def get_connection_settings() -> dict[str, str | None]:
+        """
+        This method returns the credentials used to connect to Redis.
+        """
+        load_dotenv(".env")
+        return {"host": os.environ.get("REDIS_HOST"),
+                "port": os.environ.get("REDIS_PORT"),
+                "db": os.environ.get("REDIS_DB"),
+                "password": os.environ.get("REDIS_PASSWORD")}
 
     @classmethod
     def load_redis(cls) -> None:
         """
         This method loads the redis client by providing the correct credentials.
         """
-        load_dotenv(".env")
-        pool = redis.ConnectionPool(host=os.environ.get("REDIS_HOST"),
-                                    port=os.environ.get("REDIS_PORT"),
-                                    db=os.environ.get("REDIS_DB"),
-                                    password=os.environ.get("REDIS_PASSWORD"))
+        pool = redis.ConnectionPool(**cls.get_connection_settings())  # type: ignore
 
         cls.redis_instance = redis.Redis(connection_pool=pool)
 
@@ -37,3 +47,34 @@ class Redis:
             cls.load_redis()
 
         return cls.redis_instance
+
+    @classmethod
+    def load_async_redis(cls) -> None:
+        """
+        This method loads the asyncio redis client by providing the correct credentials.
+        Its connections are bound to the event loop of the worker.
+        When all the connections are in use, the requests wait for one instead of failing.
+        """
+        pool = redis.asyncio.BlockingConnectionPool(max_connections=int(os.environ.get("REDIS_MAX_CONNECTIONS", "50")),
+                                                    **cls.get_connection_settings())  # type: ignore
+
+        cls.async_redis_instance = redis.asyncio.Redis(connection_pool=pool)
+
+    @classmethod
+    def get_async_redis(cls) -> Optional["redis.asyncio.Redis[bytes]"]:
+        """
+        This method returns the asyncio redis connection pool instance.
+        """
+        if cls.async_redis_instance is None:
+            cls.load_async_redis()
+
+        return cls.async_redis_instance
+
+    @classmethod
+    async def close_async_redis(cls) -> None:
+        """
+        This method closes the connections of the asyncio redis client.
+        """
+        if cls.async_redis_instance is not None:
+            await cls.async_redis_instance.close(close_connection_pool=True)
+            cls.async_redis_instance = None
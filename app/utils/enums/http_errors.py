@@ -25,6 +25,7 @@ class CommonErrorMessages(enum.StrEnum):
     # Credentials Errors
     INVALID_CREDENTIALS       = "Invalid credentials."
     INCORRECT_LOGIN_PASSWORD  = "Incorrect login or password."
+    TOO_MANY_LOGIN_ATTEMPTS   = "Too many login attempts, please try again later."
     # Token Errors
     TOKEN_REVOKED             = "The token has been revoked."
     TOKEN_INVALID             = "The token is invalid."
@@ -36,6 +37,7 @@ class CommonErrorMessages(enum.StrEnum):
     PARENT_NODE_NOT_FOUND     = "Parent node was not found"
     ROOT_NODE_NOT_FOUND       = "Root node was not found"
     NODE_CANT_DELETE_CHILDREN = "You can't delete a node with children. Delete the children first."
+    NODE_CANT_BE_MOVED_UNDER_ITSELF = "You can't move a node under itself or one of its children."
     FOLDER_AND_UE_NOT_ENABLED = "You can't have a folder that contains a folder and an UE"
     # UE Errors
     UE_NOT_FOUND              = "UE was not found"
@@ -56,7 +58,12 @@ class CommonErrorMessages(enum.StrEnum):
     AFFECTATION_ACADEMIC_YEAR_MISMATCH   = "The two academic year provided are different. They cannot be linked by the same affectation."
     AFFECTATION_NOT_FOUND                = "Affectation was not found."
     AFFECTATION_GROUP_INVALID            = "Invalid group number. Must be positive and less than the group count of the course."
+    AFFECTATION_BATCH_INVALID            = "The batch contains invalid operations. None of them were applied."
+    AFFECTATION_BATCH_DUPLICATE          = "This affectation is already modified or deleted by another operation of the batch."
     # Status Errors 
     STATUS_NOT_FOUND          = "Status was not found"
     # Academic_year Errors
     ACADEMIC_YEAR_NOT_FOUND = "Academic year was not found"
+    ACADEMIC_YEAR_NOT_LAST  = "Only the most recent academic year can be deleted."
+    # Server Errors
+    SERVER_BUSY             = "The server is too busy, please try again later."
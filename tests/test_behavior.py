@@ -10,6 +10,47 @@ from utils.appTestCase import AppTestCase
 
 class TestBehavior(AppTestCase):
 
+    ACADEMIC_YEAR: int = 2024
+
+    def create_node(self, name: str, parent_id: int) -> int:
+        response: Response = self.call_api("POST", f"/node/?academic_year={self.ACADEMIC_YEAR}", use_auth=True,
+                                           body={"name": name, "parent_id": parent_id})
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def create_ue(self, name: str, parent_id: int, duration: int, group_count: int) -> dict[str, Any]:
+        course_type_id: int = self.call_api("GET", f"/course/1?academic_year={self.ACADEMIC_YEAR}",
+                                            use_auth=True).json()["course_type"]["id"]
+        course: dict[str, int] = {"academic_year": self.ACADEMIC_YEAR, "duration": duration,
+                                  "group_count": group_count, "course_type_id": course_type_id}
+        response: Response = self.call_api("POST", "/ue/", use_auth=True,
+                                           body={"academic_year": self.ACADEMIC_YEAR, "name": name,
+                                                 "parent_id": parent_id, "courses": [course]})
+        self.assertEqual(response.status_code, 201)
+
+        # The UE is only returned inside the arborescence of its parent, with its courses.
+        tree: dict[str, Any] = self.call_api("GET", f"/node/{parent_id}/arborescence?academic_year={self.ACADEMIC_YEAR}",
+                                             use_auth=True).json()
+        return next(child for child in tree["child_nodes"] if child["type"] == "ue" and child["name"] == name)
+
+    def get_node_hours(self, node_id: int) -> tuple[int, int]:
+        response: Response = self.call_api("GET", f"/node/{node_id}/arborescence?academic_year={self.ACADEMIC_YEAR}&depth=0",
+                                           use_auth=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["planned_hours"], response.json()["assigned_hours"]
+
+    def describe_tree(self, node: dict[str, Any]) -> tuple[Any, ...]:
+        # Everything but the ids and the assigned hours, which are not copied.
+        courses: list[tuple[int, int, str]] = sorted((course["duration"], course["group_count"], course["course_type"]["name"])
+                                                     for course in node.get("courses") or [])
+        children: list[tuple[Any, ...]] = sorted(self.describe_tree(child) for child in node["child_nodes"] or [])
+        return node["name"], node["type"], node["planned_hours"], courses, children
+
+    def get_root_id(self) -> int:
+        response: Response = self.call_api("GET", f"/node/root?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["id"]
+
     def test_get_account_unauthenticated(self):
         response: Response = self.call_api("GET", "/account", use_auth=False)
 
@@ -94,3 +135,178 @@ class TestBehavior(AppTestCase):
             "PATCH", "/profile/1", use_auth=True, body=data
         )
         self.assertEqual(response.status_code, 205)
+
+    def test_get_arborescence_not_modified(self):
+        route: str = f"/node/root/arborescence?academic_year={self.ACADEMIC_YEAR}"
+        response: Response = self.call_api("GET", route, use_auth=True)
+        self.assertEqual(response.status_code, 200)
+        etag: str = response.headers["ETag"]
+
+        response = self.call_api("GET", route, use_auth=True, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+
+        # Any write on the arborescence changes its ETag.
+        node_id: int = self.create_node("etag node", self.get_root_id())
+        response = self.call_api("GET", route, use_auth=True, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        self.call_api("DELETE", f"/node/{node_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+
+    def test_get_ancestors_after_move(self):
+        root_id: int = self.get_root_id()
+        first_id: int = self.create_node("first parent", root_id)
+        second_id: int = self.create_node("second parent", root_id)
+        child_id: int = self.create_node("moved child", first_id)
+        grandchild_id: int = self.create_node("moved grandchild", child_id)
+
+        response: Response = self.call_api("PATCH", f"/node/{child_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True,
+                                           body={"parent_id": second_id})
+        self.assertEqual(response.status_code, 205)
+
+        # The ancestors of the whole moved subtree follow it.
+        response = self.call_api("GET", f"/node/{grandchild_id}/ancestors?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+        body: list[dict[str, Any]] = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([node["id"] for node in body], [root_id, second_id, child_id, grandchild_id])
+
+        for node_id in (grandchild_id, child_id, first_id, second_id):
+            self.call_api("DELETE", f"/node/{node_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+
+    def test_get_subtree_after_move(self):
+        root_id: int = self.get_root_id()
+        first_id: int = self.create_node("first parent", root_id)
+        second_id: int = self.create_node("second parent", root_id)
+        child_id: int = self.create_node("moved child", first_id)
+        ue: dict[str, Any] = self.create_ue("moved UE", child_id, 10, 2)
+
+        response: Response = self.call_api("PATCH", f"/node/{child_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True,
+                                           body={"parent_id": second_id})
+        self.assertEqual(response.status_code, 205)
+
+        response = self.call_api("GET", f"/node/{first_id}/arborescence?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["child_nodes"], [])
+
+        response = self.call_api("GET", f"/node/{second_id}/arborescence?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+        body: dict[str, Any] = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([node["id"] for node in body["child_nodes"]], [child_id])
+        self.assertEqual(body["child_nodes"][0]["child_nodes"], [ue])
+        self.assertEqual([course["duration"] for course in ue["courses"]], [10])
+
+        # Below the displayed depth, the children are only summarized, unless their parent is expanded.
+        route: str = f"/node/{second_id}/arborescence?academic_year={self.ACADEMIC_YEAR}&depth=1"
+        body = self.call_api("GET", route, use_auth=True).json()
+        self.assertIsNone(body["child_nodes"][0]["child_nodes"])
+        self.assertEqual(body["child_nodes"][0]["child_count"], 1)
+
+        body = self.call_api("GET", f"{route}&expand={child_id}", use_auth=True).json()
+        self.assertEqual(body["child_nodes"][0]["child_nodes"], [ue])
+
+        self.call_api("DELETE", f"/ue/{ue['id']}", use_auth=True)
+        for node_id in (child_id, first_id, second_id):
+            self.call_api("DELETE", f"/node/{node_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+
+    def test_node_hours_follow_affectations(self):
+        parent_id: int = self.create_node("hours parent", self.get_root_id())
+        node_id: int = self.create_node("hours node", parent_id)
+        ue: dict[str, Any] = self.create_ue("hours UE", node_id, 10, 2)
+        course_id: int = ue["courses"][0]["id"]
+
+        self.assertEqual(self.get_node_hours(node_id), (20, 0))
+        self.assertEqual(self.get_node_hours(parent_id), (20, 0))
+
+        response: Response = self.call_api("POST", f"/affectation/assign?academic_year={self.ACADEMIC_YEAR}", use_auth=True,
+                                           body={"profile_id": 1, "course_id": course_id, "hours": 10, "group": 1})
+        self.assertEqual(response.status_code, 201)
+        affectation_id: int = response.json()["id"]
+        self.assertEqual(self.get_node_hours(node_id), (20, 10))
+        self.assertEqual(self.get_node_hours(parent_id), (20, 10))
+
+        response = self.call_api("PATCH", f"/affectation/{affectation_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True,
+                                 body={"hours": 6})
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.get_node_hours(node_id), (20, 6))
+        self.assertEqual(self.get_node_hours(parent_id), (20, 6))
+
+        response = self.call_api("DELETE", f"/affectation/unassign/{affectation_id}?academic_year={self.ACADEMIC_YEAR}",
+                                 use_auth=True)
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.get_node_hours(node_id), (20, 0))
+        self.assertEqual(self.get_node_hours(parent_id), (20, 0))
+
+        self.call_api("DELETE", f"/ue/{ue['id']}", use_auth=True)
+        for created_id in (node_id, parent_id):
+            self.call_api("DELETE", f"/node/{created_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+
+    def test_affectation_batch_rolled_back_on_conflict(self):
+        node_id: int = self.create_node("batch node", self.get_root_id())
+        ue: dict[str, Any] = self.create_ue("batch UE", node_id, 10, 2)
+        course_id: int = ue["courses"][0]["id"]
+
+        response: Response = self.call_api("POST", f"/affectation/assign?academic_year={self.ACADEMIC_YEAR}", use_auth=True,
+                                           body={"profile_id": 1, "course_id": course_id, "hours": 10, "group": 1})
+        self.assertEqual(response.status_code, 201)
+        affectation_id: int = response.json()["id"]
+
+        # The creation is valid, but the existing affectation is both modified and deleted.
+        response = self.call_api("POST", f"/affectation/batch?academic_year={self.ACADEMIC_YEAR}", use_auth=True,
+                                 body={"create": [{"profile_id": 1, "course_id": course_id, "hours": 5, "group": 2}],
+                                       "modify": [{"id": affectation_id, "hours": 4}],
+                                       "delete": [affectation_id]})
+        body: dict[str, Any] = response.json()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(error["operation"], error["index"], error["status_code"]) for error in body["detail"]["errors"]],
+                         [("delete", 0, 409)])
+
+        # None of the operations were applied.
+        response = self.call_api("GET", f"/affectation/course/{course_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+        affectations: list[dict[str, Any]] = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(affectation["id"], affectation["hours"]) for affectation in affectations], [(affectation_id, 10)])
+        self.assertEqual(self.get_node_hours(node_id), (20, 10))
+
+        self.call_api("DELETE", f"/affectation/unassign/{affectation_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+        self.call_api("DELETE", f"/ue/{ue['id']}", use_auth=True)
+        self.call_api("DELETE", f"/node/{node_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
+
+    def test_rollover_academic_year(self):
+        years: list[dict[str, Any]] = self.call_api("GET", "/academic_year/", use_auth=True).json()
+        source: int = max(year["academic_year"] for year in years)
+        source_tree: dict[str, Any] = self.call_api("GET", f"/node/root/arborescence?academic_year={source}", use_auth=True).json()
+        source_profiles: list[dict[str, Any]] = self.call_api("GET", f"/profile/workload?academic_year={source}",
+                                                              use_auth=True).json()
+
+        response: Response = self.call_api("POST", "/academic_year/rollover", use_auth=True)
+        body: dict[str, Any] = response.json()
+
+        self.assertEqual(response.status_code, 201)
+        self.addCleanup(self.call_api, "DELETE", f"/academic_year/{body['academic_year']}", use_auth=True)
+        self.assertEqual(body["academic_year"], source + 1)
+
+        # The arborescence comes with its UEs, their courses and the planned hours, but nothing is assigned.
+        response = self.call_api("GET", f"/node/root/arborescence?academic_year={source + 1}", use_auth=True)
+        target_tree: dict[str, Any] = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.describe_tree(target_tree), self.describe_tree(source_tree))
+        self.assertEqual(target_tree["assigned_hours"], 0)
+
+        # So do the profiles, with an empty workload.
+        response = self.call_api("GET", f"/profile/workload?academic_year={source + 1}", use_auth=True)
+        target_profiles: list[dict[str, Any]] = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted((profile["firstname"], profile["lastname"], profile["quota"]) for profile in target_profiles),
+                         sorted((profile["firstname"], profile["lastname"], profile["quota"]) for profile in source_profiles))
+        self.assertTrue(all(profile["assigned_hours"] == 0 for profile in target_profiles))
+
+        # Only the most recent academic year can be deleted.
+        response = self.call_api("DELETE", f"/academic_year/{source}", use_auth=True)
+        self.assertEqual(response.status_code, 409)
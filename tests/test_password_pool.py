@@ -0,0 +1,47 @@
+"""
+this file tests the pool running the password hashes, without going through the API
+"""
+
+import asyncio
+import sys
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import HTTPException
+
+# The pool is used directly, from the root of the repository.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.SecurityService import PasswordPool  # pylint: disable=wrong-import-position
+
+
+class TestPasswordPool(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        # A pool of one thread, with room for a single waiting operation.
+        for attribute, value in (("SIZE", 1), ("QUEUE_LIMIT", 1), ("executor", None), ("rejected", 0)):
+            patcher = mock.patch.object(PasswordPool, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(PasswordPool.shutdown)
+
+    async def test_full_queue_rejected(self):
+        release: threading.Event = threading.Event()
+        blocked: list[asyncio.Task] = [asyncio.create_task(PasswordPool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        # One operation runs and one waits for the thread : the next one is turned away instead of waiting.
+        with self.assertRaises(HTTPException) as raised:
+            await PasswordPool.run(release.wait)
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertGreaterEqual(int(raised.exception.headers["Retry-After"]), 1)
+        self.assertEqual(PasswordPool.rejected, 1)
+
+        release.set()
+        await asyncio.gather(*blocked)
+
+        # Once the queue drained, operations are accepted again.
+        self.assertTrue(await PasswordPool.run(release.wait))
+        self.assertEqual(PasswordPool.pending, 0)
@@ -2,6 +2,10 @@
 this file test the permission system assuring that each route can only be accessed under desired permissions
 """
 
+import uuid
+from typing import Any
+
+import requests
 from requests import Response
 from utils.appTestCase import AppTestCase
 
@@ -55,3 +59,77 @@ class TestAuthorization(AppTestCase):
     def test_delete_profile_no_privileges(self):
         response: Response = self.call_api("DELETE", "/profile/1", use_auth=False)
         self.assertEqual(response.status_code, 401)
+
+    def test_get_database_stats_no_privileges(self):
+        response: Response = self.call_api("GET", "/admin/stats/database", use_auth=False)
+        self.assertEqual(response.status_code, 401)
+
+    def test_get_database_stats(self):
+        response: Response = self.call_api("GET", "/admin/stats/database", use_auth=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.json()["max_size"], 1)
+
+
+class TestAuthentication(AppTestCase):
+
+    ACADEMIC_YEAR: int = 2024
+    PASSWORD: str = "Sessi0n!"
+
+    def create_account(self) -> tuple[int, str]:
+        login: str = f"test_{uuid.uuid4().hex[:12]}"
+        response: Response = self.call_api("POST", f"/account/?academic_year={self.ACADEMIC_YEAR}", use_auth=True,
+                                           body={"login": login, "password": self.PASSWORD,
+                                                 "password_confirm": self.PASSWORD})
+        self.assertEqual(response.status_code, 201)
+
+        accounts: list[dict[str, Any]] = self.call_api("GET", f"/account/search/login/{login}?academic_year={self.ACADEMIC_YEAR}",
+                                                       use_auth=True).json()
+        return accounts[0]["id"], login
+
+    def login(self, login: str, password: str) -> Response:
+        return requests.request("POST", f"{self.BASE_URL}/auth/login", data={"username": login, "password": password})
+
+    def test_login_throttled(self):
+        login: str = f"test_{uuid.uuid4().hex[:12]}"
+
+        # The attempts of a login are limited, whether it exists or not.
+        response: Response = self.login(login, self.PASSWORD)
+        for _ in range(30):
+            if response.status_code == 429:
+                break
+            self.assertEqual(response.status_code, 401)
+            response = self.login(login, self.PASSWORD)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+
+    def test_logout_all_sessions(self):
+        account_id, login = self.create_account()
+        first: dict[str, str] = self.login(login, self.PASSWORD).json()
+        second: dict[str, str] = self.login(login, self.PASSWORD).json()
+
+        response: Response = self.call_api("GET", f"/profile/me?academic_year={self.ACADEMIC_YEAR}",
+                                           headers={"Authorization": f"bearer {second['access_token']}"})
+        self.assertNotEqual(response.status_code, 401)
+
+        response = self.call_api("POST", "/auth/logout/all", headers={"Authorization": f"bearer {first['access_token']}"})
+        self.assertEqual(response.status_code, 200)
+
+        # Every session of the account is revoked, not only the one used to log out.
+        for tokens in (first, second):
+            response = self.call_api("GET", f"/profile/me?academic_year={self.ACADEMIC_YEAR}",
+                                     headers={"Authorization": f"bearer {tokens['access_token']}"})
+            self.assertEqual(response.status_code, 401)
+
+            response = self.call_api("POST", "/auth/refresh", body={"access_token": tokens["access_token"],
+                                                                    "refresh_token": tokens["refresh_token"]})
+            self.assertEqual(response.status_code, 401)
+
+        # Logging in again opens a new session.
+        response = self.login(login, self.PASSWORD)
+        self.assertEqual(response.status_code, 200)
+        response = self.call_api("GET", f"/profile/me?academic_year={self.ACADEMIC_YEAR}",
+                                 headers={"Authorization": f"bearer {response.json()['access_token']}"})
+        self.assertNotEqual(response.status_code, 401)
+
+        self.call_api("DELETE", f"/account/{account_id}?academic_year={self.ACADEMIC_YEAR}", use_auth=True)
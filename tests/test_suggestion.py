@@ -0,0 +1,84 @@
+"""
+this file tests the solver behind the assignment suggestions, without going through the API
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# The solver is imported directly, from the root of the repository.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.pydantic.CoverageModel import PydanticCourseCoverage  # pylint: disable=wrong-import-position
+from app.services.SuggestionService import (CANDIDATES_PER_COURSE,  # pylint: disable=wrong-import-position
+                                            UNLINKED_PER_COURSE,
+                                            AssignmentSolver,
+                                            get_window)
+from app.services.WorkloadService import WorkloadTable  # pylint: disable=wrong-import-position
+
+
+class TestSuggestion(unittest.TestCase):
+
+    ACADEMIC_YEAR: int = 2024
+    COURSE_TYPE_ID: int = 1
+
+    def build_solver(self, profile_count: int, course_count: int) -> AssignmentSolver:
+        # Identical profiles, all teaching the type of the courses, with the same quota.
+        table: WorkloadTable = WorkloadTable(self.ACADEMIC_YEAR,
+                                             [(profile_id, "first", "last", 192, 1, 192) for profile_id in range(1, profile_count + 1)],
+                                             [], [])
+        coverages: list[PydanticCourseCoverage] = [PydanticCourseCoverage(course_id=course_id,
+                                                                          course_type_id=self.COURSE_TYPE_ID,
+                                                                          duration=10,
+                                                                          group_count=2,
+                                                                          assigned_groups=[],
+                                                                          unassigned_groups=[1, 2],
+                                                                          planned_hours=20,
+                                                                          assigned_hours=0,
+                                                                          unassigned_hours=20)
+                                                   for course_id in range(1, course_count + 1)]
+        links: dict[int, tuple[set[int], set[int], set[int]]] = {profile_id: (set(), set(), {self.COURSE_TYPE_ID})
+                                                                 for profile_id in range(1, profile_count + 1)}
+        return AssignmentSolver(coverages, table, table.compute(), links, {})
+
+    def test_get_window_rotates_with_offset(self):
+        profiles: list[int] = list(range(50))
+
+        self.assertEqual(get_window(profiles, 50, 0), profiles[:UNLINKED_PER_COURSE])
+        self.assertEqual(get_window(profiles, 50, 1), profiles[UNLINKED_PER_COURSE:2 * UNLINKED_PER_COURSE])
+        # The window wraps around the end of the list.
+        self.assertEqual(get_window(profiles, 50, 2), profiles[40:] + profiles[:10])
+
+    def test_get_window_within_span(self):
+        profiles: list[int] = list(range(50))
+
+        # Only the first `span` profiles are rotated over.
+        self.assertEqual(get_window(profiles, 30, 1), profiles[20:40])
+        self.assertEqual(get_window(profiles, 30, 3), profiles[0:20])
+        self.assertEqual(get_window(profiles, 0, 5), profiles[:UNLINKED_PER_COURSE])
+
+    def test_get_window_short_list(self):
+        profiles: list[int] = list(range(10))
+
+        self.assertEqual(get_window(profiles, len(profiles), 3), profiles)
+
+    def test_candidates_rotate_between_courses(self):
+        solver: AssignmentSolver = self.build_solver(50, 3)
+
+        candidates: list[set[int]] = [{profile_index for profile_index, _ in course_candidates}
+                                      for course_candidates in solver.candidates]
+
+        self.assertTrue(all(len(course_candidates) == CANDIDATES_PER_COURSE for course_candidates in candidates))
+        # Equivalent profiles are spread over the courses instead of all being offered to each of them.
+        self.assertEqual(candidates[0], set(range(0, 20)))
+        self.assertEqual(candidates[1], set(range(20, 40)))
+        self.assertEqual(candidates[2], set(range(40, 50)) | set(range(0, 10)))
+
+    def test_solve_assigns_every_group(self):
+        solver: AssignmentSolver = self.build_solver(50, 3)
+
+        flow: dict[tuple[int, int], int] = solver.solve()
+
+        self.assertEqual(sum(flow.values()), 6)
+        for course_index in range(3):
+            self.assertEqual(sum(groups for (course, _), groups in flow.items() if course == course_index), 2)
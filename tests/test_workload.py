@@ -0,0 +1,44 @@
+"""
+this file tests the computation of the workloads, without going through the API
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# The workloads are computed directly, from the root of the repository.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.pydantic.WorkloadModel import PydanticProfileWorkload  # pylint: disable=wrong-import-position
+from app.services.WorkloadService import WorkloadTable  # pylint: disable=wrong-import-position
+
+
+class TestWorkload(unittest.TestCase):
+
+    ACADEMIC_YEAR: int = 2024
+    STATUS_ID: int = 1
+    COURSE_TYPE_ID: int = 1
+
+    def test_quota_falls_back_to_status(self):
+        # The quota of a profile defaults to 0 : it then takes the one of its status.
+        table: WorkloadTable = WorkloadTable(self.ACADEMIC_YEAR,
+                                             [(1, "first", "last", 0, self.STATUS_ID, 192),
+                                              (2, "first", "last", 96, self.STATUS_ID, 192),
+                                              (3, "first", "last", 0, self.STATUS_ID, None)],
+                                             [], [])
+
+        workloads: list[PydanticProfileWorkload] = table.compute()
+
+        self.assertEqual([workload.quota for workload in workloads], [192, 96, 0])
+
+    def test_weighted_hours_use_coefficients(self):
+        table: WorkloadTable = WorkloadTable(self.ACADEMIC_YEAR,
+                                             [(1, "first", "last", 0, self.STATUS_ID, 192)],
+                                             [(self.STATUS_ID, self.COURSE_TYPE_ID, 1.5)],
+                                             [(1, self.COURSE_TYPE_ID, 10), (1, 2, 4)])
+
+        workload: PydanticProfileWorkload = table.compute()[0]
+
+        self.assertEqual(workload.assigned_hours, 14)
+        self.assertAlmostEqual(workload.weighted_hours, 19.0)
+        self.assertAlmostEqual(workload.remaining_quota, 173.0)
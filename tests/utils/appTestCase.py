@@ -15,6 +15,10 @@ class AppTestCase(unittest.TestCase):
 
     @classmethod
     def authenticate(cls):
+        # The admin logs in once for the whole suite, its login attempts are throttled like any other.
+        if AppTestCase._access_token:
+            return
+
         credentials = {
             "username": "admin",
             "password": "CodeMaster123"
@@ -22,8 +26,8 @@ class AppTestCase(unittest.TestCase):
 
         auth: dict[str, str] = requests.request("POST", f"{cls.BASE_URL}/auth/login", data=credentials).json()
 
-        cls._access_token = auth["access_token"]
-        cls._refresh_token = auth["refresh_token"]
+        AppTestCase._access_token = auth["access_token"]
+        AppTestCase._refresh_token = auth["refresh_token"]
 
     @classmethod
     def setUpClass(cls) -> None:
@@ -42,7 +46,8 @@ class AppTestCase(unittest.TestCase):
             self.fail(e)
 
 
-    def call_api(self, method: str, route: str, *, use_auth: bool = False, body: dict[str, Any] = {}) -> requests.Response:
+    def call_api(self, method: str, route: str, *, use_auth: bool = False, body: dict[str, Any] = {},
+                 headers: dict[str, str] = {}) -> requests.Response:
         if use_auth:
             header = {
                 "Authorization": f"bearer {self._access_token}"
@@ -50,7 +55,7 @@ class AppTestCase(unittest.TestCase):
         else:
             header = {}
 
-        return requests.request(method, f"{self.BASE_URL}{route}", headers=header, json=body)
+        return requests.request(method, f"{self.BASE_URL}{route}", headers={**header, **headers}, json=body)
 
 
 